@@ -0,0 +1,59 @@
+"""
+Import-time benchmark.
+
+Imports each module in a fresh interpreter and reports the median wall time and the heavy
+third-party packages it pulled in:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 valuation_crypto.batch
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+TARGETS = [
+    'valuation_crypto',
+    'valuation_crypto.utils',
+    'valuation_crypto.batch',
+    'valuation_crypto.market_sentiment_reddit_gtrend',
+    'valuation_crypto.app',
+]
+HEAVY_PACKAGES = ('dash', 'plotly', 'ccxt', 'openai', 'praw', 'pytrends.request', 'textblob', 'pandas')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure(module, repeat):
+    """Returns (median seconds, heavy packages loaded) for importing `module` in `repeat` fresh interpreters."""
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module=module)],
+                                check=True, capture_output=True, text=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+    loaded = [package for package in HEAVY_PACKAGES if package in probe['modules']]
+    return statistics.median(timings), loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of valuation_crypto modules.")
+    parser.add_argument('modules', nargs='*', default=TARGETS)
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per module (default 5)")
+    args = parser.parse_args(argv)
+
+    print(f"{'module':<50} {'median ms':>10}  heavy packages loaded")
+    for module in args.modules:
+        seconds, loaded = measure(module, args.repeat)
+        print(f"{module:<50} {seconds * 1000:>10.1f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+End-to-end pipeline benchmark, replayed offline.
+
+Every upstream API is answered from a cassette (see valuation_crypto.replay) after an injected
+per-provider latency, so runs are reproducible and need no credentials. Reports end-to-end and
+per-stage latency, throughput and memory for a single coin, a top-100 batch, and concurrent clients on
+threads or on the asyncio engine:
+
+    python benchmarks/pipeline.py
+    python benchmarks/pipeline.py single --symbol ETH --runs 10
+    python benchmarks/pipeline.py top100 --with-ai --latency-scale 0.1
+    python benchmarks/pipeline.py all --json after.json --baseline before.json
+
+Caches start empty for every run. Rate limits are lifted unless --rate-limits is given, so the
+numbers reflect the pipeline rather than the upstream budgets.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from valuation_crypto import batch, market_sentiment_reddit_gtrend, utils  # noqa: E402
+from valuation_crypto.ai_cache import configure_ai_cache  # noqa: E402
+from valuation_crypto.async_analysis import analyze_crypto_async, close_async_engine  # noqa: E402
+from valuation_crypto.exchanges import exchange_pool  # noqa: E402
+from valuation_crypto.history import configure_history_store  # noqa: E402
+from valuation_crypto.market_cache import get_market_cache  # noqa: E402
+from valuation_crypto.ratelimit import rate_limiter  # noqa: E402
+from valuation_crypto.replay import Latency, load_cassette, replaying, synthesize_cassette  # noqa: E402
+from valuation_crypto.sentiment_cache import configure_sentiment_cache  # noqa: E402
+from valuation_crypto.singleflight import flights  # noqa: E402
+
+SCENARIOS = ('single', 'single-warm', 'top100', 'throughput', 'throughput-async')
+
+# Functions timed as pipeline stages: (module, function name, stage)
+STAGES = [
+    (utils, 'fetch_market_metrics', 'market'),
+    (utils, 'fetch_trading_volumes', 'market'),
+    (utils, 'fetch_sentiment', 'sentiment'),
+    (utils, 'generate_ai_analysis', 'ai'),
+]
+
+
+class StageTimer:
+    """Records the wall time of every call to the stage functions while active."""
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, fn, stage):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.durations.setdefault(stage, []).append(time.perf_counter() - started)
+        return timed
+
+    @contextlib.contextmanager
+    def active(self):
+        with contextlib.ExitStack() as stack:
+            for module, name, stage in STAGES:
+                stack.enter_context(mock.patch.object(module, name, self._wrap(getattr(module, name), stage)))
+            yield self
+
+
+def reset_state(workdir):
+    """Empties every process-wide cache, pointing the persistent ones at `workdir`."""
+    exchange_pool.clear()
+    rate_limiter.reset()
+    configure_sentiment_cache(':memory:')
+    market_sentiment_reddit_gtrend._trends_cache.clear()
+    configure_ai_cache(images=os.path.join(workdir, 'images'))
+    flights.reset()
+    get_market_cache().clear()
+    configure_history_store(os.path.join(workdir, 'history'))
+
+
+def summarize(seconds):
+    seconds = sorted(seconds)
+    if not seconds:
+        return {}
+    return {
+        'count': len(seconds),
+        'p50': round(statistics.median(seconds), 4),
+        'p95': round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 4),
+        'max': round(seconds[-1], 4),
+        'total': round(sum(seconds), 4),
+    }
+
+
+def run_single(symbol):
+    utils.analyze_crypto(symbol)
+    return 1
+
+
+def run_top100(workdir, limit=100, with_ai=False):
+    coins = batch.fetch_top_cryptocurrencies(limit)
+    return batch.run_batch(coins, os.path.join(workdir, 'run.csv'), with_ai=with_ai)
+
+
+def run_throughput(symbols, clients, requests):
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(utils.analyze_crypto, [symbols[i % len(symbols)] for i in range(requests)]))
+    return requests
+
+
+def run_throughput_async(symbols, requests):
+    async def run():
+        try:
+            await asyncio.gather(*(analyze_crypto_async(symbols[i % len(symbols)]) for i in range(requests)))
+        finally:
+            await close_async_engine()
+    asyncio.run(run())
+    return requests
+
+
+def measure(run, runs, workdir, prepare=None):
+    """
+    Times `runs` runs of `run`, each after emptying the caches and calling `prepare`,
+    then repeats one under tracemalloc for its peak allocations.
+    """
+    totals, units = [], 0
+    timer = StageTimer()
+    for _ in range(runs):
+        reset_state(workdir)
+        if prepare:
+            prepare()
+        with timer.active():
+            started = time.perf_counter()
+            units += run()
+            totals.append(time.perf_counter() - started)
+
+    reset_state(workdir)
+    if prepare:
+        prepare()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    elapsed = sum(totals)
+    return {
+        'end_to_end': summarize(totals),
+        'stages': {stage: summarize(seconds) for stage, seconds in sorted(timer.durations.items())},
+        'throughput_per_second': round(units / elapsed, 3) if elapsed else None,
+        'peak_traced_mb': round(peak / 2 ** 20, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns the scenarios whose p50 latency regressed by more than `tolerance` against `baseline`."""
+    regressions = []
+    for scenario, result in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario, {}).get('end_to_end', {}).get('p50')
+        after = result['end_to_end'].get('p50')
+        if before and after:
+            change = after / before - 1
+            print(f"{scenario:<12} p50 {before:.3f}s -> {after:.3f}s ({change:+.1%})")
+            if change > tolerance:
+                regressions.append(scenario)
+    return regressions
+
+
+def default_results_csv():
+    paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                          'results', '*.csv')))
+    return paths[-1] if paths else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument('scenario', nargs='?', default='all', choices=SCENARIOS + ('all',))
+    parser.add_argument('--cassette', help="Recorded cassette; defaults to one synthesized from --results-csv")
+    parser.add_argument('--results-csv', default=default_results_csv(), help="Batch results to synthesize from")
+    parser.add_argument('--symbol', default='BTC')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--with-ai', action='store_true', help="Include the LLM stage in the top-100 batch")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="Multiplier of the injected latencies")
+    parser.add_argument('--jitter', type=float, default=0.1, help="Relative random variation of each latency")
+    parser.add_argument('--rate-limits', action='store_true', help="Keep the shared upstream rate limits")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--baseline', help="Results JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p50 slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    cassette = load_cassette(args.cassette) if args.cassette else synthesize_cassette(args.results_csv)
+    latency = Latency(scale=args.latency_scale, jitter=args.jitter)
+    symbols = cassette['cmc_listings'][:args.top]
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+
+    results = {'cassette': cassette['source'], 'latency_scale': args.latency_scale,
+               'rate_limits': args.rate_limits, 'scenarios': {}}
+    with tempfile.TemporaryDirectory() as workdir, replaying(cassette, latency), contextlib.ExitStack() as stack:
+        if not args.rate_limits:
+            stack.enter_context(mock.patch.object(rate_limiter, 'acquire', lambda provider, tokens=1: 0.0))
+            stack.enter_context(mock.patch.object(rate_limiter, 'acquire_async', mock.AsyncMock(return_value=0.0)))
+        runs = {
+            'single': lambda: run_single(args.symbol),
+            'single-warm': lambda: run_single(args.symbol),
+            'top100': lambda: run_top100(workdir, args.top, args.with_ai),
+            'throughput': lambda: run_throughput(symbols, args.clients, args.requests),
+            'throughput-async': lambda: run_throughput_async(symbols, args.requests),
+        }
+        # The warm scenario repeats a finished analysis, which the caches answer
+        prepare = {'single-warm': lambda: (run_single(args.symbol), flights.reset())}
+        for scenario in scenarios:
+            result = measure(runs[scenario], args.runs if scenario.startswith('single') else 1, workdir,
+                             prepare.get(scenario))
+            results['scenarios'][scenario] = result
+            stages = ', '.join(f"{stage} {summary['p50']:.3f}s" for stage, summary in result['stages'].items())
+            print(f"{scenario:<12} p50 {result['end_to_end']['p50']:.3f}s  "
+                  f"{result['throughput_per_second']}/s  peak {result['peak_traced_mb']} MB  [{stages}]")
+    results['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(f"Max RSS {results['max_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
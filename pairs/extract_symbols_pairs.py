@@ -1,7 +1,13 @@
-import ccxt
 import csv
+import os
+import sys
 import requests
 
+# Run as a script from pairs/ (it writes crypto_pairs.csv there), so the package lives one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from valuation_crypto.exchanges import exchange_pool  # noqa: E402
+
 def fetch_top_cryptocurrencies(limit=500):
     url = f"https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page={limit}&page=1"
     response = requests.get(url)
@@ -14,13 +20,12 @@ def fetch_top_cryptocurrencies(limit=500):
         return []
 
 def fetch_available_pairs(exchange_id, crypto_symbols):
-    exchange_class = getattr(ccxt, exchange_id)()
-    exchange_class.load_markets()
+    # Looked up by base currency in the pair index, so ETH does not match ETHFI/USDT
+    pair_index = exchange_pool.pairs(exchange_id)
     available_pairs = {}
 
     for symbol in crypto_symbols:
-        pairs = [market for market in exchange_class.symbols if symbol in market]
-        available_pairs[symbol] = pairs
+        available_pairs[symbol] = sorted(pair_index.get(symbol, {}).values())
     return available_pairs
 
 top_crypto_symbols = fetch_top_cryptocurrencies(500)
@@ -0,0 +1,32 @@
+import pytest
+from valuation_crypto.exchanges import exchange_pool
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.sentiment_cache import configure_sentiment_cache
+from valuation_crypto import market_sentiment_reddit_gtrend
+from valuation_crypto.ai_cache import configure_ai_cache
+from valuation_crypto.singleflight import flights
+from valuation_crypto.market_cache import get_market_cache
+from valuation_crypto.history import configure_history_store
+from valuation_crypto.pair_index import configure_pair_index
+from valuation_crypto.sentiment_scoring import configure_scorer
+from valuation_crypto.telemetry import telemetry
+from valuation_crypto.volume_stream import configure_volume_stream
+
+@pytest.fixture(autouse=True)
+def reset_shared_state(tmp_path):
+    """Process-wide registries must not leak mocks between tests."""
+    exchange_pool.clear()
+    rate_limiter.reset()
+    configure_sentiment_cache(':memory:')
+    market_sentiment_reddit_gtrend._trends_cache.clear()
+    configure_ai_cache(images=str(tmp_path / "images"))
+    flights.reset()
+    get_market_cache().clear()
+    configure_history_store(str(tmp_path / "history"))
+    configure_pair_index(None)
+    telemetry.reset()
+    configure_scorer(None)
+    yield
+    configure_volume_stream(None)
+    exchange_pool.clear()
+    rate_limiter.reset()
@@ -0,0 +1,95 @@
+import os
+from unittest.mock import patch, MagicMock
+from valuation_crypto import ai_cache, utils
+from valuation_crypto.ai_cache import TTLCache, cache_key, store_image
+from valuation_crypto.app import app
+
+# Keys depend on the prompt and on every model parameter
+def test_cache_key():
+    assert cache_key(prompt="a", model="gpt-4") == cache_key(model="gpt-4", prompt="a")
+    assert cache_key(prompt="a", model="gpt-4") != cache_key(prompt="a", model="gpt-4o")
+
+# Entries expire after the TTL and the least recently used entry is evicted first
+@patch("valuation_crypto.ai_cache.time.time")
+def test_ttl_cache_expiry_and_lru(mock_time):
+    mock_time.return_value = 0
+    cache = TTLCache(ttl=300, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    mock_time.return_value = 301
+    assert cache.get("a") is None
+
+# Entries pushed out of memory are spilled to disk and read back
+def test_ttl_cache_disk_spill(tmp_path):
+    cache = TTLCache(ttl=300, maxsize=1, spill_dir=str(tmp_path))
+    cache.set("a", "analysis")
+    cache.set("b", "other")
+
+    assert cache.get("a") == "analysis"
+    assert cache.stats["disk_hits"] == 1
+
+# Generated images are downloaded once and served from the local Flask route
+@patch("valuation_crypto.ai_cache.requests.get")
+def test_store_image_and_route(mock_get):
+    mock_get.return_value = MagicMock(content=b"png-bytes")
+
+    local_url = store_image("abc", "https://oaidalleapi.example/abc.png")
+    store_image("abc", "https://oaidalleapi.example/abc.png")
+
+    assert local_url == "/generated-images/abc.png"
+    assert mock_get.call_count == 1
+    assert os.path.exists(os.path.join(ai_cache.image_dir, "abc.png"))
+    response = app.server.test_client().get(local_url)
+    assert response.status_code == 200
+    assert response.data == b"png-bytes"
+
+# Storing an image prunes images older than IMAGE_MAX_AGE, at most once per IMAGE_PRUNE_INTERVAL
+@patch("valuation_crypto.ai_cache.requests.get")
+def test_store_image_prunes_old_images(mock_get):
+    mock_get.return_value = MagicMock(content=b"png-bytes")
+    store_image("old", "https://oaidalleapi.example/old.png")
+    old_path = os.path.join(ai_cache.image_dir, "old.png")
+    os.utime(old_path, (0, 0))
+
+    store_image("new", "https://oaidalleapi.example/new.png")
+    assert os.path.exists(old_path)
+
+    ai_cache._last_pruned -= ai_cache.IMAGE_PRUNE_INTERVAL
+    store_image("newer", "https://oaidalleapi.example/newer.png")
+    assert not os.path.exists(old_path)
+    assert sorted(os.listdir(ai_cache.image_dir)) == ["new.png", "newer.png"]
+
+# An image still in the store is reused once its cache entry expired, instead of being generated again
+@patch("valuation_crypto.utils.client.images.generate")
+@patch("valuation_crypto.ai_cache.requests.get")
+def test_request_image_reuses_stored_image(mock_get, mock_dalle):
+    mock_get.return_value = MagicMock(content=b"png-bytes")
+    mock_dalle.return_value = MagicMock(data=[MagicMock(url="https://oaidalleapi.example/abc.png")])
+
+    first = utils.request_image("A bullish bitcoin")
+    ai_cache.get_ai_cache().clear()
+    second = utils.request_image("A bullish bitcoin")
+
+    assert first == second
+    assert mock_dalle.call_count == 1
+    assert os.listdir(ai_cache.image_dir) == [first.rsplit("/", 1)[1]]
+
+# Expired spill files are deleted when later entries are spilled
+@patch("valuation_crypto.ai_cache.time.monotonic")
+def test_ttl_cache_prunes_spill_dir(mock_clock, tmp_path):
+    mock_clock.return_value = 0
+    spill_dir = tmp_path / "spill"
+    cache = TTLCache(ttl=300, maxsize=1, spill_dir=str(spill_dir))
+    cache.set("a", "analysis")
+    cache.set("b", "other")
+    os.utime(spill_dir / "a.json", (0, 0))
+
+    mock_clock.return_value = 301
+    cache.set("c", "third")
+
+    assert sorted(os.listdir(spill_dir)) == ["b.json"]
@@ -2,7 +2,8 @@ import pytest
 from unittest.mock import patch, MagicMock
 import dash
 from dash import html, dcc
-from valuation_crypto.app import app, update_output
+from valuation_crypto.app import app, update_output, poll_job, render_job
+from valuation_crypto.history import get_history_store
 from valuation_crypto import utils
 
 def find_component(component, component_id):
@@ -113,19 +114,59 @@ def test_analyze_crypto(mock_openai, mock_sentiment, mock_volume, mock_data, moc
     assert result["sentiment_score"] == 0.1
     assert "Mock AI Analysis Text" in result["ai_text"]
 
-@patch("valuation_crypto.app.analyze_crypto")
-def test_dash_callback(mock_analyze_crypto, mock_analysis_data):
-    """Test callback with mocked analysis data."""
-    mock_analyze_crypto.return_value = (mock_analysis_data, "mock_image_url")
-    outputs = update_output(1, "BTC")
-    assert outputs is not None
+@pytest.fixture
+def mock_market_data():
+    """Fixture to return the market-data stage result."""
+    return {
+        "crypto_id": "Bitcoin",
+        "crypto_symbol": "BTC",
+        "current_price": 50000,
+        "market_cap": 1000000000,
+        "market_cap_dominance": 60.0,
+        "circulating_supply": 19000000,
+        "total_volume_24h": 130136.99,
+        "velocity": 2.5,
+    }
 
-    analysis_output, image_url, *_ = outputs
+@patch("valuation_crypto.app.job_manager")
+def test_dash_callback(mock_job_manager, mock_market_data, mock_analysis_data):
+    """Test the submit and polling callbacks with a mocked job."""
+    mock_job_manager.submit.return_value = "job-1"
+    job = {"id": "job-1", "symbol": "BTC", "status": "running", "stages": {}, "error": None}
+    mock_job_manager.get.return_value = job
+
+    # Submitting only queues the job and starts polling
+    _, job_store, poll_disabled = update_output(1, "BTC")
+    assert job_store == {"job_id": "job-1"}
+    assert poll_disabled is False
+    mock_job_manager.submit.assert_called_once_with("BTC")
+
+    # Market data renders first, before sentiment or AI results exist
+    job["stages"] = {"market": mock_market_data}
+    analysis_output, price_figure, *_, poll_disabled = poll_job(1, job_store)
     print(f"\nDEBUG: Received analysis_output -> {analysis_output}")
+    assert "Price: $50000" in str(analysis_output)
+    assert "Adjusted Velocity: …" in str(analysis_output)
+    assert list(price_figure.data[0].x) == [2.5]
+    assert poll_disabled is False
+
+    # Sentiment fills in the valuation metrics
+    sentiment_data = dict(mock_market_data, **mock_analysis_data)
+    job["stages"]["sentiment"] = sentiment_data
+    analysis_output, _, _, sentiment_figure, *_ = poll_job(2, job_store)
+    assert "Adjusted Velocity: 2.75" in str(analysis_output)
+    assert list(sentiment_figure.data[0].x) == [0.1]
+
+    # AI text and image arrive last, and polling stops
+    job["stages"]["ai"] = {"text": "Mock AI Analysis Text", "image_url": "mock_image_url"}
+    job["status"] = "done"
+    analysis_output, *_, image_url, image_style, _, poll_disabled = poll_job(3, job_store)
     assert "Mock AI Analysis Text" in str(analysis_output), (
         f"Expected 'Mock AI Analysis Text', but got: {analysis_output}"
     )
     assert image_url == "mock_image_url"
+    assert image_style["display"] == "block"
+    assert poll_disabled is True
 
 def test_dash_callback_empty_input():
     """Test callback with empty input (should return empty response)."""
@@ -134,18 +175,53 @@ def test_dash_callback_empty_input():
     assert outputs is not None
     assert outputs[0] == "", "Expected empty response when input is empty"
 
-@patch("valuation_crypto.app.analyze_crypto")
-def test_dash_callback_invalid_symbol(mock_analyze_crypto):
+@patch("valuation_crypto.app.job_manager")
+def test_dash_callback_invalid_symbol(mock_job_manager):
     """Test callback with invalid crypto symbol."""
-    mock_analyze_crypto.return_value = (
-        {"error": "Invalid Crypto Symbol or Data Unavailable."},
-        None
-    )
-    outputs = update_output(1, "INVALID")
+    mock_job_manager.get.return_value = {
+        "id": "job-1", "symbol": "INVALID", "status": "error", "stages": {},
+        "error": "Invalid Crypto Symbol or Data Unavailable."
+    }
+    outputs = poll_job(1, {"job_id": "job-1"})
     print(f"\nDEBUG: Invalid symbol callback output -> {outputs}")
 
     assert outputs is not None
-    analysis_output, image_url, *_ = outputs
+    analysis_output, *_, poll_disabled = outputs
     assert "Invalid Crypto Symbol or Data Unavailable." in str(analysis_output), (
         "Expected error message for invalid symbol"
     )
+    assert poll_disabled is True
+
+# A job that expired or was lost on restart is reported once and polling stops
+@patch("valuation_crypto.app.job_manager")
+def test_poll_job_missing(mock_job_manager):
+    mock_job_manager.get.return_value = None
+
+    analysis_output, *_, poll_disabled = poll_job(5, {"job_id": "expired"})
+
+    assert "expired" in str(analysis_output)
+    assert poll_disabled is True
+
+# Past runs are drawn as WebGL traces underneath the current point
+def test_render_job_history(mock_market_data, mock_analysis_data):
+    get_history_store().append([
+        dict(mock_market_data, current_price=40000, velocity=2.0, sentiment_score=0.05, valuation_difference=-1.0),
+        dict(mock_market_data, current_price=45000, velocity=2.2, sentiment_score=0.08, valuation_difference=-0.5),
+    ], timestamp=1740787200)
+    job = {"id": "job-1", "status": "running", "error": None,
+           "stages": {"market": mock_market_data, "sentiment": dict(mock_market_data, **mock_analysis_data)}}
+
+    _, price_figure, _, sentiment_figure, *_ = render_job(job)
+
+    assert [trace.type for trace in price_figure.data] == ["scattergl", "scattergl"]
+    assert list(price_figure.data[0].y) == [42500]
+    assert list(price_figure.data[1].y) == [50000]
+    assert list(sentiment_figure.data[0].y) == [-0.75]
+
+# The Flask server exposes the timing histograms in the Prometheus text format
+def test_metrics_route():
+    response = app.server.test_client().get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "valuation_span_seconds" in response.get_data(as_text=True)
@@ -0,0 +1,63 @@
+import asyncio
+import csv
+from valuation_crypto import batch, market_sentiment_reddit_gtrend, replay, utils
+from valuation_crypto.ai_cache import configure_ai_cache
+from valuation_crypto.async_analysis import AsyncAnalysisEngine, analyze_crypto_async, close_async_engine
+from valuation_crypto.market_cache import get_market_cache
+from valuation_crypto.sentiment_cache import configure_sentiment_cache
+from valuation_crypto.singleflight import flights
+from valuation_crypto.telemetry import telemetry
+
+def make_cassette(path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=batch.CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerow({"Rank": 1, "Crypto ID": "Bitcoin", "Symbol": "BTC", "Current Price": 50000,
+                         "Market Cap Percentage %": 60, "Circulating Supply": 1000, "Total 24h Volume": 900,
+                         "Current Mentions": 3, "Previous Mentions": 2})
+        writer.writerow({"Rank": 2, "Crypto ID": "Ethereum", "Symbol": "ETH", "Current Price": 2000,
+                         "Market Cap Percentage %": 10, "Circulating Supply": 500, "Total 24h Volume": 300,
+                         "Current Mentions": 1, "Previous Mentions": 4})
+    return replay.synthesize_cassette(path)
+
+def analyze_async(*symbols):
+    async def run():
+        try:
+            return await asyncio.gather(*(analyze_crypto_async(symbol) for symbol in symbols))
+        finally:
+            await close_async_engine()
+    return asyncio.run(run())
+
+# The async engine returns exactly what analyze_crypto returns for the same upstream responses
+def test_async_matches_sync(tmp_path):
+    cassette = make_cassette(tmp_path / "run.csv")
+    with replay.replaying(cassette):
+        expected = [utils.analyze_crypto("BTC"), utils.analyze_crypto("ETH"), utils.analyze_crypto("NOPE")]
+
+    # Nothing may be answered from the caches filled by the synchronous run
+    flights.reset()
+    get_market_cache().clear()
+    configure_sentiment_cache(":memory:")
+    market_sentiment_reddit_gtrend._trends_cache.clear()
+    configure_ai_cache(images=str(tmp_path / "images"))
+    with replay.replaying(cassette):
+        results = analyze_async("BTC", "ETH", "NOPE")
+
+    assert [tuple(result) for result in results] == expected
+    assert results[2][0] == {"error": utils.INVALID_SYMBOL_ERROR}
+
+# Concurrent requests for one symbol share a single run of every upstream call
+def test_async_coalesces_requests(tmp_path):
+    cassette = make_cassette(tmp_path / "run.csv")
+
+    async def run():
+        async with AsyncAnalysisEngine() as engine:
+            return await asyncio.gather(*(engine.analyze("BTC") for _ in range(5)))
+
+    with replay.replaying(cassette, replay.Latency(scale=0.01)):
+        results = asyncio.run(run())
+
+    histograms, _ = telemetry.snapshot()
+    assert all(result == results[0] for result in results)
+    assert histograms[("cmc_quotes", "coinmarketcap", "")]["count"] == 1
+    assert histograms[("openai_chat", "openai", "miss")]["count"] == 1
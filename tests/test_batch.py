@@ -0,0 +1,108 @@
+import csv
+import pandas as pd
+import requests
+from unittest.mock import patch
+from valuation_crypto import batch
+from valuation_crypto.history import HistoryStore
+
+def make_quote(name, symbol, price):
+    return {
+        "name": name,
+        "symbol": symbol,
+        "circulating_supply": 1000,
+        "quote": {"USD": {"price": price, "market_cap": price * 1000, "market_cap_dominance": 12.345}},
+    }
+
+# Every coin ends up in the CSV with its rank, even though rows complete out of order
+@patch("valuation_crypto.utils.generate_ai_analysis")
+@patch("valuation_crypto.utils.fetch_sentiment")
+@patch("valuation_crypto.utils.fetch_trading_volumes")
+def test_run_batch_writes_rows(mock_volumes, mock_sentiment, mock_ai, tmp_path):
+    mock_volumes.return_value = {"BTC": 1000, "ETH": 500}
+    mock_sentiment.return_value = {"combined_sentiment_score": 0.1, "current_mentions": 10, "previous_mentions": 5}
+    mock_ai.return_value = ("Mock AI Analysis Text", "mock_image_url")
+    output = tmp_path / "run.csv"
+
+    rows_written = batch.run_batch(
+        [make_quote("Bitcoin", "BTC", 50000), make_quote("Ethereum", "ETH", 2000)],
+        output, with_ai=True)
+
+    with open(output, newline="") as file:
+        rows = sorted(csv.DictReader(file), key=lambda row: int(row["Rank"]))
+    assert rows_written == 2
+    assert [row["Symbol"] for row in rows] == ["BTC", "ETH"]
+    assert rows[0]["Market Cap Percentage %"] == "12.35"
+    assert rows[0]["Total 24h Volume"] == "1000"
+    assert rows[1]["AI Analysis"] == "Mock AI Analysis Text"
+    mock_volumes.assert_called_once_with(["BTC", "ETH"])
+
+# A failing sentiment stage still produces a row with neutral sentiment
+@patch("valuation_crypto.utils.fetch_sentiment", side_effect=Exception("Reddit down"))
+@patch("valuation_crypto.utils.fetch_trading_volumes")
+def test_run_batch_sentiment_failure(mock_volumes, mock_sentiment, tmp_path):
+    mock_volumes.return_value = {"BTC": 1000}
+    output = tmp_path / "run.csv"
+
+    batch.run_batch([make_quote("Bitcoin", "BTC", 50000)], output)
+
+    with open(output, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert rows[0]["Combined Sentiment Score"] == "0"
+    assert "AI Analysis" not in rows[0]
+
+# The computed metrics are appended to the history store as well
+@patch("valuation_crypto.utils.fetch_sentiment")
+@patch("valuation_crypto.utils.fetch_trading_volumes")
+def test_run_batch_records_history(mock_volumes, mock_sentiment, tmp_path):
+    mock_volumes.return_value = {"BTC": 1000}
+    mock_sentiment.return_value = {"combined_sentiment_score": 0.1, "current_mentions": 10, "previous_mentions": 5}
+    history = HistoryStore(str(tmp_path / "history"))
+
+    batch.run_batch([make_quote("Bitcoin", "BTC", 50000)], tmp_path / "run.csv", history=history)
+
+    result = history.query("BTC", ["rank", "current_price", "sentiment_score"])
+    assert result["rank"].tolist() == [1]
+    assert result["current_price"].tolist() == [50000]
+    assert result["sentiment_score"].tolist() == [0.1]
+
+# Google Trends is queried once for the whole universe, four coins per anchored payload
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.collect_reddit_mentions", return_value=(10, 0.1, 5))
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.pytrends")
+@patch("valuation_crypto.utils.fetch_trading_volumes", return_value={})
+def test_run_batch_shares_trends_payloads(mock_volumes, mock_pytrends, mock_mentions, tmp_path):
+    payloads = []
+    mock_pytrends.build_payload.side_effect = lambda keywords, **kwargs: payloads.append(keywords)
+    mock_pytrends.interest_over_time.side_effect = lambda: pd.DataFrame({keyword: [50, 100] for keyword in payloads[-1]})
+    coins = [make_quote(f"Coin{index}", f"C{index}", 1) for index in range(10)]
+
+    assert batch.run_batch(coins, tmp_path / "run.csv") == 10
+
+    assert len(payloads) == 3
+    assert all(payload[-1] == "cryptocurrency" for payload in payloads)
+    assert mock_mentions.call_count == 10
+
+# A failing LLM stage still writes the coin's row, with the error as its analysis
+@patch("valuation_crypto.utils.generate_ai_analysis", side_effect=Exception("OpenAI down"))
+@patch("valuation_crypto.utils.fetch_sentiment", return_value={"combined_sentiment_score": 0.1, "current_mentions": 10, "previous_mentions": 5})
+@patch("valuation_crypto.utils.fetch_trading_volumes", return_value={"BTC": 1000})
+def test_run_batch_llm_failure(mock_volumes, mock_sentiment, mock_ai, tmp_path):
+    output = tmp_path / "run.csv"
+
+    assert batch.run_batch([make_quote("Bitcoin", "BTC", 50000)], output, with_ai=True) == 1
+
+    with open(output, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert rows[0]["Symbol"] == "BTC"
+    assert rows[0]["AI Analysis"] == "OpenAI API Error: OpenAI down"
+    assert rows[0]["Image URL"] == ""
+
+# Network errors and non-JSON listings leave the batch with no coins instead of crashing
+@patch("valuation_crypto.utils.cmc_session")
+def test_fetch_top_cryptocurrencies_errors(mock_session):
+    mock_session.get.side_effect = requests.ConnectionError("offline")
+    assert batch.fetch_top_cryptocurrencies(10) == []
+
+    mock_session.get.side_effect = None
+    mock_session.get.return_value.status_code = 200
+    mock_session.get.return_value.json.side_effect = ValueError("Expecting value")
+    assert batch.fetch_top_cryptocurrencies(10) == []
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock
+from valuation_crypto.clients import LazyClient, is_created, reset_client
+
+# The factory runs once, on first attribute access
+def test_lazy_client_created_on_first_use():
+    factory = MagicMock()
+    client = LazyClient(factory)
+
+    assert not is_created(client)
+    factory.assert_not_called()
+    client.chat.completions.create(model="gpt-4")
+    client.images.generate(prompt="BTC")
+
+    factory.assert_called_once_with()
+    factory.return_value.chat.completions.create.assert_called_once_with(model="gpt-4")
+    reset_client(client)
+    assert not is_created(client)
+
+# Importing the package and the data modules neither builds clients nor loads Dash, OpenAI, ccxt or TextBlob
+def test_import_is_lazy():
+    probe = (
+        "import sys, valuation_crypto, valuation_crypto.utils, valuation_crypto.batch\n"
+        "print(sorted({'ccxt', 'dash', 'openai', 'praw', 'pytrends.request', 'textblob', 'valuation_crypto.apikey'} & set(sys.modules)))"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout
+
+    assert output.strip() == "[]"
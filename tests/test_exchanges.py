@@ -0,0 +1,36 @@
+from unittest.mock import patch, MagicMock
+from valuation_crypto.exchanges import ExchangePool
+
+# Exchanges are created and loaded once, later lookups are served from the pool
+@patch("ccxt.binance")
+def test_exchange_pool_reuses_exchange(mock_binance):
+    mock_exchange = MagicMock()
+    mock_binance.return_value = mock_exchange
+    pool = ExchangePool()
+
+    first = pool.get("binance")
+    second = pool.get("binance")
+
+    assert first is second is mock_exchange
+    assert mock_binance.call_count == 1
+    assert mock_exchange.load_markets.call_count == 1
+    assert pool.stats == {'exchanges_created': 1, 'load_markets_calls': 1, 'load_markets_saved': 1, 'index_hits': 0}
+
+# Markets are reloaded once the TTL has expired
+@patch("valuation_crypto.exchanges.time.monotonic")
+@patch("ccxt.kraken")
+def test_exchange_pool_reloads_after_ttl(mock_kraken, mock_monotonic):
+    mock_exchange = MagicMock()
+    mock_kraken.return_value = mock_exchange
+    pool = ExchangePool(markets_ttl=60)
+
+    mock_monotonic.return_value = 0
+    pool.get("kraken")
+    mock_monotonic.return_value = 30
+    pool.get("kraken")
+    mock_monotonic.return_value = 61
+    pool.get("kraken")
+
+    assert mock_exchange.load_markets.call_count == 2
+    mock_exchange.load_markets.assert_called_with(reload=True)
+    assert pool.stats['load_markets_saved'] == 1
@@ -0,0 +1,93 @@
+import multiprocessing
+import numpy as np
+import pytest
+from valuation_crypto.history import HistoryStore, backfill_csv, run_timestamp
+
+DAY = 24 * 60 * 60
+START = 1740787200  # 2025-03-01T00:00:00Z
+
+def record(symbol, price, **metrics):
+    return dict({"crypto_symbol": symbol, "current_price": price, "velocity": price / 10}, **metrics)
+
+def append_from_process(root, writer):
+    store = HistoryStore(root)
+    for _ in range(40):
+        store.append([record(f"P{writer}", writer)] * 25, timestamp=START + writer)
+
+# Records land in daily partitions and come back per symbol, in time order
+def test_history_append_and_query(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append([record("BTC", 51000), record("ETH", 2100)], timestamp=START + DAY + 60)
+    store.append([record("BTC", 50000, rank=1), record("ETH", 2000, rank=2)], timestamp=START + 60)
+
+    result = store.query("btc", ["current_price", "rank"])
+
+    assert store.partitions() == ["2025-03-01", "2025-03-02"]
+    assert result["timestamp"].tolist() == [START + 60, START + DAY + 60]
+    assert result["current_price"].tolist() == [50000, 51000]
+    assert result["rank"][0] == 1 and np.isnan(result["rank"][1])
+    assert set(result["symbol"]) == {"BTC"}
+    assert store.symbols() == ["BTC", "ETH"]
+
+# Symbols the fixed-width column cannot hold are rejected instead of truncated into another coin's series
+def test_history_rejects_long_symbols(tmp_path):
+    store = HistoryStore(str(tmp_path))
+
+    assert store.append([record("A" * 16, 1), record("A" * 17, 2), record("ÉTH", 3)], timestamp=START) == 1
+
+    assert store.symbols() == ["A" * 16]
+    assert store.query("A" * 16, ["current_price"])["current_price"].tolist() == [1]
+
+# Time ranges prune partitions and filter rows
+def test_history_series_time_range(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    for day in range(5):
+        store.append([record("BTC", 50000 + day)], timestamp=START + day * DAY)
+
+    timestamps, prices = store.series("BTC", "current_price", start=START + DAY, end=START + 3 * DAY)
+
+    assert store.partitions(START + DAY, START + 3 * DAY) == ["2025-03-02", "2025-03-03", "2025-03-04"]
+    assert prices.tolist() == [50001, 50002, 50003]
+    with pytest.raises(ValueError):
+        store.query("BTC", ["price"])
+
+# Rows half-written by an interrupted append are ignored
+def test_history_ignores_incomplete_rows(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append([record("BTC", 50000)], timestamp=START)
+    with open(tmp_path / "2025-03-01" / "timestamp.bin", "ab") as file:
+        file.write(np.array([START + 60], dtype="<i8").tobytes())
+
+    assert store.query("BTC")["timestamp"].tolist() == [START]
+
+# Batch result CSVs are imported with the run's start time
+def test_history_backfill_csv(tmp_path):
+    path = tmp_path / "202503012026113677.csv"
+    path.write_text(
+        "Rank,Crypto ID,Symbol,Current Price,Adjusted Annual Velocity,Combined Sentiment Score\n"
+        "1,Bitcoin,BTC,85214.65,57122.05,0.068\n"
+        "2,Ethereum,ETH,2219.73,3247.96,0.022\n")
+    store = HistoryStore(str(tmp_path / "history"))
+
+    assert backfill_csv(store, [str(path)]) == 2
+    result = store.query("ETH", ["current_price", "adjusted_velocity", "sentiment_score"])
+    assert result["timestamp"].tolist() == [run_timestamp(str(path))]
+    assert result["current_price"].tolist() == [2219.73]
+    assert result["sentiment_score"].tolist() == [0.022]
+
+# Processes appending to the same partition at once keep every column in the same row order
+def test_history_concurrent_process_appends(tmp_path):
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=append_from_process, args=(str(tmp_path), writer)) for writer in range(4)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join()
+
+    store = HistoryStore(str(tmp_path))
+    assert store.partition_rows("2025-03-01") == 4 * 40 * 25
+    for writer in range(4):
+        result = store.query(f"P{writer}", ["current_price"])
+        assert len(result["timestamp"]) == 40 * 25
+        assert set(result["timestamp"].tolist()) == {START + writer}
+        assert set(result["current_price"].tolist()) == {writer}
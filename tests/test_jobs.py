@@ -0,0 +1,112 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from valuation_crypto.jobs import JobManager, InMemoryStore
+
+MARKET = {"crypto_id": "Bitcoin", "crypto_symbol": "BTC", "current_price": 50000, "velocity": 2.5}
+
+def wait_for(manager, job_id, status="done", timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not reach {status}: {manager.get(job_id)}")
+
+@pytest.fixture
+def manager():
+    manager = JobManager(workers=2)
+    yield manager
+    manager.shutdown()
+
+# A job runs every stage in the background and records each result
+@patch("valuation_crypto.utils.generate_ai_analysis", return_value=("Mock AI Analysis Text", "mock_image_url"))
+@patch("valuation_crypto.utils.apply_sentiment", side_effect=lambda market, sentiment: dict(market, sentiment_score=0.1))
+@patch("valuation_crypto.utils.fetch_sentiment", return_value={})
+@patch("valuation_crypto.utils.fetch_market_metrics", return_value=MARKET)
+def test_job_runs_all_stages(mock_market, mock_sentiment, mock_apply, mock_ai, manager):
+    job_id = manager.submit(" btc ")
+
+    job = wait_for(manager, job_id)
+
+    assert job["symbol"] == "BTC"
+    assert job["stages"]["market"] == MARKET
+    assert job["stages"]["sentiment"]["sentiment_score"] == 0.1
+    assert job["stages"]["ai"] == {"text": "Mock AI Analysis Text", "image_url": "mock_image_url"}
+    mock_market.assert_called_once_with("BTC")
+
+# Identical requests submitted while a job is in flight share that job
+@patch("valuation_crypto.utils.generate_ai_analysis", return_value=("text", None))
+@patch("valuation_crypto.utils.fetch_sentiment", return_value={"combined_sentiment_score": 0, "current_mentions": 0, "previous_mentions": 0})
+@patch("valuation_crypto.utils.fetch_market_metrics")
+def test_job_deduplicates_inflight_requests(mock_market, mock_sentiment, mock_ai, manager):
+    release = threading.Event()
+    mock_market.side_effect = lambda symbol: release.wait(5) and dict(MARKET, market_cap=1, circulating_supply=1)
+
+    job_ids = {manager.submit("BTC") for _ in range(5)}
+    release.set()
+    wait_for(manager, job_ids.pop())
+
+    assert not job_ids
+    assert mock_market.call_count == 1
+    # Once finished, a new request starts a fresh job
+    assert wait_for(manager, manager.submit("BTC"))
+    assert mock_market.call_count == 2
+
+# Unknown symbols end the job with an error
+@patch("valuation_crypto.utils.fetch_market_metrics", return_value=None)
+def test_job_invalid_symbol(mock_market, manager):
+    job = wait_for(manager, manager.submit("INVALID"), status="error")
+
+    assert job["error"] == "Invalid Crypto Symbol or Data Unavailable."
+
+# The in-process store honours Redis' NX and expiry semantics
+def test_in_memory_store():
+    store = InMemoryStore()
+
+    assert store.set("key", "a", nx=True)
+    assert store.set("key", "b", nx=True) is None
+    assert store.get("key") == "a"
+    store.set("short", "c", ex=0.01)
+    time.sleep(0.02)
+    assert store.get("short") is None
+    assert store.delete("key", "short") == 1
+
+# A job whose record disappeared mid-run is abandoned instead of crashing the worker
+@patch("valuation_crypto.utils.generate_ai_analysis")
+@patch("valuation_crypto.utils.fetch_sentiment")
+@patch("valuation_crypto.utils.fetch_market_metrics")
+def test_job_record_missing(mock_market, mock_sentiment, mock_ai, manager):
+    def reset_store(symbol):
+        manager.store.delete(f"valuation_crypto:job:{job_id}")
+        return MARKET
+    mock_market.side_effect = reset_store
+
+    job_id = manager.submit("BTC")
+    deadline = time.monotonic() + 5
+    while mock_market.call_count == 0 or manager.store.get("valuation_crypto:inflight:BTC"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    mock_sentiment.assert_not_called()
+    mock_ai.assert_not_called()
+    assert manager.get(job_id) is None
+
+# Stage updates extend the in-flight marker, so a slow job is not started twice
+@patch("valuation_crypto.jobs.INFLIGHT_TTL", 0.05)
+@patch("valuation_crypto.utils.generate_ai_analysis", return_value=("text", None))
+@patch("valuation_crypto.utils.apply_sentiment", side_effect=lambda market, sentiment: dict(market, sentiment_score=0.1))
+@patch("valuation_crypto.utils.fetch_sentiment")
+@patch("valuation_crypto.utils.fetch_market_metrics")
+def test_job_extends_inflight_marker(mock_market, mock_sentiment, mock_apply, mock_ai, manager):
+    in_sentiment, release = threading.Event(), threading.Event()
+    mock_market.side_effect = lambda symbol: time.sleep(0.1) or MARKET
+    mock_sentiment.side_effect = lambda market: in_sentiment.set() or release.wait(5) and {}
+
+    job_id = manager.submit("BTC")
+    assert in_sentiment.wait(5)
+    assert manager.submit("BTC") == job_id
+    release.set()
+    wait_for(manager, job_id)
@@ -0,0 +1,87 @@
+import threading
+from unittest.mock import MagicMock, patch
+from valuation_crypto import market_cache
+from valuation_crypto.market_cache import MarketCache, get_market_cache, max_age
+from valuation_crypto.utils import fetch_crypto_data
+
+# Fresh entries are served without calling upstream again
+@patch("valuation_crypto.market_cache.time.monotonic", return_value=100.0)
+def test_market_cache_serves_fresh_entries(mock_clock):
+    cache = MarketCache({"price": (30, 60)})
+    fetch = MagicMock(return_value=50000)
+
+    assert cache.get("price", "BTC", fetch) == 50000
+    mock_clock.return_value = 120.0
+    assert cache.get("price", "BTC", fetch) == 50000
+
+    fetch.assert_called_once()
+    assert cache.stats["price"]["hits"] == 1
+    assert cache.stats["price"]["misses"] == 1
+    assert cache.stats["price"]["hit_ratio"] == 0.5
+    assert cache.ages("price") == {"price": {"BTC": 20.0}}
+
+# Stale entries are served immediately and refreshed in the background
+@patch("valuation_crypto.market_cache.time.monotonic", return_value=100.0)
+def test_market_cache_stale_while_revalidate(mock_clock):
+    cache = MarketCache({"price": (30, 60)})
+    refreshed = threading.Event()
+    cache.get("price", "BTC", lambda: 50000)
+
+    mock_clock.return_value = 150.0
+    assert cache.get("price", "BTC", lambda: refreshed.set() or 51000) == 50000
+    assert refreshed.wait(5)
+    cache.shutdown()
+
+    assert cache.get("price", "BTC", lambda: 52000) == 51000
+    assert cache.stats["price"]["stale_hits"] == 1
+    assert cache.stats["price"]["refreshes"] == 1
+
+# Background refreshes run in the caller's context
+@patch("valuation_crypto.market_cache.time.monotonic", return_value=100.0)
+def test_market_cache_refresh_keeps_context(mock_clock):
+    cache = MarketCache({"price": (30, 60)})
+    seen = []
+    cache.get("price", "BTC", lambda: 50000)
+
+    mock_clock.return_value = 150.0
+    with max_age(100):
+        cache.get("price", "BTC", lambda: seen.append(market_cache._max_age.get()) or 51000)
+    cache.shutdown()
+
+    assert seen == [100]
+
+# Entries past the stale window are fetched again synchronously; failures are not cached
+@patch("valuation_crypto.market_cache.time.monotonic", return_value=100.0)
+def test_market_cache_expired_and_failed_fetches(mock_clock):
+    cache = MarketCache({"price": (30, 60)})
+    cache.get("price", "BTC", lambda: 50000)
+
+    mock_clock.return_value = 200.0
+    assert cache.get("price", "BTC", lambda: 53000) == 53000
+    assert cache.get("price", "XYZ", lambda: None) is None
+    assert cache.get("price", "XYZ", lambda: 1) == 1
+    assert cache.stats["price"]["misses"] == 4
+
+# Within max_age, entries older than the limit are refetched even while fresh
+@patch("valuation_crypto.market_cache.time.monotonic", return_value=100.0)
+def test_market_cache_max_age(mock_clock):
+    cache = MarketCache({"price": (30, 60)})
+    cache.get("price", "BTC", lambda: 50000)
+
+    mock_clock.return_value = 110.0
+    with max_age(5):
+        assert cache.get("price", "BTC", lambda: 51000) == 51000
+        assert cache.get("price", "BTC", lambda: 52000) == 51000
+    with max_age(0):
+        assert cache.get("price", "BTC", lambda: 53000) == 53000
+    assert cache.get("price", "BTC", lambda: 54000) == 53000
+    assert cache.stats["price"]["misses"] == 3
+
+# fetch_crypto_data answers repeated lookups from the cache
+@patch("valuation_crypto.utils.fetch_crypto_quotes", return_value={"BTC": {"name": "Bitcoin"}})
+def test_fetch_crypto_data_is_cached(mock_quotes):
+    assert fetch_crypto_data("BTC") == {"name": "Bitcoin"}
+    assert fetch_crypto_data("BTC") == {"name": "Bitcoin"}
+
+    mock_quotes.assert_called_once()
+    assert get_market_cache().stats["crypto_data"]["hits"] == 1
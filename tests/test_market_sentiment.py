@@ -0,0 +1,107 @@
+import pandas as pd
+from unittest.mock import patch, MagicMock
+from valuation_crypto import market_sentiment_reddit_gtrend as sentiment
+
+NOW = 1_750_000_000
+DAY = 24 * 60 * 60
+
+def make_post(post_id, age_days, title="Bitcoin is great", selftext=""):
+    return MagicMock(id=post_id, created_utc=NOW - age_days * DAY, title=title, selftext=selftext)
+
+# One all-time search per subreddit, bucketed into current and previous mentions
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.reddit")
+def test_collect_reddit_mentions_single_pass(mock_reddit):
+    posts = {
+        "CryptoCurrency": [make_post("a", 10), make_post("b", 400), make_post("c", 900)],
+        "altcoin": [make_post("a", 10), make_post("d", 30, title="Bitcoin is terrible")],
+    }
+    subreddits = {name: MagicMock(search=MagicMock(return_value=found)) for name, found in posts.items()}
+    mock_reddit.subreddit.side_effect = subreddits.get
+
+    current, average, previous = sentiment.collect_reddit_mentions("Bitcoin", "BTC", list(posts), now=NOW)
+
+    assert (current, previous) == (2, 2)
+    assert average == (0.8 + -1.0) / 2
+    for subreddit in subreddits.values():
+        subreddit.search.assert_called_once_with("Bitcoin OR BTC", time_filter="all")
+
+# Aggregation combines Reddit sentiment with the normalized Google Trends score
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.fetch_trends_batch")
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.collect_reddit_mentions", return_value=(30, 0.2, 10))
+def test_aggregate_sentiment_analysis(mock_mentions, mock_trends):
+    mock_trends.return_value = {"Bitcoin": {"score": 75, "relative_score": 300}}
+
+    result = sentiment.aggregate_sentiment_analysis([("Bitcoin", "BTC")])
+
+    assert result["BTC"]["current_mentions"] == 30
+    assert result["BTC"]["previous_mentions"] == 10
+    assert result["BTC"]["acceleration"] == 2
+    assert result["BTC"]["combined_sentiment_score"] == (0.2 + 0.5) / 2
+    assert result["BTC"]["google_trends_relative_score"] == 300
+    assert mock_mentions.call_count == 1
+    mock_trends.assert_called_once_with(["Bitcoin"])
+
+# Repeated scans reuse cached listings and polarities instead of downloading and scoring again
+@patch("textblob.TextBlob")
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.reddit")
+def test_collect_reddit_mentions_uses_sentiment_cache(mock_reddit, mock_textblob):
+    mock_textblob.return_value.sentiment.polarity = 0.5
+    search = mock_reddit.subreddit.return_value.search
+    search.return_value = [make_post("a", 10), make_post("b", 20), make_post("c", 500)]
+
+    first = sentiment.collect_reddit_mentions("Bitcoin", "BTC", ["CryptoCurrency"], now=NOW)
+    second = sentiment.collect_reddit_mentions("Bitcoin", "BTC", ["CryptoCurrency"], now=NOW)
+
+    assert first == second == (2, 0.5, 1)
+    assert search.call_count == 1
+    assert mock_textblob.call_count == 2
+
+# Overlapping coins share post polarities; edited posts are scored again
+@patch("textblob.TextBlob")
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.reddit")
+def test_collect_reddit_mentions_rescores_edited_posts(mock_reddit, mock_textblob):
+    mock_textblob.return_value.sentiment.polarity = 0.5
+    search = mock_reddit.subreddit.return_value.search
+    search.return_value = [make_post("a", 10), make_post("b", 20)]
+    sentiment.collect_reddit_mentions("Bitcoin", "BTC", ["CryptoCurrency"], now=NOW)
+
+    search.return_value = [make_post("a", 10), make_post("b", 20, selftext="edited")]
+    sentiment.collect_reddit_mentions("Ethereum", "ETH", ["CryptoCurrency"], now=NOW)
+
+    assert mock_textblob.call_count == 3
+
+def trends_frame(columns):
+    return pd.DataFrame({**columns, "isPartial": [False] * len(next(iter(columns.values())))})
+
+# Five keywords per payload, anchor scaling, and a per-day series cache
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.pytrends")
+def test_fetch_trends_batch(mock_pytrends):
+    payloads = []
+    frames = [
+        trends_frame({"Bitcoin": [100, 80], "Ethereum": [40, 20], "Solana": [10, 10], "XRP": [5, 4], "cryptocurrency": [50, 25]}),
+        trends_frame({"Cardano": [2, 3], "cryptocurrency": [20, 10]}),
+    ]
+    mock_pytrends.build_payload.side_effect = lambda keywords, **kwargs: payloads.append(keywords)
+    mock_pytrends.interest_over_time.side_effect = frames
+    names = ["Bitcoin", "Ethereum", "Solana", "XRP", "Cardano"]
+
+    result = sentiment.fetch_trends_batch(names)
+    cached = sentiment.fetch_trends_batch(names)
+
+    assert payloads == [["Bitcoin", "Ethereum", "Solana", "XRP", "cryptocurrency"], ["Cardano", "cryptocurrency"]]
+    assert result == cached
+    assert result["Bitcoin"] == {"score": 80.0, "relative_score": 160.0}
+    assert result["Ethereum"] == {"score": 50.0, "relative_score": 40.0}
+    assert result["Cardano"] == {"score": 100.0, "relative_score": 15.0}
+
+# A single coin gets its own keyword-only payload, so its score keeps the full 0-100 resolution
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.pytrends")
+def test_fetch_trends_single_coin_unanchored(mock_pytrends):
+    payloads = []
+    mock_pytrends.build_payload.side_effect = lambda keywords, **kwargs: payloads.append(keywords)
+    mock_pytrends.interest_over_time.return_value = trends_frame({"Solana": [40, 100, 63]})
+
+    result = sentiment.fetch_trends_batch(["Solana"])
+
+    assert payloads == [["Solana"]]
+    assert result == {"Solana": {"score": 63.0, "relative_score": None}}
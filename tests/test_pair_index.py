@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+from unittest.mock import patch, MagicMock
+from valuation_crypto import utils
+from valuation_crypto.exchanges import ExchangePool
+from valuation_crypto.pair_index import PairIndex, build_pair_index, resolve_market
+
+def make_exchange(symbols, tickers=None):
+    exchange = MagicMock()
+    exchange.symbols = symbols
+    exchange.fetch_ticker.side_effect = lambda pair: tickers[pair]
+    return exchange
+
+# Pairs are keyed on base and quote, so ETH never matches ETHFI
+def test_resolve_market_quote_order():
+    pairs = build_pair_index(make_exchange(["ETHFI/USDT", "ETH/USDC", "ETH/BTC", "SOL/BTC", "SOL/USD", "BTC-PERP"]))
+
+    assert pairs["ETH"] == {"USDC": "ETH/USDC", "BTC": "ETH/BTC"}
+    assert resolve_market(pairs, "ETH") == ("ETH/USDC", "USDC")
+    assert resolve_market(pairs, "SOL") == ("SOL/USD", "USD")
+    assert resolve_market(pairs, "XRP") is None
+
+# The index survives restarts; outdated versions are ignored
+def test_pair_index_persistence(tmp_path):
+    path = str(tmp_path / "pairs.json")
+    index = PairIndex(path)
+
+    assert index.update("binance", make_exchange(["BTC/USDT"])) is True
+    assert index.update("binance", make_exchange(["BTC/USDT"])) is False
+    assert index.stats == {"rebuilt": 1, "unchanged": 1}
+    assert PairIndex(path).pairs("binance") == {"BTC": {"USDT": "BTC/USDT"}}
+
+    with open(path) as file:
+        data = json.load(file)
+    data["version"] = 0
+    with open(path, "w") as file:
+        json.dump(data, file)
+    assert PairIndex(path).pairs("binance") is None
+
+def update_from_process(path, exchange_id):
+    index = PairIndex(path)
+    for _ in range(20):
+        index.update(exchange_id, make_exchange([f"{exchange_id.upper()}/USDT"]))
+
+# Processes sharing the index file merge their exchanges instead of overwriting each other's
+def test_pair_index_concurrent_process_saves(tmp_path):
+    path = str(tmp_path / "pairs.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=update_from_process, args=(path, f"ex{writer}")) for writer in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    index = PairIndex(path)
+    assert index.exchanges() == ["ex0", "ex1", "ex2", "ex3"]
+    assert index.pairs("ex2") == {"EX2": {"USDT": "EX2/USDT"}}
+
+# A fresh persistent index resolves pairs without creating the exchange or loading markets
+@patch("ccxt.kraken")
+def test_exchange_pool_uses_persistent_index(mock_kraken, tmp_path):
+    index = PairIndex(str(tmp_path / "pairs.json"))
+    index.update("kraken", make_exchange(["BTC/USD"]))
+    pool = ExchangePool(pair_index=index)
+
+    assert pool.resolve_pair("kraken", "BTC") == "BTC/USD"
+    assert pool.resolve_pair("kraken", "ETH") is None
+    mock_kraken.assert_not_called()
+    assert pool.stats["index_hits"] == 1
+
+# Volumes of BTC-quoted pairs are converted to USD with the exchange's BTC price
+@patch("ccxt.binance")
+def test_fetch_trading_volume_btc_converted(mock_binance):
+    mock_binance.return_value = make_exchange(
+        ["XYZ/BTC", "BTC/USDT"],
+        {"XYZ/BTC": {"quoteVolume": 2.5}, "BTC/USDT": {"last": 60000}})
+
+    assert utils.fetch_trading_volume("XYZ", ["binance"]) == 150000
+
+# The bulk scan requests the BTC price alongside the tickers that need converting
+@patch("ccxt.binance")
+def test_fetch_trading_volumes_btc_converted(mock_binance):
+    exchange = make_exchange(["XYZ/BTC", "ETH/USDT", "BTC/USDT"])
+    exchange.has = {"fetchTickers": True}
+    exchange.fetch_tickers.return_value = {
+        "XYZ/BTC": {"quoteVolume": 2.5}, "ETH/USDT": {"quoteVolume": 700}, "BTC/USDT": {"last": 60000}}
+    mock_binance.return_value = exchange
+
+    assert utils.fetch_trading_volumes(["XYZ", "ETH"], ["binance"]) == {"XYZ": 150000, "ETH": 700}
+    exchange.fetch_tickers.assert_called_once_with(["XYZ/BTC", "ETH/USDT", "BTC/USDT"])
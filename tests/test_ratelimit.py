@@ -0,0 +1,38 @@
+from unittest.mock import patch
+from valuation_crypto.ratelimit import RateLimiter, TokenBucket
+
+# Requests within the burst capacity never wait
+@patch("valuation_crypto.ratelimit.time.sleep")
+def test_rate_limiter_no_wait_under_budget(mock_sleep):
+    limiter = RateLimiter({"reddit": (1.0, 3)})
+
+    waits = [limiter.acquire("reddit") for _ in range(3)]
+
+    assert waits == [0.0, 0.0, 0.0]
+    mock_sleep.assert_not_called()
+    assert limiter.stats["reddit"] == {"requests": 3, "waits": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+# Once the budget is exhausted callers wait exactly for the deficit
+@patch("valuation_crypto.ratelimit.time.sleep")
+@patch("valuation_crypto.ratelimit.time.monotonic", return_value=100.0)
+def test_rate_limiter_waits_when_exhausted(mock_monotonic, mock_sleep):
+    limiter = RateLimiter({"cmc": (0.5, 1)})
+
+    limiter.acquire("cmc")
+    wait = limiter.acquire("cmc")
+
+    assert wait == 2.0
+    mock_sleep.assert_called_once_with(2.0)
+    assert limiter.stats["cmc"]["waits"] == 1
+    assert limiter.stats["cmc"]["max_wait"] == 2.0
+
+# A 429 from the provider blocks the bucket for the backoff period
+@patch("valuation_crypto.ratelimit.time.monotonic")
+def test_token_bucket_penalize(mock_monotonic):
+    mock_monotonic.return_value = 0.0
+    bucket = TokenBucket(rate=10.0, capacity=10)
+
+    bucket.penalize(30)
+    mock_monotonic.return_value = 10.0
+
+    assert bucket.reserve() == 20.0
@@ -0,0 +1,73 @@
+import csv
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import pandas as pd
+from valuation_crypto import batch, market_sentiment_reddit_gtrend, replay, utils
+from valuation_crypto.ai_cache import configure_ai_cache
+from valuation_crypto.clients import LazyClient
+from valuation_crypto.market_cache import get_market_cache
+from valuation_crypto.sentiment_cache import configure_sentiment_cache
+from valuation_crypto.singleflight import flights
+
+def write_results(path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=batch.CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerow({"Rank": 1, "Crypto ID": "Bitcoin", "Symbol": "BTC", "Current Price": 50000,
+                         "Market Cap Percentage %": 60, "Circulating Supply": 1000, "Total 24h Volume": 900,
+                         "Current Mentions": 3, "Previous Mentions": 2})
+    return path
+
+# A synthesized cassette reproduces the recorded market data and mention counts without any network access
+def test_replay_synthetic_cassette(tmp_path):
+    cassette = replay.synthesize_cassette(write_results(tmp_path / "run.csv"))
+
+    with replay.replaying(cassette):
+        result, image_url = utils.analyze_crypto("BTC")
+
+    assert result["current_price"] == 50000
+    assert result["market_cap"] == 50000 * 1000
+    assert (result["current_mentions"], result["previous_mentions"]) == (3, 2)
+    assert result["ai_text"] == cassette["openai"]["chat"]["default"]
+    assert image_url == cassette["openai"]["images"]["default"]
+
+# Responses captured by recording() are served back identically by replaying()
+def test_record_then_replay(tmp_path):
+    quote = {"name": "Bitcoin", "symbol": "BTC", "circulating_supply": 1000,
+             "quote": {"USD": {"price": 50000, "market_cap": 5e7, "market_cap_dominance": 60}}}
+    cmc = MagicMock()
+    cmc.get.return_value = SimpleNamespace(status_code=200, json=lambda: {"data": {"BTC": quote}})
+    exchange = MagicMock(id="binance", rateLimit=50, symbols=["BTC/USDT"],
+                         markets={"BTC/USDT": {"base": "BTC", "quote": "USDT", "spot": True}})
+    exchange.fetch_ticker.return_value = {"quoteVolume": 1000.0, "last": 50000}
+    reddit = MagicMock()
+    reddit.subreddit.return_value.search.return_value = [
+        SimpleNamespace(id="a", title="Bitcoin is great", selftext="", created_utc=4102444800)]
+    trends = MagicMock()
+    trends.interest_over_time.return_value = pd.DataFrame({"Bitcoin": [10.0, 20.0], "cryptocurrency": [50.0, 50.0]})
+    openai = MagicMock()
+    openai.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Recorded analysis"))])
+    openai.images.generate.return_value = SimpleNamespace(data=[SimpleNamespace(url="https://img/1.png")])
+
+    with patch.object(utils, "cmc_session", LazyClient(lambda: cmc)), \
+            patch.object(utils, "client", LazyClient(lambda: openai)), \
+            patch.object(utils, "store_image", lambda key, url: url), \
+            patch("valuation_crypto.market_sentiment_reddit_gtrend.reddit", LazyClient(lambda: reddit)), \
+            patch("valuation_crypto.market_sentiment_reddit_gtrend.pytrends", LazyClient(lambda: trends)), \
+            patch("ccxt.binance", lambda *args: exchange):
+        with replay.recording(exchange_ids=["binance"]) as cassette:
+            recorded = utils.analyze_crypto("BTC")
+
+    replay.save_cassette(cassette, tmp_path / "cassette.json")
+    # Nothing may be answered from the caches filled while recording
+    flights.reset()
+    get_market_cache().clear()
+    configure_sentiment_cache(":memory:")
+    market_sentiment_reddit_gtrend._trends_cache.clear()
+    configure_ai_cache(images=str(tmp_path / "images"))
+    with replay.replaying(replay.load_cassette(tmp_path / "cassette.json"), exchange_ids=["binance"]):
+        replayed = utils.analyze_crypto("BTC")
+
+    assert cassette["exchanges"]["binance"]["tickers"]["BTC/USDT"]["quoteVolume"] == 1000.0
+    assert replayed == recorded
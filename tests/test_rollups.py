@@ -0,0 +1,50 @@
+import numpy as np
+from valuation_crypto.history import HistoryStore
+from valuation_crypto.rollups import HistoryRollups
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+START = 1740787200  # 2025-03-01T00:00:00Z
+
+def record(symbol, timestamp, price, sentiment=None):
+    return {"crypto_symbol": symbol, "timestamp": timestamp, "current_price": price, "velocity": price / 10,
+            "sentiment_score": sentiment}
+
+# Records are averaged per coin and hour, ignoring missing values
+def test_rollup_series(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append([record("BTC", START, 100, 0.2), record("BTC", START + 600, 200), record("BTC", START + HOUR, 300, 0.4),
+                  record("ETH", START, 10, 0.1)])
+
+    hourly = HistoryRollups(store).series("btc", "hour")
+
+    assert hourly["timestamp"].tolist() == [START, START + HOUR]
+    assert hourly["count"].tolist() == [2, 1]
+    assert hourly["current_price"].tolist() == [150, 300]
+    assert hourly["sentiment_score"].tolist() == [0.2, 0.4]
+    assert np.isnan(hourly["valuation_difference"]).all()
+
+# 'auto' switches from hourly to daily buckets for long histories
+def test_rollup_auto_resolution(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    rollups = HistoryRollups(store)
+    store.append([record("BTC", START + day * DAY + hour * HOUR, 100) for day in range(3) for hour in range(2)])
+
+    assert len(rollups.series("BTC")["timestamp"]) == 6
+    store.append([record("BTC", START + day * DAY, 100) for day in range(3, 60)])
+    daily = rollups.series("BTC")
+    assert len(daily["timestamp"]) == 60
+    assert daily["count"][:3].tolist() == [2, 2, 2]
+
+# Only partitions that changed are rolled up again
+def test_rollup_refresh_is_incremental(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append([record("BTC", START, 100), record("BTC", START + DAY, 200)])
+    rollups = HistoryRollups(store)
+    rollups.series("BTC")
+    first_day = rollups._partitions["2025-03-01"]
+
+    store.append([record("BTC", START + DAY + 60, 400)])
+
+    assert rollups.series("BTC", "day")["current_price"].tolist() == [100, 300]
+    assert rollups._partitions["2025-03-01"] is first_day
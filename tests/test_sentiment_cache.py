@@ -0,0 +1,30 @@
+from unittest.mock import patch
+from valuation_crypto.sentiment_cache import SentimentCache
+
+# Stored polarities come back keyed by submission id
+def test_sentiment_cache_roundtrip():
+    cache = SentimentCache(":memory:")
+    cache.put_posts([("a", 0.5, "h1", 100.0), ("b", None, "h2", 200.0)])
+
+    assert cache.get_polarities(["a", "b", "c"]) == {"a": (0.5, "h1")}
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 2
+
+# Search listings expire, and are dropped when one of their posts was evicted
+@patch("valuation_crypto.sentiment_cache.time.time")
+def test_sentiment_cache_search_expiry_and_eviction(mock_time):
+    mock_time.return_value = 1000.0
+    cache = SentimentCache(":memory:", max_posts=1)
+    cache.put_posts([("a", 0.5, "h1", 100.0)])
+    cache.put_search("CryptoCurrency", "Bitcoin OR BTC", ["a"])
+
+    assert cache.get_search("CryptoCurrency", "Bitcoin OR BTC", max_age=60) == [("a", 100.0, 0.5)]
+
+    mock_time.return_value = 1100.0
+    assert cache.get_search("CryptoCurrency", "Bitcoin OR BTC", max_age=60) is None
+
+    cache.put_posts([("b", 0.1, "h2", 300.0)])
+    cache.evict()
+    assert cache.get_polarities(["a", "b"]) == {"b": (0.1, "h2")}
+    assert cache.get_search("CryptoCurrency", "Bitcoin OR BTC", max_age=600) is None
+    assert cache.stats["evicted"] == 1
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from textblob import TextBlob
+import time
+import pytest
+from valuation_crypto import market_sentiment_reddit_gtrend, sentiment_scoring
+from valuation_crypto.sentiment_scoring import LexiconScorer, configure_scorer, score_texts
+
+TEXTS = ["Bitcoin is great", "Ethereum looks terrible today", "Solana is not good", "no opinion"]
+
+# The default scorer reproduces TextBlob's per-post polarity
+def test_score_texts_matches_textblob():
+    assert score_texts(TEXTS) == [TextBlob(text).sentiment.polarity for text in TEXTS]
+    assert score_texts([]) == []
+
+# The vectorized lexicon scorer averages matched words and flips negated ones
+def test_lexicon_scorer():
+    scorer = LexiconScorer({"great": 0.8, "terrible": -1.0, "good": 0.7})
+
+    scores = scorer.score(TEXTS + [""])
+
+    assert scores == [0.8, -1.0, -0.35, 0.0, 0.0]
+
+# Large inputs are split into batches and scored in worker processes, keeping order
+@patch.object(sentiment_scoring, "PARALLEL_THRESHOLD", 4)
+def test_score_texts_process_pool():
+    scorer = LexiconScorer({"great": 0.8, "terrible": -1.0, "good": 0.7})
+    texts = TEXTS * 3
+    try:
+        scores = score_texts(texts, scorer=scorer, processes=2, batch_size=5)
+    finally:
+        sentiment_scoring.shutdown_scoring_pool()
+
+    assert scores == scorer.score(texts)
+
+# The configured scorer is used for Reddit posts when none is passed
+def test_configure_scorer():
+    scorer = configure_scorer(LexiconScorer({"great": 0.8, "terrible": -1.0}))
+    posts = {"a": (time.time(), "Bitcoin is great"), "b": (time.time(), "Ethereum looks terrible today")}
+
+    assert score_texts(TEXTS[:2]) == [0.8, -1.0]
+    assert market_sentiment_reddit_gtrend.score_reddit_posts("BTC", posts) == (2, pytest.approx(-0.1), 0)
+    assert isinstance(configure_scorer("lexicon"), LexiconScorer) and configure_scorer() is not scorer
@@ -0,0 +1,62 @@
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from valuation_crypto.singleflight import SingleFlight, flights
+from valuation_crypto.utils import fetch_crypto_data
+
+def run_concurrently(group, fn, callers, *args):
+    """Starts `callers` identical calls and releases the leader once all of them are waiting on it."""
+    release = threading.Event()
+
+    def blocking(*args):
+        release.wait(5)
+        return fn(*args)
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(group.do, "fn", blocking, *args) for _ in range(callers)]
+        while group.stats.get("fn", {}).get("calls", 0) < callers:
+            threading.Event().wait(0.01)
+        release.set()
+        return futures
+
+# Concurrent identical calls run once and share the result
+def test_single_flight_coalesces_concurrent_calls():
+    group = SingleFlight()
+    calls = []
+
+    futures = run_concurrently(group, lambda symbol: calls.append(symbol) or {"symbol": symbol}, 8, "BTC")
+
+    assert [future.result() for future in futures] == [{"symbol": "BTC"}] * 8
+    assert calls == ["BTC"]
+    assert group.stats["fn"] == {"calls": 8, "executions": 1, "coalesced": 7, "hit_ratio": 7 / 8}
+    assert group.inflight() == 0
+
+# Every waiter sees the leader's exception, and the next call runs again
+def test_single_flight_shares_exceptions():
+    group = SingleFlight()
+
+    def failing(symbol):
+        raise ValueError(symbol)
+
+    futures = run_concurrently(group, failing, 3, "BTC")
+
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+    assert group.do("fn", lambda: "fresh") == "fresh"
+    assert group.stats["fn"]["executions"] == 2
+
+# Calls with different arguments are not coalesced
+def test_single_flight_keys_on_arguments():
+    group = SingleFlight()
+
+    assert group.do("fn", str.upper, "btc") == "BTC"
+    assert group.do("fn", str.upper, "eth") == "ETH"
+    assert group.stats["fn"]["coalesced"] == 0
+
+# The public fetchers are routed through the shared group
+@patch("valuation_crypto.utils.fetch_crypto_quotes", return_value={"BTC": {"name": "Bitcoin"}})
+def test_fetch_crypto_data_is_single_flight(mock_quotes):
+    assert fetch_crypto_data("BTC") == {"name": "Bitcoin"}
+    assert flights.stats["utils.fetch_crypto_data"]["executions"] == 1
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from valuation_crypto.telemetry import Telemetry, metrics_text, propagate, telemetry, trace
+
+# Spans are aggregated into cumulative histograms labelled by span, provider and cache outcome
+def test_span_histograms():
+    recorder = Telemetry(buckets=(0.1, 1.0, float("inf")))
+    recorder.observe("reddit_search", 0.05, provider="reddit", cache_hit=False)
+    recorder.observe("reddit_search", 0.5, provider="reddit", cache_hit=False)
+    with pytest.raises(ValueError):
+        with recorder.span("trends_payload", provider="google_trends") as current:
+            current.retries = 2
+            raise ValueError("boom")
+
+    text = recorder.render()
+
+    assert 'valuation_span_seconds_bucket{span="reddit_search",provider="reddit",cache="miss",le="0.1"} 1' in text
+    assert 'valuation_span_seconds_bucket{span="reddit_search",provider="reddit",cache="miss",le="+Inf"} 2' in text
+    assert 'valuation_span_seconds_count{span="reddit_search",provider="reddit",cache="miss"} 2' in text
+    assert 'valuation_span_retries_total{span="trends_payload",provider="google_trends"} 2' in text
+    assert 'valuation_span_errors_total{span="trends_payload",provider="google_trends"} 1' in text
+
+# A trace collects the spans of one request, including those recorded on executor threads
+def test_trace_breakdown_across_threads():
+    with trace("analyze_crypto", symbol="BTC", log=False) as current:
+        with telemetry.span("market"):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                pool.submit(propagate(telemetry.observe), "exchange_ticker", 0.25, provider="binance").result()
+                pool.submit(telemetry.observe, "exchange_ticker", 9.0, provider="kraken").result()
+
+    breakdown = current.breakdown()
+    assert breakdown["exchange_ticker[binance]"] == 0.25
+    assert "exchange_ticker[kraken]" not in breakdown
+    assert "market" in breakdown
+    assert all(span.symbol == "BTC" for span in current.spans)
+    assert current.summary().startswith("analyze_crypto BTC")
+
+# The exposition includes rate limiter, market cache and single-flight stats
+def test_metrics_text():
+    telemetry.observe("cmc_quotes", 0.2, provider="coinmarketcap")
+
+    text = metrics_text()
+
+    assert "# TYPE valuation_span_seconds histogram" in text
+    assert 'valuation_span_seconds_count{span="cmc_quotes",provider="coinmarketcap",cache=""} 1' in text
+    assert "# TYPE valuation_rate_limit_wait_seconds_total counter" in text
@@ -1,6 +1,12 @@
+import json
+import sys
+import threading
+from types import SimpleNamespace
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
-from valuation_crypto import utils
+from valuation_crypto import batch, utils
+from valuation_crypto.clients import reset_client
 
 @pytest.fixture
 def mock_crypto_data():
@@ -12,7 +18,7 @@ def mock_crypto_data():
     }
 
 # fetching crypto data from API
-@patch("valuation_crypto.utils.requests.get")
+@patch("valuation_crypto.utils.cmc_session.get")
 def test_fetch_crypto_data(mock_get, mock_crypto_data):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -27,7 +33,7 @@ def test_fetch_crypto_data(mock_get, mock_crypto_data):
     assert result["quote"]["USD"]["price"] == 50000
 
 # API error handling
-@patch("valuation_crypto.utils.requests.get")
+@patch("valuation_crypto.utils.cmc_session.get")
 def test_fetch_crypto_data_error(mock_get):
     mock_response = MagicMock()
     mock_response.status_code = 404  # Simulating an invalid request
@@ -37,9 +43,50 @@ def test_fetch_crypto_data_error(mock_get):
 
     assert result is None, "Expected None response for invalid API call"
 
+# Many symbols are fetched in comma-separated batches
+@patch("valuation_crypto.utils.cmc_session.get")
+def test_fetch_crypto_quotes_batches(mock_get, mock_crypto_data):
+    def respond(url, params, timeout):
+        symbols = params["symbol"].split(",")
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"data": {s: dict(mock_crypto_data, symbol=s) for s in symbols if s != "NOPE"}}
+        return mock_response
+    mock_get.side_effect = respond
+
+    result = utils.fetch_crypto_quotes(["btc", "ETH", "SOL", "BTC", "NOPE"], batch_size=2)
+
+    assert set(result) == {"BTC", "ETH", "SOL"}
+    assert result["ETH"]["symbol"] == "ETH"
+    assert [call.kwargs["params"]["symbol"] for call in mock_get.call_args_list] == ["BTC,ETH", "SOL,NOPE"]
+
+# The lazily built CoinMarketCap session forwards get() to requests, for quotes and listings alike
+@patch("requests.Session.send")
+def test_cmc_requests_through_lazy_session(mock_send, mock_crypto_data):
+    def respond(request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response._content = json.dumps({"data": {"BTC": mock_crypto_data} if "quotes" in request.url
+                                        else [mock_crypto_data]}).encode()
+        return response
+    mock_send.side_effect = respond
+    reset_client(utils.cmc_session)
+
+    with patch.dict(sys.modules, {"valuation_crypto.apikey": SimpleNamespace(cmc_api="test-key")}):
+        quotes = utils.fetch_crypto_quotes(["BTC"])
+        listings = batch.fetch_top_cryptocurrencies(5)
+    reset_client(utils.cmc_session)
+
+    assert quotes["BTC"]["name"] == "Bitcoin"
+    assert listings == [mock_crypto_data]
+    requests_sent = [call.args[0] for call in mock_send.call_args_list]
+    assert [request.headers["X-CMC_PRO_API_KEY"] for request in requests_sent] == ["test-key"] * 2
+    assert "symbol=BTC" in requests_sent[0].url and "limit=5" in requests_sent[1].url
+
 # Fetching trading volume from multiple exchanges
-@patch("valuation_crypto.utils.ccxt.binance")
-@patch("valuation_crypto.utils.ccxt.kraken")
+@patch("ccxt.binance")
+@patch("ccxt.kraken")
 def test_fetch_trading_volume(mock_binance, mock_kraken):
     mock_exchange_binance = MagicMock()
     mock_exchange_binance.load_markets.return_value = None
@@ -59,7 +106,7 @@ def test_fetch_trading_volume(mock_binance, mock_kraken):
     assert result == 3500, f"Expected 3500, got {result}"
 
 # Handling of missing trading volume
-@patch("valuation_crypto.utils.ccxt.binance")
+@patch("ccxt.binance")
 def test_fetch_trading_volume_no_data(mock_binance):
     mock_exchange = MagicMock()
     mock_exchange.load_markets.return_value = None
@@ -122,3 +169,130 @@ def test_analyze_crypto_openai_failure(mock_chatgpt, mock_sentiment, mock_volume
 
     assert "OpenAI API Error" in result["ai_text"], "Expected OpenAI API failure message"
 
+
+# Per-exchange status and latency in the concurrent volume breakdown
+@patch("ccxt.binance")
+@patch("ccxt.kraken")
+def test_fetch_volume_breakdown_reports_failures(mock_kraken, mock_binance):
+    mock_exchange_binance = MagicMock()
+    mock_exchange_binance.symbols = ["BTC/USDT"]
+    mock_exchange_binance.fetch_ticker.return_value = {"quoteVolume": 1500}
+
+    mock_exchange_kraken = MagicMock()
+    mock_exchange_kraken.symbols = ["BTC/USD"]
+    mock_exchange_kraken.fetch_ticker.side_effect = Exception("Kraken down")
+
+    mock_binance.return_value = mock_exchange_binance
+    mock_kraken.return_value = mock_exchange_kraken
+
+    result = utils.fetch_volume_breakdown("BTC", ["binance", "kraken"])
+
+    assert result["total_volume_24h"] == 1500
+    assert result["exchanges"]["binance"]["status"] == "ok"
+    assert result["exchanges"]["kraken"]["status"] == "error"
+    assert "Kraken down" in result["exchanges"]["kraken"]["error"]
+
+# Slow exchanges are cut off by the overall deadline
+@patch("ccxt.binance")
+@patch("ccxt.kraken")
+def test_fetch_volume_breakdown_deadline(mock_kraken, mock_binance):
+    release = threading.Event()
+
+    mock_exchange_binance = MagicMock()
+    mock_exchange_binance.symbols = ["BTC/USDT"]
+    mock_exchange_binance.fetch_ticker.return_value = {"quoteVolume": 1500}
+
+    mock_exchange_kraken = MagicMock()
+    mock_exchange_kraken.symbols = ["BTC/USD"]
+    mock_exchange_kraken.fetch_ticker.side_effect = lambda pair: release.wait(5) and {"quoteVolume": 2000}
+
+    mock_binance.return_value = mock_exchange_binance
+    mock_kraken.return_value = mock_exchange_kraken
+
+    try:
+        result = utils.fetch_volume_breakdown("BTC", ["binance", "kraken"], deadline=0.2)
+    finally:
+        release.set()
+
+    assert result["total_volume_24h"] == 1500
+    assert result["exchanges"]["kraken"]["status"] == "timeout"
+    assert result["latency"] < 1
+
+# Bulk volume scan: one fetch_tickers call per exchange for the whole symbol list
+@patch("ccxt.binance")
+@patch("ccxt.kraken")
+def test_fetch_trading_volumes(mock_kraken, mock_binance):
+    mock_exchange_binance = MagicMock()
+    mock_exchange_binance.symbols = ["BTC/USDT", "ETH/USDT", "ETHFI/USDT"]
+    mock_exchange_binance.has = {"fetchTickers": True}
+    mock_exchange_binance.fetch_tickers.return_value = {
+        "BTC/USDT": {"quoteVolume": 1500},
+        "ETH/USDT": {"quoteVolume": 700},
+    }
+
+    mock_exchange_kraken = MagicMock()
+    mock_exchange_kraken.symbols = ["BTC/USD"]
+    mock_exchange_kraken.has = {"fetchTickers": True}
+    mock_exchange_kraken.fetch_tickers.return_value = {"BTC/USD": {"quoteVolume": 2000}}
+
+    mock_binance.return_value = mock_exchange_binance
+    mock_kraken.return_value = mock_exchange_kraken
+
+    result = utils.fetch_trading_volumes(["BTC", "ETH", "SOL"], ["binance", "kraken"])
+
+    assert result == {"BTC": 3500, "ETH": 700, "SOL": 0}
+    mock_exchange_binance.fetch_tickers.assert_called_once_with(["BTC/USDT", "ETH/USDT"])
+    mock_exchange_kraken.fetch_tickers.assert_called_once_with(["BTC/USD"])
+    mock_exchange_binance.fetch_ticker.assert_not_called()
+
+# The analysis prompt is sent once, concurrently with the image request
+@patch("valuation_crypto.utils.fetch_crypto_data")
+@patch("valuation_crypto.utils.fetch_trading_volume")
+@patch("valuation_crypto.market_sentiment_reddit_gtrend.aggregate_sentiment_analysis")
+@patch("valuation_crypto.utils.client.chat.completions.create")
+@patch("valuation_crypto.utils.client.images.generate")
+def test_analyze_crypto_single_concurrent_openai_calls(mock_dalle, mock_chatgpt, mock_sentiment, mock_volume, mock_data, mock_crypto_data):
+    mock_data.return_value = mock_crypto_data
+    mock_volume.return_value = 5000
+    mock_sentiment.return_value = {"BTC": {"combined_sentiment_score": 0.2, "current_mentions": 150, "previous_mentions": 100}}
+
+    # Both calls must be in flight at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def chat(**kwargs):
+        barrier.wait()
+        return MagicMock(choices=[MagicMock(message=MagicMock(content="Mock OpenAI analysis"))])
+
+    def dalle(**kwargs):
+        barrier.wait()
+        return MagicMock(data=[MagicMock(url="mock_image_url")])
+
+    mock_chatgpt.side_effect = chat
+    mock_dalle.side_effect = dalle
+
+    result, image_url = utils.analyze_crypto("BTC")
+
+    assert result["ai_text"] == "Mock OpenAI analysis"
+    assert image_url == "mock_image_url"
+    mock_chatgpt.assert_called_once()
+    assert mock_chatgpt.call_args.kwargs["max_tokens"] == 300
+
+# Identical prompts within the cache window do not hit OpenAI again
+@patch("valuation_crypto.utils.client.chat.completions.create")
+@patch("valuation_crypto.utils.client.images.generate")
+def test_generate_ai_analysis_cached(mock_dalle, mock_chatgpt):
+    mock_chatgpt.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content="Mock OpenAI analysis"))])
+    mock_dalle.return_value = MagicMock(data=[MagicMock(url="mock_image_url")])
+    metrics = {
+        "crypto_id": "Bitcoin", "crypto_symbol": "BTC", "current_price": 50000, "market_cap": 1000000000,
+        "circulating_supply": 19000000, "velocity": 2.5, "sentiment_score": 0.1, "current_mentions": 100,
+        "previous_mentions": 90, "adjusted_velocity": 2.75, "valuation_difference": -49997.25,
+        "market_sentiment_percentage": 0.1,
+    }
+
+    first = utils.generate_ai_analysis(metrics)
+    second = utils.generate_ai_analysis(metrics)
+
+    assert first == second == ("Mock OpenAI analysis", "mock_image_url")
+    assert mock_chatgpt.call_count == 1
+    assert mock_dalle.call_count == 1
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from unittest.mock import patch
+from valuation_crypto import utils
+from valuation_crypto.exchanges import exchange_pool
+from valuation_crypto.volume_stream import configure_volume_stream
+
+PAIRS = {
+    "binance": {"BTC": {"USDT": "BTC/USDT"}, "XYZ": {"BTC": "XYZ/BTC"}},
+    "kraken": {"BTC": {"USD": "BTC/USD"}},
+    "bitfinex": {"BTC": {"USD": "BTC/USD"}},
+}
+
+class FakeStreamExchange:
+    """ccxt.pro stand-in: each watch call returns the next queued update, then waits forever."""
+
+    def __init__(self, updates, bulk=True):
+        self.has = {"watchTickers": bulk}
+        self.updates = list(updates)
+        self.watched = []
+
+    async def next_update(self):
+        if not self.updates:
+            await asyncio.sleep(3600)
+        update = self.updates.pop(0)
+        if isinstance(update, Exception):
+            raise update
+        return update
+
+    async def watch_tickers(self, pairs):
+        self.watched = pairs
+        return await self.next_update()
+
+    async def watch_ticker(self, pair):
+        self.watched.append(pair)
+        return (await self.next_update())[pair]
+
+    async def close(self):
+        pass
+
+def stream_exchanges(exchanges):
+    def create(exchange_id):
+        if exchange_id not in exchanges:
+            raise AttributeError(f"module 'ccxt.pro' has no attribute '{exchange_id}'")
+        return exchanges[exchange_id]
+    return create
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "stream did not publish in time"
+        time.sleep(0.01)
+
+# Streamed exchanges are read from the snapshot; only exchanges without a fresh ticker are polled
+@patch("ccxt.bitfinex")
+@patch.object(exchange_pool, "pairs", side_effect=lambda exchange_id: PAIRS.get(exchange_id, {}))
+def test_fetch_trading_volume_reads_stream(mock_pairs, mock_bitfinex):
+    binance = FakeStreamExchange([{"BTC/USDT": {"quoteVolume": 1000, "last": 50000},
+                                   "XYZ/BTC": {"quoteVolume": 2, "last": 0.001}}])
+    kraken = FakeStreamExchange([{"BTC/USD": {"quoteVolume": 500, "last": 50010}}], bulk=False)
+    mock_bitfinex.return_value.has = {}
+    mock_bitfinex.return_value.fetch_ticker.return_value = {"quoteVolume": 250}
+    exchanges = ["binance", "kraken", "bitfinex"]
+
+    with patch("valuation_crypto.clients.create_stream_exchange", stream_exchanges({"binance": binance, "kraken": kraken})):
+        stream = configure_volume_stream(["BTC", "XYZ"], exchanges)
+        wait_until(lambda: stream.stats["binance"]["updates"] and stream.stats["kraken"]["updates"])
+
+        assert sorted(binance.watched) == ["BTC/USDT", "XYZ/BTC"]
+        assert utils.fetch_trading_volume("BTC", exchanges) == 1750
+        assert utils.fetch_trading_volume("XYZ", exchanges) == 100000
+        assert utils.fetch_trading_volumes(["BTC", "XYZ"], exchanges) == {"BTC": 1750, "XYZ": 100000}
+        # Only bitfinex has no stream, and XYZ is not listed there
+        assert [call.args for call in mock_bitfinex.return_value.fetch_ticker.call_args_list] == [("BTC/USD",)] * 2
+
+        stream.max_age = 0
+        assert stream.volumes("BTC", exchanges) == ({}, exchanges)
+        configure_volume_stream(None)
+
+    assert not stream.running
+
+# A failed stream is resubscribed after a backoff and keeps publishing
+@patch("valuation_crypto.volume_stream.RECONNECT_DELAY", 0)
+@patch.object(exchange_pool, "pairs", side_effect=lambda exchange_id: PAIRS.get(exchange_id, {}))
+def test_stream_reconnects(mock_pairs):
+    binance = FakeStreamExchange([ConnectionError("connection closed"), {"BTC/USDT": {"quoteVolume": 1000}}])
+
+    with patch("valuation_crypto.clients.create_stream_exchange", stream_exchanges({"binance": binance})):
+        stream = configure_volume_stream(["BTC"], ["binance"])
+        wait_until(lambda: stream.stats["binance"]["updates"])
+
+        assert stream.stats["binance"] == {"updates": 1, "reconnects": 1}
+        assert stream.volumes("BTC", ["binance"]) == ({"binance": 1000}, [])
+        assert list(stream.ages()["binance"]) == ["BTC/USDT"]
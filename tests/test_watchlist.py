@@ -0,0 +1,138 @@
+from unittest.mock import patch
+from valuation_crypto import utils
+from valuation_crypto.history import HistoryStore
+from valuation_crypto.watchlist import WatchlistDaemon, dependents
+
+def make_quote(price, supply=1000):
+    return {"name": "Bitcoin", "symbol": "BTC", "circulating_supply": supply,
+            "quote": {"USD": {"price": price, "market_cap": price * supply, "market_cap_dominance": 60}}}
+
+SENTIMENT = {"combined_sentiment_score": 0.1, "current_mentions": 10, "previous_mentions": 5}
+
+# Invalidation follows the graph: volume reaches every derived node, nothing reaches the inputs
+def test_dependents():
+    assert dependents({"volume"}) == {"market", "valuation", "ai"}
+    assert dependents({"sentiment"}) == {"valuation", "ai"}
+    assert dependents(set()) == set()
+
+# The first tick computes the same result as analyze_crypto
+@patch("valuation_crypto.utils.request_image", return_value="image_url")
+@patch("valuation_crypto.utils.request_analysis", return_value="AI text")
+@patch("valuation_crypto.utils.fetch_sentiment", return_value=SENTIMENT)
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=1000)
+@patch("valuation_crypto.utils.fetch_crypto_data", return_value=make_quote(50000))
+@patch("valuation_crypto.utils.fetch_crypto_quotes", return_value={"BTC": make_quote(50000)})
+def test_first_tick_matches_analyze_crypto(mock_quotes, mock_data, mock_volume, mock_sentiment, mock_text, mock_image, tmp_path):
+    history = HistoryStore(str(tmp_path / "history"))
+    daemon = WatchlistDaemon(["btc"], history=history)
+
+    updates = daemon.tick(now=1000)
+
+    with patch("valuation_crypto.utils.generate_ai_analysis", return_value=("AI text", "image_url")):
+        assert daemon.result("BTC") == utils.analyze_crypto("BTC")
+    assert updates == {"BTC": ["quote", "volume", "sentiment", "market", "valuation", "ai"]}
+    assert history.query("BTC", ["current_price"])["current_price"].tolist() == [50000]
+
+# A price move refetches only the due inputs and keeps the AI output while below the thresholds
+@patch("valuation_crypto.utils.request_image", return_value="image_url")
+@patch("valuation_crypto.utils.request_analysis", return_value="AI text")
+@patch("valuation_crypto.utils.fetch_sentiment", return_value=SENTIMENT)
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=150000)
+@patch("valuation_crypto.utils.fetch_crypto_quotes")
+def test_incremental_ticks(mock_quotes, mock_volume, mock_sentiment, mock_text, mock_image):
+    daemon = WatchlistDaemon(["BTC"], thresholds={"valuation_difference_percentage": 5.0})
+    mock_quotes.return_value = {"BTC": make_quote(50000)}
+    daemon.tick(now=1000)
+
+    # Nothing is due yet
+    assert daemon.tick(now=1010) == {"BTC": []}
+
+    # Price moved slightly: market and valuation are recomputed, sentiment is not refetched
+    mock_quotes.return_value = {"BTC": make_quote(50100)}
+    assert daemon.tick(now=1070) == {"BTC": ["quote", "market", "valuation"]}
+    assert mock_sentiment.call_count == 1
+    assert daemon.result("BTC")[0]["current_price"] == 50100
+
+    # Unchanged inputs invalidate nothing
+    assert daemon.tick(now=1140) == {"BTC": []}
+    assert daemon.stats["unchanged_fetches"] == 3
+
+    # A large move regenerates the commentary; the image keeps its outlook
+    mock_quotes.return_value = {"BTC": make_quote(56000)}
+    assert daemon.tick(now=1210) == {"BTC": ["quote", "market", "valuation", "ai"]}
+    assert (mock_text.call_count, mock_image.call_count) == (2, 1)
+
+# A sentiment flip changes the image outlook, which redraws the image
+@patch("valuation_crypto.utils.request_image", return_value="image_url")
+@patch("valuation_crypto.utils.request_analysis", return_value="AI text")
+@patch("valuation_crypto.utils.fetch_sentiment")
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=1000)
+@patch("valuation_crypto.utils.fetch_crypto_quotes", return_value={"BTC": make_quote(50000)})
+def test_outlook_change_redraws_image(mock_quotes, mock_volume, mock_sentiment, mock_text, mock_image):
+    daemon = WatchlistDaemon(["BTC"], intervals={"sentiment": 60}, thresholds={"sentiment_score": 0.5})
+    mock_sentiment.return_value = dict(SENTIMENT, combined_sentiment_score=0.01)
+    daemon.tick(now=1000)
+
+    mock_sentiment.return_value = dict(SENTIMENT, combined_sentiment_score=-0.01)
+    assert daemon.tick(now=1060) == {"BTC": ["sentiment", "valuation", "ai"]}
+    assert (mock_text.call_count, mock_image.call_count) == (1, 2)
+
+# Due inputs are read upstream, not from the stale-while-revalidate cache, so each tick sees the latest quote
+@patch("valuation_crypto.utils.request_image", return_value="image_url")
+@patch("valuation_crypto.utils.request_analysis", return_value="AI text")
+@patch("valuation_crypto.utils.fetch_sentiment", return_value=SENTIMENT)
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=1000)
+@patch("valuation_crypto.utils.fetch_crypto_quotes")
+def test_due_inputs_bypass_market_cache(mock_quotes, mock_volume, mock_sentiment, mock_text, mock_image):
+    daemon = WatchlistDaemon(["BTC"])
+    mock_quotes.return_value = {"BTC": make_quote(50000)}
+    daemon.tick(now=1000)
+
+    mock_quotes.return_value = {"BTC": make_quote(51000)}
+    assert daemon.tick(now=1060) == {"BTC": ["quote", "market", "valuation"]}
+    assert daemon.result("BTC")[0]["current_price"] == 51000
+    assert mock_quotes.call_count == 2
+
+# Failed AI requests keep their basis unset, so the next tick retries them without any input change
+@patch("valuation_crypto.utils.request_image")
+@patch("valuation_crypto.utils.request_analysis")
+@patch("valuation_crypto.utils.fetch_sentiment", return_value=SENTIMENT)
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=1000)
+@patch("valuation_crypto.utils.fetch_crypto_quotes", return_value={"BTC": make_quote(50000)})
+def test_failed_ai_requests_are_retried(mock_quotes, mock_volume, mock_sentiment, mock_text, mock_image):
+    daemon = WatchlistDaemon(["BTC"])
+    mock_text.return_value = utils.analysis_error("rate limited")
+    mock_image.return_value = None
+    assert daemon.tick(now=1000) == {"BTC": ["quote", "volume", "sentiment", "market", "valuation"]}
+    assert daemon.result("BTC")[0]["ai_text"] == "OpenAI API Error: rate limited"
+    assert daemon.stats["ai_texts"] == daemon.stats["ai_images"] == 0
+
+    mock_text.return_value = "AI text"
+    mock_image.return_value = "image_url"
+    assert daemon.tick(now=1010) == {"BTC": ["ai"]}
+    result, image_url = daemon.result("BTC")
+    assert (result["ai_text"], image_url) == ("AI text", "image_url")
+
+    # Once generated, the output is kept until the thresholds are crossed
+    assert daemon.tick(now=1020) == {"BTC": []}
+    assert (mock_text.call_count, mock_image.call_count) == (2, 2)
+
+# Due quotes of the whole watchlist are fetched in one request per tick
+@patch("valuation_crypto.utils.request_image", return_value="image_url")
+@patch("valuation_crypto.utils.request_analysis", return_value="AI text")
+@patch("valuation_crypto.utils.fetch_sentiment", return_value=SENTIMENT)
+@patch("valuation_crypto.utils.fetch_trading_volume", return_value=1000)
+@patch("valuation_crypto.utils.fetch_crypto_quotes")
+def test_quotes_fetched_in_one_request(mock_quotes, mock_volume, mock_sentiment, mock_text, mock_image):
+    mock_quotes.return_value = {"BTC": make_quote(50000), "ETH": dict(make_quote(2000), name="Ethereum", symbol="ETH")}
+    daemon = WatchlistDaemon(["BTC", "ETH", "XYZ"])
+
+    updates = daemon.tick(now=1000)
+
+    mock_quotes.assert_called_once_with(["BTC", "ETH", "XYZ"])
+    assert updates["ETH"][:3] == ["quote", "volume", "sentiment"]
+    assert updates["XYZ"] == ["error"]
+    assert daemon.result("ETH")[0]["current_price"] == 2000
+    # Only the unknown symbol, which has no quote yet, is asked for again
+    assert daemon.tick(now=1010) == {"BTC": [], "ETH": [], "XYZ": ["error"]}
+    mock_quotes.assert_called_with(["XYZ"])
@@ -1,14 +1,28 @@
-from valuation_crypto.app import app
-from valuation_crypto.utils import fetch_trading_volume, fetch_crypto_data, analyze_crypto
-from valuation_crypto.market_sentiment_reddit_gtrend import aggregate_sentiment_analysis
-from valuation_crypto.apikey import cmc_api, openai_key
-
-__all__ = [
-    "app",
-    "fetch_trading_volume",
-    "fetch_crypto_data",
-    "analyze_crypto",
-    "aggregate_sentiment_analysis",
-    "cmc_api",
-    "openai_key",
-]
\ No newline at end of file
+import importlib
+
+# Public names and the submodule defining each; submodules are imported on first access,
+# so `import valuation_crypto.batch` does not pull in Dash, and nothing reads apikey.py up front.
+_EXPORTS = {
+    "app": "valuation_crypto.app",
+    "fetch_trading_volume": "valuation_crypto.utils",
+    "fetch_crypto_data": "valuation_crypto.utils",
+    "analyze_crypto": "valuation_crypto.utils",
+    "analyze_crypto_async": "valuation_crypto.async_analysis",
+    "aggregate_sentiment_analysis": "valuation_crypto.market_sentiment_reddit_gtrend",
+    "cmc_api": "valuation_crypto.apikey",
+    "openai_key": "valuation_crypto.apikey",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
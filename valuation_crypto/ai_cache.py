@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import requests
+
+# OpenAI answers are reused for 5 minutes
+AI_CACHE_TTL = 5 * 60
+AI_CACHE_SIZE = 256
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'valuation_crypto', 'ai')
+IMAGE_DIR = os.path.join(CACHE_DIR, 'images')
+# Flask route serving the locally stored DALL-E images (DALL-E URLs expire after an hour)
+IMAGE_ROUTE = '/generated-images/'
+IMAGE_TIMEOUT = 30
+# Stored images are deleted once older than IMAGE_MAX_AGE, checked at most every IMAGE_PRUNE_INTERVAL
+IMAGE_MAX_AGE = 24 * 60 * 60
+IMAGE_PRUNE_INTERVAL = 60 * 60
+
+
+def cache_key(**params):
+    """Content address of a request: hash of the rendered prompt and every model parameter."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after being stored.
+    With `spill_dir`, entries pushed out of memory are written to disk as JSON and read back on a miss;
+    expired spill files are deleted as new entries are spilled, at most once per `ttl`.
+    """
+
+    def __init__(self, ttl=AI_CACHE_TTL, maxsize=AI_CACHE_SIZE, spill_dir=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.spill_dir = spill_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'spilled': 0}
+        self._spill_pruned_at = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key):
+        """Returns the cached value, or None if absent or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+
+        entry = self._read_spilled(key)
+        with self._lock:
+            if entry is not None and entry[0] > now:
+                self._entries[key] = entry
+                self.stats['disk_hits'] += 1
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key, value):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted.append(self._entries.popitem(last=False))
+        for evicted_key, entry in evicted:
+            self._spill(evicted_key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def prune_spilled(self):
+        """Deletes spilled entries that have expired; an entry expires at most `ttl` seconds after it was spilled."""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        _remove_older_than(self.spill_dir, time.time() - self.ttl)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.json")
+
+    def _spill(self, key, entry):
+        if not self.spill_dir or entry[0] <= time.time():
+            return
+        with open(self._spill_path(key), 'w') as file:
+            json.dump({'expires_at': entry[0], 'value': entry[1]}, file)
+        now = time.monotonic()
+        with self._lock:
+            self.stats['spilled'] += 1
+            prune = self._spill_pruned_at is None or now - self._spill_pruned_at >= self.ttl
+            if prune:
+                self._spill_pruned_at = now
+        if prune:
+            self.prune_spilled()
+
+    def _read_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(key)) as file:
+                spilled = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return spilled['expires_at'], spilled['value']
+
+
+_cache = TTLCache()
+image_dir = IMAGE_DIR
+_last_pruned = None
+_prune_lock = threading.Lock()
+
+
+def get_ai_cache():
+    """Returns the process-wide cache of OpenAI responses."""
+    return _cache
+
+
+def configure_ai_cache(ttl=AI_CACHE_TTL, maxsize=AI_CACHE_SIZE, spill_dir=None, images=IMAGE_DIR):
+    """Replaces the process-wide OpenAI cache, e.g. to enable disk spill or move the image store."""
+    global _cache, image_dir, _last_pruned
+    _cache = TTLCache(ttl, maxsize, spill_dir)
+    image_dir = images
+    _last_pruned = None
+    return _cache
+
+
+def stored_image(key):
+    """
+    Local route of the image stored for a request key, or None if it is not in the store.
+    Lets an image outlive its AI cache entry without being generated again; it is kept for another IMAGE_MAX_AGE.
+    """
+    filename = f"{key}.png"
+    try:
+        os.utime(os.path.join(image_dir, filename))
+    except FileNotFoundError:
+        return None
+    return f"{IMAGE_ROUTE}{filename}"
+
+
+def store_image(key, url):
+    """
+    Downloads a generated image into the local image store and returns its local route.
+    Falls back to the remote URL if the download fails. Old images are pruned along the way.
+    """
+    _prune_periodically()
+    filename = f"{key}.png"
+    path = os.path.join(image_dir, filename)
+    if not os.path.exists(path):
+        try:
+            response = requests.get(url, timeout=IMAGE_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Could not store generated image locally: {e}")
+            return url
+        os.makedirs(image_dir, exist_ok=True)
+        # Written under a temporary name and renamed, so the image route never serves a partial file
+        fd, temp_path = tempfile.mkstemp(dir=image_dir, prefix=f".{key}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(response.content)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    return f"{IMAGE_ROUTE}{filename}"
+
+
+def prune_images(max_age=IMAGE_MAX_AGE):
+    """Deletes locally stored images older than `max_age` seconds."""
+    if not os.path.isdir(image_dir):
+        return
+    _remove_older_than(image_dir, time.time() - max_age)
+
+
+def _remove_older_than(directory, cutoff):
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            # Pruned concurrently by another process sharing the directory
+            continue
+
+
+def _prune_periodically():
+    global _last_pruned
+    now = time.monotonic()
+    with _prune_lock:
+        if _last_pruned is not None and now - _last_pruned < IMAGE_PRUNE_INTERVAL:
+            return
+        _last_pruned = now
+    try:
+        prune_images()
+    except OSError as e:
+        logging.warning(f"Could not prune the image store: {e}")
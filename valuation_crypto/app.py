@@ -1,12 +1,27 @@
 import dash
+import flask
 from dash import dcc, html, Input, Output, State
-from valuation_crypto.utils import analyze_crypto
-import plotly.express as px
+from valuation_crypto.jobs import job_manager
+from valuation_crypto import ai_cache
+from valuation_crypto.rollups import get_history_rollups
+from valuation_crypto.telemetry import metrics_text
+from datetime import datetime, timezone
+import plotly.graph_objects as go
 
 # Initialize Dash app
 app = dash.Dash(__name__)
 app.title = "Crypto Valuation & Sentiment Analysis"
 
+# Serve DALL-E images from the local store, since the URLs returned by OpenAI expire
+@app.server.route(f"{ai_cache.IMAGE_ROUTE}<path:filename>")
+def serve_generated_image(filename):
+    return flask.send_from_directory(ai_cache.image_dir, filename)
+
+# Stage and upstream timing histograms for Prometheus to scrape
+@app.server.route("/metrics")
+def serve_metrics():
+    return flask.Response(metrics_text(), mimetype="text/plain; version=0.0.4")
+
 app.layout = html.Div(
     style={
         "background-color": "black",
@@ -53,7 +68,11 @@ app.layout = html.Div(
             style={"margin-bottom": "20px"}
         ),
 
-        # AI Analysis Output
+        # Background analysis job, polled until all stages have finished
+        dcc.Store(id='job-store'),
+        dcc.Interval(id='job-poll', interval=750, disabled=True),
+
+        # Metrics & AI Analysis Output, filled in stage by stage
         html.Div(id='analysis-output',
             style={"margin-top": "20px", "text-align": "left", "white-space": "pre-wrap", 
                    "padding-left": "500px", "padding-right": "500px", "padding-top": "25px"}
@@ -79,97 +98,177 @@ app.layout = html.Div(
     ]
 )
 
+HIDDEN = {"display": "none"}
+METRICS_STYLE = {"white-space": "pre-wrap", "font-family": "monospace", "text-align": "left", "max-width": "550px", "margin-left": "auto", "margin-right": "auto"}
+AI_TEXT_STYLE = {"white-space": "pre-wrap", "font-family": "monospace", "padding": "10px", "text-align": "left", "max-width": "550px", "margin-left": "auto", "margin-right": "auto"}
+IMAGE_STYLE = {"width": "512px", "height": "512px", "display": "block", "border": "4px solid white", "margin-top": "20px"}
+IMAGE_CONTAINER_STYLE = {"display": "flex", "justify-content": "center", "margin-top": "20px", "margin-bottom": "20px"}
+GRAPH_CONTAINER_STYLE = {"display": "flex", "justify-content": "center", "margin-top": "20px", "margin-bottom": "20px"}
+SENTIMENT_GRAPH_CONTAINER_STYLE = {"display": "flex", "justify-content": "center", "margin-top": "20px"}
+PENDING = "…"
+JOB_EXPIRED_ERROR = "This analysis has expired. Please run it again."
+
+
+def render_metrics(data):
+    """Crypto metrics section; values of stages that have not finished yet are shown as pending."""
+    def value(key):
+        return data.get(key, PENDING)
+
+    valuation_percentage = f" ({data['valuation_difference_percentage']}%)" if 'valuation_difference_percentage' in data else ""
+    metrics_display = f"""
+        - Ticker: {data['crypto_symbol']}
+        - Price: ${data['current_price']}
+        - Market Cap: ${data['market_cap']}
+        - Circulating Supply: {data['circulating_supply']}
+        - Velocity: {data['velocity']}
+        - Sentiment Score: {value('sentiment_score')}
+        - Current Mentions: {value('current_mentions')}
+        - Previous Mentions: {value('previous_mentions')}
+        - Adjusted Velocity: {value('adjusted_velocity')}
+        - Valuation Difference: {value('valuation_difference')}{valuation_percentage}
+        - Market Sentiment %: {value('market_sentiment_percentage')}
+        """
+    return html.Div([
+        html.Hr(),
+        html.H3("Crypto Metrics"),
+        html.Div(metrics_display, style=METRICS_STYLE),
+    ])
+
+
+def render_ai_analysis(text):
+    """AI-Analysis section."""
+    return html.Div([
+        html.Hr(),
+        html.H3("AI-Analysis"),
+        html.Div(text, style=AI_TEXT_STYLE),
+        html.Hr()
+    ])
+
+
+def history_trace(history, x_metric, y_metric, color):
+    """WebGL trace of a coin's rolled-up history, coloured from oldest to newest."""
+    dates = [datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d %H:%M') for timestamp in history['timestamp']]
+    return go.Scattergl(
+        x=history[x_metric],
+        y=history[y_metric],
+        mode='lines+markers',
+        name='History',
+        text=dates,
+        hovertemplate="%{text}<br>%{x}, %{y}<extra></extra>",
+        line=dict(color=color, width=1),
+        marker=dict(size=5, color=history['timestamp'], colorscale='Viridis', opacity=0.7),
+    )
+
+
+def valuation_figure(data, history, x_metric, y_metric, color, title, xaxis_title, yaxis_title):
+    """Current run as a highlighted point on top of the coin's history."""
+    fig = go.Figure()
+    if history is not None and len(history['timestamp']):
+        fig.add_trace(history_trace(history, x_metric, y_metric, color))
+    fig.add_trace(go.Scattergl(x=[data[x_metric]], y=[data[y_metric]], mode='markers', name='Now',
+                               marker=dict(size=12, color=color)))
+    fig.update_layout(
+        title=title,
+        template="plotly_dark",
+        showlegend=False,
+        font=dict(family="monospace", size=10),
+        margin=dict(l=40, r=40, t=40, b=40),
+        xaxis_title=xaxis_title,
+        yaxis_title=yaxis_title
+    )
+    return fig
+
+
+def price_velocity_figure(data, history=None):
+    """Generate Price vs. Velocity Graph"""
+    return valuation_figure(data, history, 'velocity', 'current_price', 'yellow',
+                            f"{data['crypto_symbol']} Price vs. Velocity",
+                            "Velocity (Annual Trading Volume / Circulating Supply)", "Price (USDT)")
+
+
+def sentiment_valuation_figure(data, history=None):
+    """Generate Sentiment Score vs Valuation Difference Graph"""
+    return valuation_figure(data, history, 'sentiment_score', 'valuation_difference', 'cyan',
+                            f"{data['crypto_symbol']} Sentiment Score vs. Valuation Difference",
+                            "Sentiment Score", "Valuation Difference (USDT)")
+
+
+def render_job(job):
+    """Renders whatever stages of an analysis job have finished so far."""
+    stages = job['stages']
+    if job['status'] == 'error':
+        error = html.Div(job['error'], style={"color": "red", "font-weight": "bold"})
+        return error, go.Figure(), HIDDEN, go.Figure(), HIDDEN, "", "", HIDDEN, HIDDEN
+    if 'market' not in stages:
+        pending = html.Div("Fetching market data…", style=AI_TEXT_STYLE)
+        return pending, go.Figure(), HIDDEN, go.Figure(), HIDDEN, "", "", HIDDEN, HIDDEN
+
+    # Stage 1: market data. Price, velocity and the price graph render as soon as CMC and the exchanges answer.
+    market_data = stages['market']
+    # Past runs come from precomputed hourly / daily rollups of the history store
+    history = get_history_rollups().series(market_data['crypto_symbol'])
+    price_figure = price_velocity_figure(market_data, history)
+    if 'sentiment' not in stages:
+        pending = html.Div("Analyzing market sentiment…", style=AI_TEXT_STYLE)
+        return render_metrics(market_data), price_figure, GRAPH_CONTAINER_STYLE, go.Figure(), HIDDEN, pending, "", HIDDEN, HIDDEN
+
+    # Stage 2: Reddit & Google Trends sentiment, and the valuation metrics that depend on it.
+    analysis_data = stages['sentiment']
+    metrics = render_metrics(analysis_data)
+    sentiment_figure = sentiment_valuation_figure(analysis_data, history)
+    if 'ai' not in stages:
+        pending = render_ai_analysis("Generating AI analysis…")
+        return metrics, price_figure, GRAPH_CONTAINER_STYLE, sentiment_figure, SENTIMENT_GRAPH_CONTAINER_STYLE, pending, "", HIDDEN, HIDDEN
+
+    # Stage 3: GPT-4 commentary and the DALL-E image.
+    image_url = stages['ai']['image_url']
+    image_style = IMAGE_STYLE if image_url else HIDDEN
+    image_container_style = IMAGE_CONTAINER_STYLE if image_url else HIDDEN
+    return (metrics, price_figure, GRAPH_CONTAINER_STYLE, sentiment_figure, SENTIMENT_GRAPH_CONTAINER_STYLE,
+            render_ai_analysis(stages['ai']['text']), image_url or "", image_style, image_container_style)
+
+
+# Submitting only queues a background job, so server threads stay free while it runs.
 @app.callback(
     [Output('analysis-output', 'children'),
-     Output('crypto-image', 'src'),
-     Output('crypto-image', 'style'),
-     Output('image-container', 'style'),
-     Output('graph-container', 'style'),
-     Output('sentiment-graph-container', 'style'),
-     Output('price-velocity-graph', 'figure'),
-     Output('sentiment-valuation-graph', 'figure')],  
+     Output('job-store', 'data'),
+     Output('job-poll', 'disabled')],
     Input('analyze-button', 'n_clicks'),
     State('crypto-symbol', 'value')
 )
 
 def update_output(n_clicks, symbol):
     if n_clicks > 0 and symbol and symbol.strip():
-        analysis_data, image_url = analyze_crypto(symbol.strip().upper())
-
-        if "error" in analysis_data:
-            return html.Div(analysis_data["error"], style={"color": "red", "font-weight": "bold"}), "", {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"}, px.scatter(), px.scatter()
-
-        # Metrics Display
-        metrics_display = f"""
-        - Ticker: {symbol.upper()}
-        - Price: ${analysis_data['current_price']}
-        - Market Cap: ${analysis_data['market_cap']}
-        - Circulating Supply: {analysis_data['circulating_supply']}
-        - Velocity: {analysis_data['velocity']}
-        - Sentiment Score: {analysis_data['sentiment_score']}
-        - Current Mentions: {analysis_data['current_mentions']}
-        - Previous Mentions: {analysis_data['previous_mentions']}
-        - Adjusted Velocity: {analysis_data['adjusted_velocity']}
-        - Valuation Difference: {analysis_data['valuation_difference']} ({analysis_data['valuation_difference_percentage']}%)
-        - Market Sentiment %: {analysis_data['market_sentiment_percentage']}
-        """
+        job_id = job_manager.submit(symbol)
+        return html.Div("Fetching market data…", style=AI_TEXT_STYLE), {'job_id': job_id}, False
+
+    return "", None, True
+
+
+@app.callback(
+    [Output('analysis-output', 'children', allow_duplicate=True),
+     Output('price-velocity-graph', 'figure'),
+     Output('graph-container', 'style'),
+     Output('sentiment-valuation-graph', 'figure'),
+     Output('sentiment-graph-container', 'style'),
+     Output('crypto-image', 'src'),
+     Output('crypto-image', 'style'),
+     Output('image-container', 'style'),
+     Output('job-poll', 'disabled', allow_duplicate=True)],
+    Input('job-poll', 'n_intervals'),
+    State('job-store', 'data'),
+    prevent_initial_call=True
+)
+
+def poll_job(n_intervals, job_store):
+    job = job_manager.get(job_store['job_id']) if job_store else None
+    if job is None:
+        # Expired after JOB_TTL or lost with a restarted in-process store: report it and stop polling
+        job = {'status': 'error', 'stages': {}, 'error': JOB_EXPIRED_ERROR}
 
-        # AI Analysis Section
-        analysis_content = html.Div([
-            html.Hr(),
-            html.H3("Crypto Metrics"),
-            html.Div(metrics_display, 
-                     style={"white-space": "pre-wrap", "font-family": "monospace", "text-align": "left", "max-width": "550px", "margin-left": "auto", "margin-right": "auto"}),
-            html.Hr(),
-            html.H3("AI-Analysis"),
-            html.Div(analysis_data['ai_text'], 
-                     style={"white-space": "pre-wrap", "font-family": "monospace", "padding": "10px", "text-align": "left", "max-width": "550px", "margin-left": "auto", "margin-right": "auto"}),
-            html.Hr()        
-        ])
-
-        # Generate Price vs. Velocity Graph
-        fig1 = px.scatter(
-            x=[analysis_data['velocity']], 
-            y=[analysis_data['current_price']],
-            labels={"x": "Velocity", "y": "Price (USDT)"},
-            title=f"{symbol.upper()} Price vs. Velocity",
-            template="plotly_dark"
-        )
-        fig1.update_traces(marker=dict(size=12, color='yellow')) 
-        fig1.update_layout(
-            font=dict(family="monospace", size=10),
-            margin=dict(l=40, r=40, t=40, b=40),
-            xaxis_title="Velocity (Annual Trading Volume / Circulating Supply)",
-            yaxis_title="Price (USDT)"
-        )
-
-        # Generate Sentiment Score vs Valuation Difference Graph
-        fig2 = px.scatter(
-            x=[analysis_data['sentiment_score']], 
-            y=[analysis_data['valuation_difference']],
-            labels={"x": "Sentiment Score", "y": "Valuation Difference (USDT)"},
-            title=f"{symbol.upper()} Sentiment Score vs. Valuation Difference",
-            template="plotly_dark"
-        )
-        fig2.update_traces(marker=dict(size=12, color='cyan')) 
-        fig2.update_layout(
-            font=dict(family="monospace", size=10),
-            margin=dict(l=40, r=40, t=40, b=40),
-            xaxis_title="Sentiment Score",
-            yaxis_title="Valuation Difference (USDT)"
-        )
-
-
-        image_style = {"width": "512px", "height": "512px", "display": "block", "border": "4px solid white", "margin-top": "20px"} if image_url else {"display": "none"}
-        image_container_style = {"display": "flex", "justify-content": "center", "margin-top": "20px", "margin-bottom": "20px"} if image_url else {"display": "none"}
-        
-       
-        graph_container_style = {"display": "flex", "justify-content": "center", "margin-top": "20px", "margin-bottom": "20px"} 
-        sentiment_graph_container_style = {"display": "flex", "justify-content": "center", "margin-top": "20px"} 
-
-        return analysis_content, image_url, image_style, image_container_style, graph_container_style, sentiment_graph_container_style, fig1, fig2
-
-    return "", "", {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"}, px.scatter(), px.scatter()
+    metrics, price_figure, graph_style, sentiment_figure, sentiment_style, ai_output, image_url, image_style, image_container_style = render_job(job)
+    finished = job['status'] in ('done', 'error')
+    return [metrics, ai_output], price_figure, graph_style, sentiment_figure, sentiment_style, image_url, image_style, image_container_style, finished
 
 # Run Server
 if __name__ == '__main__':
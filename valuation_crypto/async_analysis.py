@@ -0,0 +1,313 @@
+"""
+Asyncio-native analysis engine.
+
+`analyze_crypto_async` returns the same result as `utils.analyze_crypto`, but awaits every upstream
+call instead of holding a thread: CoinMarketCap through httpx, exchanges through `ccxt.async_support`
+and OpenAI through `AsyncOpenAI`. Reddit and Google Trends have no async client here, so their
+requests run in worker threads via `asyncio.to_thread`. The market and AI caches, rate limits, the
+pair index and telemetry are shared with the synchronous pipeline.
+
+    async def main(symbols):
+        async with AsyncAnalysisEngine() as engine:
+            return await asyncio.gather(*(engine.analyze(symbol) for symbol in symbols))
+
+Async clients are bound to the event loop that created them: `analyze_crypto_async` uses one engine
+per running loop, which `close_async_engine()` closes before the loop ends.
+"""
+import asyncio
+import logging
+import time
+import weakref
+import httpx
+from valuation_crypto import clients, market_sentiment_reddit_gtrend, utils
+from valuation_crypto.exchanges import MARKETS_TTL, configure_rate_limit, rate_limit_key
+from valuation_crypto.market_cache import get_market_cache
+from valuation_crypto.pair_index import CONVERTED_QUOTES, get_pair_index, resolve_market
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.singleflight import flight_key
+from valuation_crypto.telemetry import span, trace
+from valuation_crypto.volume_stream import get_volume_stream
+
+
+class AsyncAnalysisEngine:
+    """The async API clients of one event loop and a coroutine for every pipeline stage."""
+
+    def __init__(self, exchanges_list=utils.exchanges_list, markets_ttl=MARKETS_TTL):
+        self.exchanges_list = list(exchanges_list)
+        self.markets_ttl = markets_ttl
+        self._cmc = None
+        self._openai = None
+        self._exchanges = {}
+        self._markets_loaded_at = {}
+        self._exchange_locks = {}
+        self._inflight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes every client; the engine creates new ones if used again."""
+        exchanges, self._exchanges = self._exchanges, {}
+        self._markets_loaded_at.clear()
+        for exchange in exchanges.values():
+            await exchange.close()
+        if self._cmc is not None:
+            await self._cmc.aclose()
+            self._cmc = None
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+
+    async def _coalesce(self, name, args, fetch):
+        """Single-flight for coroutines: concurrent calls with the same arguments await one task."""
+        key = flight_key(name, args, {})
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _cached(self, source, name, args, fetch):
+        # Keyed like the synchronous @cached functions, so both pipelines share entries
+        key = flight_key(name, args, {})
+        return await get_market_cache().get_async(source, key, lambda: self._coalesce(name, args, fetch))
+
+    # Market data
+
+    async def fetch_crypto_quotes(self, symbols, batch_size=utils.CMC_BATCH_SIZE):
+        """Fetches CMC quotes for many symbols, `batch_size` per request, all batches concurrently."""
+        if self._cmc is None:
+            self._cmc = clients.create_async_cmc_client()
+
+        async def fetch_batch(batch):
+            await rate_limiter.acquire_async('coinmarketcap')
+            try:
+                with utils.quote_span(batch):
+                    response = await self._cmc.get(utils.CMC_QUOTES_URL, params=utils.quote_params(batch),
+                                                   timeout=utils.CMC_TIMEOUT)
+            except httpx.HTTPError as e:
+                return utils.quote_request_failed(batch, e)
+            return utils.quotes_from_response(batch, response)
+
+        quotes = {}
+        batches = utils.quote_batches(symbols, batch_size)
+        for batch_quotes in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+            quotes.update(batch_quotes)
+        return quotes
+
+    async def fetch_crypto_data(self, symbol):
+        async def fetch():
+            return (await self.fetch_crypto_quotes([symbol])).get(symbol.upper())
+        return await self._cached('crypto_data', 'fetch_crypto_data', (symbol,), fetch)
+
+    async def _exchange(self, exchange_id):
+        """Returns this engine's instance of an exchange with markets loaded, updating the shared pair index."""
+        lock = self._exchange_locks.setdefault(exchange_id, asyncio.Lock())
+        async with lock:
+            exchange = self._exchanges.get(exchange_id)
+            if exchange is None:
+                exchange = self._exchanges[exchange_id] = clients.create_async_exchange(exchange_id)
+                configure_rate_limit(exchange_id, exchange)
+            loaded_at = self._markets_loaded_at.get(exchange_id)
+            if loaded_at is None or time.monotonic() - loaded_at >= self.markets_ttl:
+                logging.info(f"Loading markets for {exchange_id}")
+                await rate_limiter.acquire_async(rate_limit_key(exchange_id))
+                await exchange.load_markets(reload=loaded_at is not None)
+                await asyncio.to_thread(get_pair_index().update, exchange_id, exchange)
+                self._markets_loaded_at[exchange_id] = time.monotonic()
+        return exchange
+
+    async def _pairs(self, exchange_id):
+        """base -> {quote: symbol} from the persistent pair index, loading markets only when it is stale."""
+        index = get_pair_index()
+        age = index.age(exchange_id)
+        if age is None or age >= self.markets_ttl:
+            await self._exchange(exchange_id)
+        return index.pairs(exchange_id) or {}
+
+    async def fetch_conversion_rate(self, exchange_id, currency):
+        async def fetch():
+            market = resolve_market(await self._pairs(exchange_id), currency, utils.USD_QUOTES)
+            if market is None:
+                return None
+            exchange = await self._exchange(exchange_id)
+            await rate_limiter.acquire_async(rate_limit_key(exchange_id))
+            with span('conversion_rate', symbol=currency, provider=exchange_id):
+                return (await exchange.fetch_ticker(market[0])).get('last')
+        return await self._cached('conversion_rate', 'fetch_conversion_rate', (exchange_id, currency), fetch)
+
+    async def _exchange_volume(self, exchange_id, crypto_symbol, exchange_timeout):
+        try:
+            market = resolve_market(await self._pairs(exchange_id), crypto_symbol)
+            if market is None:
+                return 0
+            pair, quote = market
+            exchange = await self._exchange(exchange_id)
+            exchange.timeout = int(exchange_timeout * 1000)
+            await rate_limiter.acquire_async(rate_limit_key(exchange_id))
+            with span('exchange_ticker', symbol=crypto_symbol, provider=exchange_id):
+                ticker = await exchange.fetch_ticker(pair)
+            volume = ticker.get('quoteVolume') or 0
+            if quote in CONVERTED_QUOTES and volume:
+                volume *= await self.fetch_conversion_rate(exchange_id, quote) or 0
+            return volume
+        except Exception as e:
+            logging.warning(f"Volume fetch failed for {crypto_symbol} on {exchange_id}: {e}")
+            return 0
+
+    async def poll_trading_volume(self, crypto_symbol, exchanges_list, exchange_timeout=utils.EXCHANGE_TIMEOUT,
+                                  deadline=utils.VOLUME_DEADLINE):
+        """Total 24h volume across exchanges; exchanges that miss `deadline` count as zero."""
+        async def fetch():
+            tasks = {
+                asyncio.ensure_future(self._exchange_volume(exchange_id, crypto_symbol, exchange_timeout)): exchange_id
+                for exchange_id in exchanges_list
+            }
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+            for task in pending:
+                logging.warning(f"{tasks[task]} did not answer for {crypto_symbol} within {deadline}s")
+                task.cancel()
+            return round(sum(task.result() for task in done), 2)
+        return await self._cached('trading_volume', 'poll_trading_volume', (crypto_symbol, list(exchanges_list)), fetch)
+
+    async def fetch_trading_volume(self, crypto_symbol):
+        """Total 24h volume, read from the volume stream for exchanges it has fresh tickers from."""
+        stream = get_volume_stream()
+        if stream is None:
+            return await self.poll_trading_volume(crypto_symbol, self.exchanges_list)
+        streamed, missing = stream.volumes(crypto_symbol, self.exchanges_list)
+        polled = await self.poll_trading_volume(crypto_symbol, missing) if missing else 0
+        return round(sum(streamed.values()) + polled, 2)
+
+    async def fetch_market_metrics(self, symbol, crypto_data=None):
+        with span('market', symbol=symbol.upper()):
+            crypto_data = crypto_data or await self.fetch_crypto_data(symbol)
+            if not crypto_data:
+                return None
+            volume = await self.fetch_trading_volume(crypto_data['symbol'].upper())
+            return utils.compute_market_metrics(crypto_data, volume)
+
+    # Sentiment
+
+    async def _reddit_mentions(self, crypto_name, crypto_symbol):
+        """All subreddits searched concurrently, then merged and scored like `collect_reddit_mentions`."""
+        sentiment = market_sentiment_reddit_gtrend
+        search_query = f"{crypto_name} OR {crypto_symbol}"
+        searches = await asyncio.gather(
+            *(asyncio.to_thread(sentiment.search_reddit_posts, subreddit, search_query)
+              for subreddit in sentiment.SUBREDDITS),
+            return_exceptions=True)
+        posts = {}
+        for subreddit, found in zip(sentiment.SUBREDDITS, searches):
+            if isinstance(found, Exception):
+                logging.warning(f"Reddit API error for {crypto_name} in r/{subreddit}: {found}")
+                continue
+            for post_id, post in found.items():
+                posts.setdefault(post_id, post)
+        return await asyncio.to_thread(sentiment.score_reddit_posts, crypto_symbol, posts)
+
+    async def aggregate_sentiment_analysis(self, cryptocurrencies):
+        """Async counterpart of `aggregate_sentiment_analysis`: Trends and every coin's Reddit scan run concurrently."""
+        sentiment = market_sentiment_reddit_gtrend
+        trends, *mentions = await asyncio.gather(
+            asyncio.to_thread(sentiment.fetch_trends_batch, [crypto_name for crypto_name, _ in cryptocurrencies]),
+            *(self._reddit_mentions(crypto_name, crypto_symbol) for crypto_name, crypto_symbol in cryptocurrencies))
+        return {
+            crypto_symbol: sentiment.combine_sentiment(*reddit, trends[crypto_name])
+            for (crypto_name, crypto_symbol), reddit in zip(cryptocurrencies, mentions)
+        }
+
+    async def fetch_sentiment(self, metrics):
+        crypto_symbol = metrics['crypto_symbol']
+        cryptocurrencies = [(metrics['crypto_id'], crypto_symbol)]
+        with span('sentiment', symbol=crypto_symbol):
+            sentiment_data = await self._cached('sentiment', 'aggregate_sentiment_analysis', (cryptocurrencies,),
+                                                lambda: self.aggregate_sentiment_analysis(cryptocurrencies))
+        return sentiment_data.get(crypto_symbol, utils.DEFAULT_SENTIMENT)
+
+    # LLM
+
+    def _openai_client(self):
+        if self._openai is None:
+            self._openai = clients.create_async_openai_client()
+        return self._openai
+
+    async def request_analysis(self, prompt_text):
+        key, request = utils.analysis_request(prompt_text)
+        cached = utils.cached_ai_response(key, 'openai_chat', 'openai')
+        if cached is not None:
+            return cached
+        try:
+            await rate_limiter.acquire_async('openai')
+            with utils.openai_span('openai_chat', 'openai'):
+                chat_response = await self._openai_client().chat.completions.create(**request)
+        except Exception as e:
+            return utils.analysis_error(e)
+        return utils.analysis_from_response(key, chat_response)
+
+    async def request_image(self, image_prompt):
+        key, request = utils.image_request(image_prompt)
+        cached = utils.cached_image(key)
+        if cached is not None:
+            return cached
+        try:
+            await rate_limiter.acquire_async('openai_images')
+            with utils.openai_span('openai_image', 'openai_images'):
+                dalle_response = await self._openai_client().images.generate(**request)
+        except Exception as e:
+            return utils.image_error(e)
+        # Downloading the image into the local store blocks, so it runs in a worker thread
+        return await asyncio.to_thread(utils.image_from_response, key, dalle_response)
+
+    async def generate_ai_analysis(self, metrics):
+        with span('ai', symbol=metrics['crypto_symbol']):
+            analysis, image_url = await asyncio.gather(
+                self.request_analysis(utils.build_analysis_prompt(metrics)),
+                self.request_image(utils.build_image_prompt(metrics)))
+        return analysis, image_url
+
+    # Full analysis
+
+    async def analyze(self, symbol, crypto_data=None):
+        """Same (result, image_url) as `utils.analyze_crypto`; concurrent calls for a symbol share one run."""
+        return await self._coalesce('analyze_crypto', (symbol, crypto_data), lambda: self._analyze(symbol, crypto_data))
+
+    async def _analyze(self, symbol, crypto_data):
+        with trace('analyze_crypto', symbol=symbol.upper()):
+            metrics = await self.fetch_market_metrics(symbol, crypto_data)
+            if not metrics:
+                return {"error": utils.INVALID_SYMBOL_ERROR}, None
+
+            metrics = utils.apply_sentiment(metrics, await self.fetch_sentiment(metrics))
+            analysis, image_url = await self.generate_ai_analysis(metrics)
+
+        result = {key: metrics[key] for key in utils.RESULT_KEYS}
+        result["ai_text"] = analysis
+        return result, image_url
+
+
+_engines = weakref.WeakKeyDictionary()
+
+
+def get_async_engine():
+    """Returns the engine of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    engine = _engines.get(loop)
+    if engine is None:
+        engine = _engines[loop] = AsyncAnalysisEngine()
+    return engine
+
+
+async def close_async_engine():
+    """Closes the clients of the running loop's engine."""
+    engine = _engines.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.close()
+
+
+async def analyze_crypto_async(symbol, crypto_data=None):
+    """Runs the full valuation for a symbol without blocking the event loop; returns (result, image_url)."""
+    return await get_async_engine().analyze(symbol, crypto_data)
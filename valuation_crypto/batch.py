@@ -0,0 +1,200 @@
+"""
+Batch valuation of the top-N cryptocurrencies.
+
+Runs the same stages as `analyze_crypto` as a pipeline: market data and Google Trends for the
+whole universe are fetched in bulk, then the per-coin Reddit sentiment and (optionally) LLM stages
+run with bounded concurrency per upstream service. Rows are appended to `results/<timestamp>.csv` as soon as a coin completes.
+
+Usage:
+    python -m valuation_crypto.batch --top 100
+    python -m valuation_crypto.batch --symbols BTC,ETH,SOL --with-ai
+"""
+import argparse
+import csv
+import logging
+import os
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from valuation_crypto import utils
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.history import get_history_store
+from valuation_crypto.sentiment_scoring import SCORERS, configure_scorer
+
+CMC_LISTINGS_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
+
+CSV_COLUMNS = [
+    'Rank', 'Crypto ID', 'Symbol', 'Current Price', 'Market Cap Percentage %', 'Adjusted Annual Velocity',
+    'Valuation Difference', 'Valuation Difference %', 'Circulating Supply', 'Total 24h Volume',
+    'Market Sentiment %', 'Current Mentions', 'Previous Mentions', 'Combined Sentiment Score',
+]
+AI_COLUMNS = ['AI Analysis', 'Image URL']
+
+# Concurrent workers per stage; each stage maps to one group of upstream services
+DEFAULT_CONCURRENCY = {
+    'sentiment': 3,  # Reddit + Google Trends
+    'llm': 4,        # OpenAI chat + images
+}
+
+
+def fetch_top_cryptocurrencies(limit=100):
+    """Fetches the top `limit` coins by market cap from CoinMarketCap, quotes included."""
+    rate_limiter.acquire('coinmarketcap')
+    try:
+        response = utils.cmc_session.get(
+            CMC_LISTINGS_URL, params={'limit': limit, 'convert': 'USD'}, timeout=utils.CMC_TIMEOUT)
+        if response.status_code != 200:
+            logging.error(f"CoinMarketCap listings returned {response.status_code}")
+            return []
+        return response.json().get('data', [])
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"CoinMarketCap listings request failed: {e}")
+        return []
+
+
+def build_row(rank, metrics):
+    """Formats the computed metrics of one coin as a results CSV row."""
+    return {
+        'Rank': rank,
+        'Crypto ID': metrics['crypto_id'],
+        'Symbol': metrics['crypto_symbol'],
+        'Current Price': metrics['current_price'],
+        'Market Cap Percentage %': metrics['market_cap_dominance'],
+        'Adjusted Annual Velocity': metrics['adjusted_velocity'],
+        'Valuation Difference': metrics['valuation_difference'],
+        'Valuation Difference %': metrics['valuation_difference_percentage'],
+        'Circulating Supply': metrics['circulating_supply'],
+        'Total 24h Volume': metrics['total_volume_24h'],
+        'Market Sentiment %': metrics['market_sentiment_percentage'],
+        'Current Mentions': metrics['current_mentions'],
+        'Previous Mentions': metrics['previous_mentions'],
+        'Combined Sentiment Score': metrics['sentiment_score'],
+    }
+
+
+class IncrementalCsvWriter:
+    """Thread-safe CSV writer that flushes every row, so partial runs are never lost."""
+
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns)
+        self._writer.writeheader()
+        self._lock = threading.Lock()
+        self.rows_written = 0
+
+    def write(self, row):
+        with self._lock:
+            self._writer.writerow(row)
+            self._file.flush()
+            self.rows_written += 1
+
+    def close(self):
+        self._file.close()
+
+
+def run_batch(crypto_data_list, output_path, with_ai=False, concurrency=None, history=None):
+    """
+    Values every coin in `crypto_data_list` (CMC quote dicts, in rank order) and writes one row per coin.
+    With a `history` store, the computed metrics are also appended to it.
+    Returns the number of rows written.
+    """
+    concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+    columns = CSV_COLUMNS + AI_COLUMNS if with_ai else CSV_COLUMNS
+    writer = IncrementalCsvWriter(output_path, columns)
+    records = []
+
+    # Market-data stage: one bulk ticker request per exchange for the whole universe
+    symbols = [crypto_data['symbol'].upper() for crypto_data in crypto_data_list]
+    volumes = utils.fetch_trading_volumes(symbols)
+    ranked_metrics = [
+        (rank, utils.compute_market_metrics(crypto_data, volumes.get(crypto_data['symbol'].upper(), 0)))
+        for rank, crypto_data in enumerate(crypto_data_list, start=1)
+    ]
+
+    sentiment_pool = ThreadPoolExecutor(max_workers=concurrency['sentiment'], thread_name_prefix='sentiment')
+    llm_pool = ThreadPoolExecutor(max_workers=concurrency['llm'], thread_name_prefix='llm')
+
+    def llm_stage(rank, metrics):
+        # The row is written even when the LLM stage fails, so AI columns never drop a coin from the CSV
+        try:
+            analysis, image_url = utils.generate_ai_analysis(metrics)
+        except Exception as e:
+            logging.error(f"LLM stage failed for {metrics['crypto_symbol']}: {e}")
+            analysis, image_url = utils.analysis_error(e), None
+        writer.write(dict(build_row(rank, metrics), **{'AI Analysis': analysis, 'Image URL': image_url}))
+
+    try:
+        # Sentiment stage: Google Trends for the whole universe in shared payloads, then Reddit per coin
+        try:
+            trends = utils.fetch_trends([metrics for _, metrics in ranked_metrics])
+        except Exception as e:
+            logging.error(f"Google Trends stage failed: {e}")
+            trends = None
+        sentiment_futures = {
+            sentiment_pool.submit(utils.fetch_sentiment, metrics, trends): (rank, metrics)
+            for rank, metrics in ranked_metrics
+        }
+        llm_futures = []
+        for future in as_completed(sentiment_futures):
+            rank, metrics = sentiment_futures[future]
+            try:
+                sentiment = future.result()
+            except Exception as e:
+                logging.error(f"Sentiment stage failed for {metrics['crypto_symbol']}: {e}")
+                sentiment = utils.DEFAULT_SENTIMENT
+            metrics = utils.apply_sentiment(metrics, sentiment)
+            records.append(dict(metrics, rank=rank))
+            if with_ai:
+                llm_futures.append(llm_pool.submit(llm_stage, rank, metrics))
+            else:
+                writer.write(build_row(rank, metrics))
+
+        for future in as_completed(llm_futures):
+            future.result()
+    finally:
+        sentiment_pool.shutdown(wait=True)
+        llm_pool.shutdown(wait=True)
+        writer.close()
+        if history is not None and records:
+            history.append(records)
+    return writer.rows_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch crypto valuation & sentiment analysis")
+    parser.add_argument('--top', type=int, default=100, help="Number of coins by market cap to value")
+    parser.add_argument('--symbols', help="Comma-separated symbols to value instead of the top-N")
+    parser.add_argument('--with-ai', action='store_true', help="Also generate GPT-4 commentary and DALL-E images")
+    parser.add_argument('--output-dir', default='results')
+    parser.add_argument('--log-dir', default='log')
+    parser.add_argument('--sentiment-workers', type=int, default=DEFAULT_CONCURRENCY['sentiment'])
+    parser.add_argument('--llm-workers', type=int, default=DEFAULT_CONCURRENCY['llm'])
+    parser.add_argument('--no-history', action='store_true', help="Do not append the results to the history store")
+    parser.add_argument('--scorer', choices=sorted(SCORERS), default='textblob',
+                        help="Polarity scorer for Reddit posts")
+    args = parser.parse_args(argv)
+    configure_scorer(args.scorer)
+
+    run_id = datetime.now().strftime('%Y%m%d%H%M%S%f')[:18]
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(args.log_dir, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(args.log_dir, f"{run_id}.log"),
+                        level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    if args.symbols:
+        symbols = [symbol.strip().upper() for symbol in args.symbols.split(',') if symbol.strip()]
+        quotes = utils.fetch_crypto_quotes(symbols)
+        crypto_data_list = [quotes[symbol] for symbol in symbols if symbol in quotes]
+    else:
+        crypto_data_list = fetch_top_cryptocurrencies(args.top)
+
+    output_path = os.path.join(args.output_dir, f"{run_id}.csv")
+    rows = run_batch(crypto_data_list, output_path, with_ai=args.with_ai,
+                     concurrency={'sentiment': args.sentiment_workers, 'llm': args.llm_workers},
+                     history=None if args.no_history else get_history_store())
+    print(f"Results for {rows} coins have been saved to {output_path}.")
+
+
+if __name__ == '__main__':
+    main()
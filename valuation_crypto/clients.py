@@ -0,0 +1,105 @@
+"""
+API clients created on first use.
+
+Constructing the OpenAI, Reddit and Google Trends clients imports large libraries, reads the
+credentials in `valuation_crypto/apikey.py` and, for pytrends, makes a network request. Modules
+therefore hold a `LazyClient` that builds the real client the first time one of its attributes is used.
+The async clients are bound to an event loop, so the async engine creates its own per loop.
+"""
+import threading
+
+
+class LazyClient:
+    """
+    Proxy that calls `factory()` on first attribute access and forwards everything to its result.
+    Its own methods are underscore-prefixed so they never shadow the client's API (e.g. `Session.get`);
+    use `unwrap`, `is_created` and `reset_client` from outside this module.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_client', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolve(self):
+        """Returns the underlying client, creating it if needed."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                client = self._client
+                if client is None:
+                    client = self._factory()
+                    object.__setattr__(self, '_client', client)
+        return client
+
+    def _reset(self):
+        """Drops the client; the next use creates a new one."""
+        with self._lock:
+            object.__setattr__(self, '_client', None)
+
+    def __getattr__(self, name):
+        # Introspection (mock, copy, inspect) probes private names; answering those must not create the client
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __repr__(self):
+        return f"<LazyClient {getattr(self._factory, '__name__', self._factory)} created={self._client is not None}>"
+
+
+def unwrap(client):
+    """The client behind a LazyClient, created if needed; other objects are returned unchanged."""
+    return client._resolve() if isinstance(client, LazyClient) else client
+
+
+def is_created(client):
+    return client._client is not None
+
+
+def reset_client(client):
+    """Makes a LazyClient build a new client on next use."""
+    client._reset()
+
+
+def create_openai_client():
+    from openai import OpenAI
+    from valuation_crypto.apikey import openai_key
+    return OpenAI(api_key=openai_key)
+
+
+def create_reddit_client():
+    import praw
+    from valuation_crypto.apikey import client_id, client_secret, user_agent
+    return praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
+
+
+def create_trends_client():
+    from pytrends.request import TrendReq
+    return TrendReq(hl='en-US', tz=360)
+
+
+def create_async_cmc_client():
+    import httpx
+    from valuation_crypto.apikey import cmc_api
+    return httpx.AsyncClient(
+        headers={'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': cmc_api},
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+        transport=httpx.AsyncHTTPTransport(retries=3),
+    )
+
+
+def create_async_exchange(exchange_id):
+    import ccxt.async_support as ccxt_async
+    return getattr(ccxt_async, exchange_id)()
+
+
+def create_async_openai_client():
+    from openai import AsyncOpenAI
+    from valuation_crypto.apikey import openai_key
+    return AsyncOpenAI(api_key=openai_key)
+
+
+def create_stream_exchange(exchange_id):
+    """ccxt.pro instance of an exchange; raises AttributeError if ccxt.pro has no streams for it."""
+    import ccxt.pro as ccxt_pro
+    return getattr(ccxt_pro, exchange_id)()
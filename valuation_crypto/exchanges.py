@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.pair_index import QUOTE_ORDER, get_pair_index, resolve_market as resolve_indexed_market
+
+# Markets change rarely; reload them a few times a day at most.
+MARKETS_TTL = 6 * 60 * 60
+
+def rate_limit_key(exchange_id):
+    """Name of the rate limiter bucket guarding an exchange's REST API."""
+    return f"ccxt:{exchange_id}"
+
+
+def configure_rate_limit(exchange_id, exchange):
+    """Sizes the exchange's bucket from ccxt's documented `rateLimit` (milliseconds between requests)."""
+    rate_limit_ms = getattr(exchange, 'rateLimit', None)
+    if isinstance(rate_limit_ms, (int, float)) and rate_limit_ms > 0:
+        rate_limiter.configure(rate_limit_key(exchange_id), rate=1000 / rate_limit_ms, capacity=10)
+
+
+class ExchangePool:
+    """
+    Process-wide registry of ccxt exchanges.
+    Each exchange is created once and its markets are reloaded only after `markets_ttl` seconds.
+    Pairs are resolved from the persistent pair index while it is fresh, without loading markets.
+    """
+
+    def __init__(self, markets_ttl=MARKETS_TTL, pair_index=None):
+        self.markets_ttl = markets_ttl
+        self.pair_index = pair_index
+        self._exchanges = {}
+        self._loaded_at = {}
+        self._pair_indexes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.stats = {'exchanges_created': 0, 'load_markets_calls': 0, 'load_markets_saved': 0, 'index_hits': 0}
+
+    def get(self, exchange_id):
+        """Returns the shared exchange instance with markets loaded."""
+        with self._lock:
+            exchange = self._exchanges.get(exchange_id)
+            if exchange is None:
+                import ccxt
+                exchange = getattr(ccxt, exchange_id)()
+                self._exchanges[exchange_id] = exchange
+                self.stats['exchanges_created'] += 1
+                configure_rate_limit(exchange_id, exchange)
+            lock = self._locks.setdefault(exchange_id, threading.Lock())
+
+        with lock:
+            loaded_at = self._loaded_at.get(exchange_id)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.markets_ttl:
+                self._count('load_markets_saved')
+                return exchange
+
+            logging.info(f"Loading markets for {exchange_id}")
+            rate_limiter.acquire(rate_limit_key(exchange_id))
+            exchange.load_markets(reload=loaded_at is not None)
+            index = self._index()
+            index.update(exchange_id, exchange)
+            self._pair_indexes[exchange_id] = index.pairs(exchange_id)
+            self._loaded_at[exchange_id] = time.monotonic()
+            self._count('load_markets_calls')
+        return exchange
+
+    def pairs(self, exchange_id):
+        """Returns base -> {quote: symbol} for an exchange, loading its markets only if the persistent index is stale."""
+        pairs = self._pair_indexes.get(exchange_id)
+        if pairs is not None:
+            return pairs
+        index = self._index()
+        age = index.age(exchange_id)
+        if age is not None and age < self.markets_ttl:
+            pairs = self._pair_indexes[exchange_id] = index.pairs(exchange_id)
+            self._count('index_hits')
+            return pairs
+        self.get(exchange_id)
+        return self._pair_indexes.get(exchange_id, {})
+
+    def resolve_market(self, exchange_id, base, quotes=QUOTE_ORDER):
+        """Returns (market symbol, quote) of the first of `quotes` that `base` trades against, or None."""
+        return resolve_indexed_market(self.pairs(exchange_id), base, quotes)
+
+    def resolve_pair(self, exchange_id, base, quotes=QUOTE_ORDER):
+        """Returns the first market of `base` quoted in one of `quotes`, or None."""
+        market = self.resolve_market(exchange_id, base, quotes)
+        return market[0] if market else None
+
+    def invalidate(self, exchange_id=None):
+        """Forces a markets reload on next use, for one exchange or all of them."""
+        with self._lock:
+            if exchange_id is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(exchange_id, None)
+
+    def clear(self):
+        """Drops every exchange instance and resets the counters."""
+        with self._lock:
+            self._exchanges.clear()
+            self._loaded_at.clear()
+            self._pair_indexes.clear()
+            self._locks.clear()
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def _index(self):
+        return self.pair_index if self.pair_index is not None else get_pair_index()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+exchange_pool = ExchangePool()
+
+
+def get_exchange(exchange_id):
+    """Returns a shared, market-loaded ccxt exchange from the process-wide pool."""
+    return exchange_pool.get(exchange_id)
+
+
+def resolve_pair(exchange_id, base, quotes=QUOTE_ORDER):
+    """Resolves the market used to read `base` volume on an exchange from the pair index."""
+    return exchange_pool.resolve_pair(exchange_id, base, quotes)
+
+
+def resolve_market(exchange_id, base, quotes=QUOTE_ORDER):
+    """Like `resolve_pair`, but returns (market symbol, quote currency)."""
+    return exchange_pool.resolve_market(exchange_id, base, quotes)
@@ -0,0 +1,283 @@
+"""
+Append-only columnar history of valuation runs.
+
+Every record is one coin at one point in time. Records are partitioned by UTC date, and each partition
+keeps one raw NumPy file per column (`<root>/<YYYY-MM-DD>/<column>.bin`). Appends write to the end of
+those files; queries memory-map only the partitions and columns they need.
+
+Usage:
+    python -m valuation_crypto.history backfill results/*.csv
+    python -m valuation_crypto.history show BTC --metric current_price
+"""
+import argparse
+import csv
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from valuation_crypto.locking import file_lock
+
+# Shared by the app, batch runs and the watchlist wherever they are started from
+HISTORY_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'valuation_crypto', 'history')
+# Longest symbol the fixed-width symbol column holds; records of longer symbols are rejected, not truncated
+SYMBOL_WIDTH = 16
+
+# Column name -> dtype. Metric columns use the keys of the dicts built by utils.compute_market_metrics
+# and utils.apply_sentiment; missing values are stored as NaN.
+COLUMNS = {
+    'timestamp': np.dtype('<i8'),       # seconds since the epoch, UTC
+    'symbol': np.dtype(f'S{SYMBOL_WIDTH}'),
+    'rank': np.dtype('<f8'),
+    'current_price': np.dtype('<f8'),
+    'market_cap': np.dtype('<f8'),
+    'market_cap_dominance': np.dtype('<f8'),
+    'circulating_supply': np.dtype('<f8'),
+    'total_volume_24h': np.dtype('<f8'),
+    'velocity': np.dtype('<f8'),
+    'adjusted_velocity': np.dtype('<f8'),
+    'valuation_difference': np.dtype('<f8'),
+    'valuation_difference_percentage': np.dtype('<f8'),
+    'market_sentiment_percentage': np.dtype('<f8'),
+    'sentiment_score': np.dtype('<f8'),
+    'current_mentions': np.dtype('<f8'),
+    'previous_mentions': np.dtype('<f8'),
+}
+METRICS = [column for column in COLUMNS if column not in ('timestamp', 'symbol')]
+
+# Results CSV header -> metric
+CSV_METRICS = {
+    'Rank': 'rank',
+    'Current Price': 'current_price',
+    'Market Cap Percentage %': 'market_cap_dominance',
+    'Adjusted Annual Velocity': 'adjusted_velocity',
+    'Valuation Difference': 'valuation_difference',
+    'Valuation Difference %': 'valuation_difference_percentage',
+    'Circulating Supply': 'circulating_supply',
+    'Total 24h Volume': 'total_volume_24h',
+    'Market Sentiment %': 'market_sentiment_percentage',
+    'Current Mentions': 'current_mentions',
+    'Previous Mentions': 'previous_mentions',
+    'Combined Sentiment Score': 'sentiment_score',
+}
+
+
+def _partition(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _encode_symbol(symbol):
+    """The symbol as stored in the symbol column, or None if the column cannot hold it exactly."""
+    try:
+        encoded = symbol.upper().encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    return encoded if len(encoded) <= SYMBOL_WIDTH else None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class HistoryStore:
+    """
+    Append-only store of per-coin valuation records.
+    Appends are serialized within a process by a lock and across processes by a per-partition file lock,
+    so the column files of a partition always hold rows in the same order.
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def append(self, records, timestamp=None):
+        """
+        Appends metric dicts (as built by `analyze_crypto`'s stages, optionally with 'rank' and 'timestamp').
+        Records without a timestamp get `timestamp`, or the current time. Returns the number appended.
+        """
+        default_timestamp = int(timestamp if timestamp is not None else datetime.now(timezone.utc).timestamp())
+        partitions = {}
+        for record in records:
+            symbol = _encode_symbol(record.get('crypto_symbol') or record.get('symbol', ''))
+            if symbol is None:
+                logging.warning(f"Not recording {record.get('crypto_symbol') or record.get('symbol')}: "
+                                f"history symbols are ASCII and at most {SYMBOL_WIDTH} characters")
+                continue
+            record_timestamp = int(record.get('timestamp', default_timestamp))
+            partitions.setdefault(_partition(record_timestamp), []).append((record_timestamp, symbol, record))
+
+        with self._lock:
+            for partition, rows in partitions.items():
+                directory = os.path.join(self.root, partition)
+                os.makedirs(directory, exist_ok=True)
+                columns = {
+                    'timestamp': np.array([row_timestamp for row_timestamp, _, _ in rows], dtype=COLUMNS['timestamp']),
+                    'symbol': np.array([symbol for _, symbol, _ in rows], dtype=COLUMNS['symbol']),
+                }
+                for metric in METRICS:
+                    columns[metric] = np.array([_to_float(record.get(metric)) for _, _, record in rows], dtype=COLUMNS[metric])
+                with file_lock(os.path.join(directory, '.lock')):
+                    for column, values in columns.items():
+                        with open(os.path.join(directory, f"{column}.bin"), 'ab') as file:
+                            file.write(values.tobytes())
+        return sum(len(rows) for rows in partitions.values())
+
+    def partitions(self, start=None, end=None):
+        """Partition dates with data, oldest first, optionally limited to those overlapping [start, end]."""
+        if not os.path.isdir(self.root):
+            return []
+        first = _partition(start) if start is not None else None
+        last = _partition(end) if end is not None else None
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, 'timestamp.bin'))
+            and (first is None or name >= first) and (last is None or name <= last)
+        )
+
+    def _read(self, partition, column, rows=None):
+        path = os.path.join(self.root, partition, f"{column}.bin")
+        dtype = COLUMNS[column]
+        if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+            return np.empty(0, dtype=dtype)
+        values = np.memmap(path, dtype=dtype, mode='r', shape=(os.path.getsize(path) // dtype.itemsize,))
+        return values if rows is None else values[:rows]
+
+    def _complete_rows(self, partition, columns):
+        # An interrupted append can leave columns of unequal length; only complete rows are read
+        sizes = []
+        for column in columns:
+            path = os.path.join(self.root, partition, f"{column}.bin")
+            sizes.append(os.path.getsize(path) // COLUMNS[column].itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def partition_rows(self, partition):
+        """Number of complete records in a partition."""
+        # Appends write the columns in COLUMNS order, so the last column is the shortest
+        return self._complete_rows(partition, list(COLUMNS)[-1:])
+
+    def read_partition(self, partition, columns):
+        """Memory-maps the complete rows of `columns` in one partition."""
+        rows = self._complete_rows(partition, columns)
+        return {column: self._read(partition, column, rows) for column in columns}
+
+    def query(self, symbol=None, metrics=None, start=None, end=None):
+        """
+        Returns {'timestamp', 'symbol', *metrics} as NumPy arrays, sorted by time,
+        for the records of `symbol` (or every coin) between `start` and `end` (epoch seconds, inclusive).
+        """
+        metrics = list(metrics) if metrics is not None else METRICS
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown history metrics: {sorted(unknown)}")
+        wanted = symbol.upper().encode('ascii') if symbol else None
+
+        columns = ['timestamp', 'symbol'] + metrics
+        chunks = {column: [] for column in columns}
+        for partition in self.partitions(start, end):
+            data = self.read_partition(partition, columns)
+            mask = np.ones(len(data['timestamp']), dtype=bool)
+            if start is not None:
+                mask &= data['timestamp'] >= start
+            if end is not None:
+                mask &= data['timestamp'] <= end
+            if wanted is not None:
+                mask &= data['symbol'] == wanted
+            if not mask.any():
+                continue
+            for column in columns:
+                chunks[column].append(np.asarray(data[column][mask]))
+
+        result = {
+            column: np.concatenate(values) if values else np.empty(0, dtype=COLUMNS[column])
+            for column, values in chunks.items()
+        }
+        order = np.argsort(result['timestamp'], kind='stable')
+        result = {column: values[order] for column, values in result.items()}
+        result['symbol'] = result['symbol'].astype(str)
+        return result
+
+    def series(self, symbol, metric, start=None, end=None):
+        """Returns (timestamps, values) of one metric for one coin."""
+        result = self.query(symbol, [metric], start, end)
+        return result['timestamp'], result[metric]
+
+    def symbols(self):
+        """Every coin with at least one record."""
+        found = set()
+        for partition in self.partitions():
+            found.update(np.unique(np.asarray(self._read(partition, 'symbol'))).astype(str))
+        return sorted(found)
+
+
+def run_timestamp(path):
+    """Start time of a batch run, from its `results/<YYYYmmddHHMMSSffff>.csv` file name (local time)."""
+    run_id = os.path.splitext(os.path.basename(path))[0]
+    return int(datetime.strptime(run_id[:14], '%Y%m%d%H%M%S').timestamp())
+
+
+def backfill_csv(store, paths):
+    """Imports batch result CSVs into the store; returns the number of records appended."""
+    appended = 0
+    for path in sorted(paths):
+        try:
+            timestamp = run_timestamp(path)
+        except ValueError:
+            logging.warning(f"Skipping {path}: file name is not a batch run id")
+            continue
+        with open(path, newline='') as file:
+            records = [
+                dict({metric: row.get(column) for column, metric in CSV_METRICS.items()}, crypto_symbol=row['Symbol'])
+                for row in csv.DictReader(file)
+            ]
+        appended += store.append(records, timestamp=timestamp)
+    return appended
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Returns the process-wide history store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+
+def configure_history_store(root=HISTORY_DIR):
+    """Replaces the process-wide history store, e.g. to point it at another directory."""
+    global _store
+    with _store_lock:
+        _store = HistoryStore(root)
+        return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valuation history store")
+    parser.add_argument('--root', default=HISTORY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    backfill = commands.add_parser('backfill', help="Import batch result CSVs")
+    backfill.add_argument('paths', nargs='+')
+    show = commands.add_parser('show', help="Print the history of one coin")
+    show.add_argument('symbol')
+    show.add_argument('--metric', action='append', choices=METRICS)
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.root)
+    if args.command == 'backfill':
+        print(f"Appended {backfill_csv(store, args.paths)} records to {args.root}.")
+    else:
+        metrics = args.metric or ['current_price', 'adjusted_velocity', 'valuation_difference']
+        result = store.query(args.symbol, metrics)
+        for row in range(len(result['timestamp'])):
+            when = datetime.fromtimestamp(result['timestamp'][row], tz=timezone.utc).isoformat()
+            print(when, *(f"{metric}={result[metric][row]}" for metric in metrics))
+
+
+if __name__ == '__main__':
+    main()
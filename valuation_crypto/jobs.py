@@ -0,0 +1,209 @@
+"""
+Background execution of crypto analyses.
+
+The Dash callback submits a job and polls its record instead of running `analyze_crypto` in the
+web worker. Jobs run on a local worker pool; the queue and the result store are pluggable and
+speak a small Redis subset (set/get/delete, lpush/brpop), so a Redis client or a local
+Redis-compatible server can replace the in-process defaults without code changes.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from valuation_crypto import utils
+from valuation_crypto.history import get_history_store
+from valuation_crypto.telemetry import trace
+
+# Finished job records are kept for 10 minutes for the UI to poll
+JOB_TTL = 10 * 60
+# An in-flight marker outlives a stuck worker by at most this long; every stage update extends it
+INFLIGHT_TTL = 5 * 60
+JOB_WORKERS = 4
+KEY_PREFIX = 'valuation_crypto'
+
+
+class InMemoryStore:
+    """Thread-safe in-process stand-in for the Redis string commands used by the job manager."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            self._expire(key)
+            if nx and key in self._values:
+                return None
+            self._values[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            self._expire(key)
+            entry = self._values.get(key)
+            return entry[0] if entry else None
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._values.pop(key, None) is not None for key in keys)
+
+    def _expire(self, key):
+        entry = self._values.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+
+
+class InProcessQueue:
+    """In-process stand-in for a Redis list used as a FIFO queue (LPUSH / BRPOP)."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def lpush(self, name, value):
+        self._queue.put((name, value))
+
+    def brpop(self, name, timeout=0):
+        try:
+            return self._queue.get(timeout=timeout or None)
+        except queue.Empty:
+            return None
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class JobManager:
+    """
+    Runs analyses on a pool of worker threads and keeps their progress in the result store.
+    Concurrent submissions for the same symbol share one job.
+    """
+
+    def __init__(self, store=None, queue=None, workers=JOB_WORKERS, job_ttl=JOB_TTL):
+        self.store = store if store is not None else InMemoryStore()
+        self.queue = queue if queue is not None else InProcessQueue()
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self.queue_name = f"{KEY_PREFIX}:jobs"
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def submit(self, symbol):
+        """Queues an analysis of `symbol` and returns its job id, or the id of the identical job already running."""
+        symbol = symbol.strip().upper()
+        job_id = uuid.uuid4().hex
+        inflight_key = f"{KEY_PREFIX}:inflight:{symbol}"
+        if not self.store.set(inflight_key, job_id, ex=INFLIGHT_TTL, nx=True):
+            existing = _decode(self.store.get(inflight_key))
+            if existing and self.get(existing):
+                return existing
+            self.store.set(inflight_key, job_id, ex=INFLIGHT_TTL)
+
+        self._save({'id': job_id, 'symbol': symbol, 'status': 'queued', 'stages': {}, 'error': None,
+                    'created_at': time.time(), 'updated_at': time.time()})
+        self.start()
+        self.queue.lpush(self.queue_name, job_id)
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job record: status ('queued', 'running', 'done' or 'error') and the finished stages."""
+        value = self.store.get(f"{KEY_PREFIX}:job:{job_id}")
+        return json.loads(_decode(value)) if value else None
+
+    def start(self):
+        """Starts the worker threads, once."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        """Stops the workers after their current job."""
+        with self._lock:
+            self._stopping.set()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            item = self.queue.brpop(self.queue_name, timeout=1)
+            if item is None:
+                continue
+            job_id = _decode(item[1])
+            job = self.get(job_id)
+            if job is None:
+                logging.warning(f"Job {job_id} expired before it started")
+                continue
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logging.exception(f"Job {job_id} failed")
+                self._update(job_id, status='error', error=str(e))
+            finally:
+                self._release(job['symbol'], job_id)
+
+    def _run(self, job_id):
+        job = self._update(job_id, status='running')
+        if job is None:
+            return
+        with trace('job', symbol=job['symbol']) as timing:
+            market = utils.fetch_market_metrics(job['symbol'])
+            if not market:
+                self._update(job_id, status='error', error=utils.INVALID_SYMBOL_ERROR, timings=timing.breakdown())
+                return
+            if self._update(job_id, stages={'market': market}) is None:
+                return
+
+            analysis = utils.apply_sentiment(market, utils.fetch_sentiment(market))
+            self._record_history(analysis)
+            if self._update(job_id, stages={'market': market, 'sentiment': analysis}) is None:
+                return
+
+            ai_text, image_url = utils.generate_ai_analysis(analysis)
+            self._update(job_id, status='done', timings=timing.breakdown(),
+                         stages={'market': market, 'sentiment': analysis, 'ai': {'text': ai_text, 'image_url': image_url}})
+
+    def _record_history(self, analysis):
+        try:
+            get_history_store().append([analysis])
+        except OSError as e:
+            logging.warning(f"Could not record {analysis['crypto_symbol']} in the history store: {e}")
+
+    def _update(self, job_id, **fields):
+        """
+        Updates the job record and, while it runs, extends its in-flight marker.
+        Returns None when the record expired or the store was reset; the job is then abandoned.
+        """
+        job = self.get(job_id)
+        if job is None:
+            logging.warning(f"Job {job_id} no longer has a record, abandoning it")
+            return None
+        job.update(fields, updated_at=time.time())
+        self._save(job)
+        if job['status'] not in ('done', 'error'):
+            self._extend(job['symbol'], job_id)
+        return job
+
+    def _save(self, job):
+        self.store.set(f"{KEY_PREFIX}:job:{job['id']}", json.dumps(job), ex=self.job_ttl)
+
+    def _extend(self, symbol, job_id):
+        inflight_key = f"{KEY_PREFIX}:inflight:{symbol}"
+        if _decode(self.store.get(inflight_key)) in (job_id, None):
+            self.store.set(inflight_key, job_id, ex=INFLIGHT_TTL)
+
+    def _release(self, symbol, job_id):
+        inflight_key = f"{KEY_PREFIX}:inflight:{symbol}"
+        if _decode(self.store.get(inflight_key)) == job_id:
+            self.store.delete(inflight_key)
+
+
+job_manager = JobManager()
@@ -0,0 +1,21 @@
+"""Advisory file locks serializing writers across processes (batch runs, app workers, the watchlist)."""
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock on the lock file at `path`, created if needed; a no-op without fcntl."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from valuation_crypto.singleflight import flight_key
+from valuation_crypto.telemetry import propagate
+
+# (fresh for, then served stale while refreshing for) in seconds, per data source.
+# A CMC quote carries price alongside name and supply, so it takes the TTL of its most volatile field.
+SOURCE_TTLS = {
+    'crypto_data': (30, 10 * 60),               # price moves within seconds
+    'trading_volume': (30, 10 * 60),
+    'conversion_rate': (30, 10 * 60),
+    'sentiment': (15 * 60, 6 * 60 * 60),        # Reddit mention counts and Trends move over many minutes
+}
+DEFAULT_TTL = (60, 10 * 60)
+REFRESH_WORKERS = 4
+
+_max_age = contextvars.ContextVar('market_cache_max_age', default=None)
+
+
+@contextlib.contextmanager
+def max_age(seconds):
+    """
+    Within the block (and work submitted from it with `telemetry.propagate`), entries older than `seconds`
+    are fetched synchronously instead of being served, fresh or stale. The new values are cached as usual.
+    """
+    token = _max_age.set(seconds)
+    try:
+        yield
+    finally:
+        _max_age.reset(token)
+
+
+class MarketCache:
+    """
+    Stale-while-revalidate cache of upstream data with per-source TTLs.
+    Fresh entries are served as is; stale ones are served immediately while a background refresh
+    replaces them; entries older than the stale window, or missing, are fetched synchronously.
+    Failed fetches (exceptions or None) are never cached.
+    """
+
+    def __init__(self, ttls=SOURCE_TTLS, refresh_workers=REFRESH_WORKERS):
+        self.ttls = dict(ttls)
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='cache-refresh')
+        self._tasks = set()
+        self.stats = {}
+
+    def get(self, source, key, fetch):
+        """Returns the cached value of `key`, calling `fetch()` on a miss or in the background when stale."""
+        found, value, refresh = self._lookup(source, key)
+        if refresh:
+            # The refresh joins the caller's trace and keeps its max_age, like other executor work
+            self._executor.submit(propagate(self._refresh), source, key, fetch)
+        if found:
+            return value
+
+        value = fetch()
+        self._store(source, key, value)
+        return value
+
+    async def get_async(self, source, key, fetch):
+        """Like `get` for a coroutine function `fetch`; stale entries are refreshed in a task of the running loop."""
+        found, value, refresh = self._lookup(source, key)
+        if refresh:
+            task = asyncio.ensure_future(self._refresh_async(source, key, fetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if found:
+            return value
+
+        value = await fetch()
+        self._store(source, key, value)
+        return value
+
+    def _lookup(self, source, key):
+        """Returns (found, value, refresh); `refresh` is True for the one caller that must revalidate a stale entry."""
+        fresh_for, stale_for = self.ttls.get(source, DEFAULT_TTL)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((source, key))
+            age = now - entry[0] if entry else None
+            limit = _max_age.get()
+            if age is not None and limit is not None and age >= limit:
+                age = None
+            if age is not None and age < fresh_for:
+                self._record(source, 'hits')
+                return True, entry[1], False
+            if age is not None and age < fresh_for + stale_for:
+                self._record(source, 'stale_hits')
+                refresh = (source, key) not in self._refreshing
+                self._refreshing.add((source, key))
+                return True, entry[1], refresh
+            self._record(source, 'misses')
+            return False, None, False
+
+    def ages(self, source=None):
+        """Seconds since each entry was fetched, as {source: {key: age}}."""
+        now = time.monotonic()
+        with self._lock:
+            ages = {}
+            for (entry_source, key), (fetched_at, _) in self._entries.items():
+                if source is None or entry_source == source:
+                    ages.setdefault(entry_source, {})[key] = round(now - fetched_at, 3)
+            return ages
+
+    def invalidate(self, source=None):
+        """Drops every entry, or those of one source."""
+        with self._lock:
+            for entry in [entry for entry in self._entries if source is None or entry[0] == source]:
+                del self._entries[entry]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats.clear()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _refresh(self, source, key, fetch):
+        try:
+            self._store(source, key, fetch())
+            self._record_locked(source, 'refreshes')
+        except Exception as e:
+            logging.warning(f"Background refresh of {source} failed, serving the stale value: {e}")
+            self._record_locked(source, 'refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard((source, key))
+
+    async def _refresh_async(self, source, key, fetch):
+        try:
+            self._store(source, key, await fetch())
+            self._record_locked(source, 'refreshes')
+        except Exception as e:
+            logging.warning(f"Background refresh of {source} failed, serving the stale value: {e}")
+            self._record_locked(source, 'refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard((source, key))
+
+    def _store(self, source, key, value):
+        if value is None:
+            return
+        with self._lock:
+            self._entries[(source, key)] = (time.monotonic(), value)
+
+    def _record_locked(self, source, counter):
+        with self._lock:
+            self._record(source, counter)
+
+    def _record(self, source, counter):
+        stats = self.stats.setdefault(source, {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0,
+                                               'refresh_errors': 0, 'hit_ratio': 0.0})
+        stats[counter] += 1
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+
+
+_cache = MarketCache()
+
+
+def get_market_cache():
+    """Returns the process-wide market data cache."""
+    return _cache
+
+
+def configure_market_cache(ttls=SOURCE_TTLS, **kwargs):
+    """Replaces the process-wide market data cache, e.g. to tune the TTLs of a source."""
+    global _cache
+    _cache.shutdown()
+    _cache = MarketCache(ttls, **kwargs)
+    return _cache
+
+
+def cached(source):
+    """Decorator serving calls through the process-wide market cache, keyed on their arguments."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = flight_key(fn.__name__, args, kwargs)
+            return get_market_cache().get(source, key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
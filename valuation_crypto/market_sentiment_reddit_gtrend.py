@@ -1,64 +1,182 @@
+import threading
 import time
-import praw
-from textblob import TextBlob
-from valuation_crypto.apikey import client_id, client_secret, user_agent
-from pytrends.request import TrendReq
+from datetime import date
 from pytrends.exceptions import TooManyRequestsError
 import logging
 import random
-
-# Initialize Reddit API
-reddit = praw.Reddit(client_id=client_id, client_secret=client_secret, user_agent=user_agent)
-
-# Initialize Google Trends API
-pytrends = TrendReq(hl='en-US', tz=360)
-
-def fetch_mentions_and_sentiment_reddit(crypto_name, crypto_symbol, subreddits, time_filter):
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.sentiment_cache import get_sentiment_cache, text_hash
+from valuation_crypto.sentiment_scoring import score_texts
+from valuation_crypto.singleflight import single_flight
+from valuation_crypto.market_cache import cached
+from valuation_crypto.clients import LazyClient, create_reddit_client, create_trends_client
+from valuation_crypto.telemetry import span, telemetry
+
+# Reddit and Google Trends clients, created on first use
+reddit = LazyClient(create_reddit_client)
+pytrends = LazyClient(create_trends_client)
+
+# Google Trends: four coins per payload plus a shared anchor term (pytrends accepts five keywords)
+TRENDS_ANCHOR = 'cryptocurrency'
+TRENDS_GROUP_SIZE = 4
+# Requests for at most this many coins (e.g. one coin from the web app) send one keyword-only payload
+# per coin: Google scales a payload to its largest keyword and returns integers, so a coin searched far
+# less than the anchor would collapse to a few steps
+TRENDS_UNANCHORED_MAX = 4
+_trends_cache = {}
+_trends_lock = threading.Lock()
+
+# Subreddits searched for mentions of every coin
+SUBREDDITS = ['CryptoCurrency', 'Ethereum', 'ethtrader', 'eth', 'altcoin', 'CryptoMarkets']
+
+# Posts newer than this (in seconds) count as current mentions, older ones as previous mentions
+CURRENT_PERIOD = 365 * 24 * 60 * 60
+
+def search_reddit_posts(subreddit, search_query):
+    """
+    All-time search of one subreddit.
+    Returns {post_id: (created_utc, text)}; `text` is None when the listing came from the sentiment cache.
     """
-    Fetch mentions and sentiment score from Reddit posts about a cryptocurrency.
+    cache = get_sentiment_cache()
+    cached = cache.get_search(subreddit, search_query)
+    if cached is not None:
+        telemetry.observe('reddit_search', 0.0, provider='reddit', cache_hit=True)
+        return {post_id: (created_utc, None) for post_id, created_utc, _ in cached}
+
+    rate_limiter.acquire('reddit')
+    posts = {}
+    with span('reddit_search', provider='reddit') as current:
+        current.cache_hit = False
+        for mention in reddit.subreddit(subreddit).search(search_query, time_filter='all'):
+            posts[mention.id] = (mention.created_utc, mention.title + ' ' + mention.selftext)
+    cache.put_posts([(post_id, None, text_hash(text), created_utc) for post_id, (created_utc, text) in posts.items()])
+    cache.put_search(subreddit, search_query, posts)
+    return posts
+
+def collect_reddit_mentions(crypto_name, crypto_symbol, subreddits, now=None):
+    """
+    Fetch mentions and sentiment from Reddit in a single all-time pass.
+    Posts are bucketed by `created_utc`: the last year counts as current mentions,
+    anything older as previous mentions. Only current posts are scored, and polarities
+    are reused from the sentiment cache unless the post text changed.
+    Returns (current_mentions, average_sentiment, previous_mentions).
     """
     search_query = f"{crypto_name} OR {crypto_symbol}"
-    total_mentions = 0
-    sentiment_score_total = 0
+    posts = {}
 
     for subreddit in subreddits:
         try:
-            mentions = reddit.subreddit(subreddit).search(search_query, time_filter=time_filter)
-            for mention in mentions:
-                total_mentions += 1
-                analysis = TextBlob(mention.title + ' ' + mention.selftext)
-                sentiment_score_total += analysis.sentiment.polarity
-
+            for post_id, post in search_reddit_posts(subreddit, search_query).items():
+                posts.setdefault(post_id, post)
         except Exception as e:
             logging.warning(f"Reddit API error for {crypto_name} in r/{subreddit}: {e}")
             continue
 
-    average_sentiment = sentiment_score_total / total_mentions if total_mentions > 0 else 0
-    return total_mentions, average_sentiment
+    return score_reddit_posts(crypto_symbol, posts, now)
 
-def fetch_trends_data(crypto_name, retries=5):
+def score_reddit_posts(crypto_symbol, posts, now=None):
+    """
+    Buckets the merged search results {post_id: (created_utc, text)} into current and previous
+    mentions and scores the current ones. Returns (current_mentions, average_sentiment, previous_mentions).
     """
-    Fetch Google Trends data for a given cryptocurrency.
-    Implements exponential backoff to handle TooManyRequestsError.
+    cutoff = (now or time.time()) - CURRENT_PERIOD
+    current_posts = {post_id: post for post_id, post in posts.items() if post[0] >= cutoff}
+    previous_mentions = len(posts) - len(current_posts)
+
+    cache = get_sentiment_cache()
+    cached = cache.get_polarities(current_posts)
+    polarities = []
+    to_score = []
+    for post_id, (created_utc, text) in current_posts.items():
+        polarity, digest = cached.get(post_id, (None, None))
+        if text is not None and (polarity is None or digest != text_hash(text)):
+            to_score.append((post_id, text, created_utc))
+        elif polarity is not None:
+            polarities.append(polarity)
+
+    # New and edited posts are scored together, across worker processes for large scans
+    with span('sentiment_scoring', symbol=crypto_symbol) as current:
+        current.cache_hit = not to_score
+        scores = score_texts([text for _, text, _ in to_score])
+    polarities.extend(scores)
+    cache.put_posts([(post_id, polarity, text_hash(text), created_utc)
+                     for (post_id, text, created_utc), polarity in zip(to_score, scores)])
+
+    average_sentiment = sum(polarities) / len(polarities) if polarities else 0
+    return len(current_posts), average_sentiment, previous_mentions
+
+def _fetch_trends_group(keywords, anchor, retries=5):
     """
-    base_wait = 60  
+    Fetch one Google Trends payload of up to four keywords plus the anchor term (None for none).
+    Returns {keyword: 12-month series scaled so that the anchor's peak, or the payload's peak
+    without an anchor, is 100}.
+    """
+    base_wait = 10
     for i in range(retries):
         try:
-            pytrends.build_payload([crypto_name], cat=0, timeframe='today 12-m', geo='', gprop='')
-            trends_data = pytrends.interest_over_time()
-            if not trends_data.empty:
-                return trends_data[crypto_name].iloc[-1]  
-            else:
-                logging.warning(f"No trend data found for {crypto_name}. Returning 0.")
-                return 0
+            rate_limiter.acquire('google_trends')
+            payload = keywords if anchor is None or anchor in keywords else keywords + [anchor]
+            with span('trends_payload', provider='google_trends') as current:
+                current.retries = i
+                pytrends.build_payload(payload, cat=0, timeframe='today 12-m', geo='', gprop='')
+                trends_data = pytrends.interest_over_time()
+            anchor_peak = 0 if trends_data.empty else 100 if anchor is None else trends_data[anchor].max()
+            if not anchor_peak:
+                logging.warning(f"No trend data found for {', '.join(keywords)}. Returning 0.")
+                return {}
+            return {keyword: (trends_data[keyword] / anchor_peak * 100).tolist() for keyword in keywords}
         except TooManyRequestsError:
             wait_time = base_wait * (2 ** i) + random.uniform(0, base_wait)
             logging.warning(f"Google Trends API rate limit. Retrying in {wait_time:.2f} seconds... ({retries - i - 1} retries left)")
-            time.sleep(wait_time)
+            rate_limiter.penalize('google_trends', wait_time)
         except Exception as e:
-            logging.error(f"Failed to fetch Google Trends data for {crypto_name}: {e}")
+            logging.error(f"Failed to fetch Google Trends data for {', '.join(keywords)}: {e}")
             break
-    return 0  
+    return {}
+
+def fetch_trends_batch(crypto_names, anchor=TRENDS_ANCHOR, retries=5):
+    """
+    Fetch Google Trends data for many cryptocurrencies, five keywords per payload.
+    Every payload carries the same anchor term, so series from different payloads share one scale.
+    Series are cached per keyword for the day. Pass names in market-cap order: payloads then
+    group coins of similar popularity, which keeps small coins from being rounded to zero.
+    Up to TRENDS_UNANCHORED_MAX coins are fetched one keyword-only payload each instead.
+    Returns {name: {'score': latest interest relative to the keyword's own 12-month peak (0-100,
+    as from a single-keyword payload), 'relative_score': latest interest relative to the anchor's peak,
+    or None without an anchor}}.
+    """
+    unique_names = list(dict.fromkeys(crypto_names))
+    group_size = TRENDS_GROUP_SIZE
+    if len(unique_names) <= TRENDS_UNANCHORED_MAX:
+        anchor, group_size = None, 1
+    today = date.today().isoformat()
+    series = {}
+    missing = []
+    with _trends_lock:
+        for key in [key for key in _trends_cache if key[2] != today]:
+            del _trends_cache[key]
+        for crypto_name in unique_names:
+            cached = _trends_cache.get((crypto_name, anchor, today))
+            if cached is not None:
+                series[crypto_name] = cached
+            else:
+                missing.append(crypto_name)
+
+    for start in range(0, len(missing), group_size):
+        fetched = _fetch_trends_group(missing[start:start + group_size], anchor, retries)
+        with _trends_lock:
+            for crypto_name, values in fetched.items():
+                _trends_cache[(crypto_name, anchor, today)] = series[crypto_name] = values
+
+    results = {}
+    for crypto_name in crypto_names:
+        values = series.get(crypto_name)
+        peak = max(values) if values else 0
+        results[crypto_name] = {
+            'score': round(values[-1] / peak * 100, 2) if peak else 0,
+            'relative_score': None if anchor is None else round(values[-1], 2) if values else 0,
+        }
+    return results
 
 def calculate_acceleration(current_mentions, previous_mentions):
     """
@@ -68,6 +186,8 @@ def calculate_acceleration(current_mentions, previous_mentions):
         return 0
     return (current_mentions - previous_mentions) / previous_mentions
 
+@cached('sentiment')
+@single_flight
 def aggregate_sentiment_analysis(cryptocurrencies):
     """
     Aggregate sentiment analysis for a list of cryptocurrencies.
@@ -75,43 +195,49 @@ def aggregate_sentiment_analysis(cryptocurrencies):
     - Fetch Google Trends data
     - Calculate acceleration & combined sentiment score
     """
-    subreddits = ['CryptoCurrency', 'Ethereum', 'ethtrader', 'eth', 'altcoin', 'CryptoMarkets']
     results = {}
 
+    # Fetch Google Trends data for all coins up front, five keywords per payload
+    trends = fetch_trends_batch([crypto_name for crypto_name, _ in cryptocurrencies])
+
     for crypto_name, crypto_symbol in cryptocurrencies:
-        logging.info(f"🔍 Analyzing sentiment for {crypto_name} ({crypto_symbol})")
+        results[crypto_symbol] = coin_sentiment(crypto_name, crypto_symbol, trends[crypto_name])
 
-    
-        current_mentions, current_sentiment = fetch_mentions_and_sentiment_reddit(crypto_name, crypto_symbol, subreddits, 'year')
-        time.sleep(5)  
+    return results
+
+def coin_sentiment(crypto_name, crypto_symbol, trends):
+    """
+    Sentiment record of one coin, given its Google Trends scores from `fetch_trends_batch`.
+    Callers valuing a whole universe fetch Trends once for all coins and only scan Reddit per coin.
+    """
+    logging.info(f"🔍 Analyzing sentiment for {crypto_name} ({crypto_symbol})")
 
-        # Fetch previous mentions (all-time)
-        previous_total_mentions, _ = fetch_mentions_and_sentiment_reddit(crypto_name, crypto_symbol, subreddits, 'all')
-        time.sleep(5)
+    # Current (last year) and previous (older) mentions from one all-time scan
+    current_mentions, current_sentiment, previous_mentions = collect_reddit_mentions(crypto_name, crypto_symbol, SUBREDDITS)
 
-        previous_mentions = previous_total_mentions - current_mentions
-        acceleration = calculate_acceleration(current_mentions, previous_mentions)
+    return combine_sentiment(current_mentions, current_sentiment, previous_mentions, trends)
 
-        # Fetch Google Trends data
-        google_trends_score = fetch_trends_data(crypto_name)
-        time.sleep(5)
+def combine_sentiment(current_mentions, current_sentiment, previous_mentions, trends):
+    """Combines the Reddit results of one coin with its Google Trends scores into its sentiment record."""
+    acceleration = calculate_acceleration(current_mentions, previous_mentions)
 
-        normalized_google_trends_score = (google_trends_score / 100) * 2 - 1
+    google_trends_score = trends['score']
 
-        # Combine Reddit sentiment & Google Trends into an overall sentiment score
-        combined_sentiment_score = (current_sentiment + normalized_google_trends_score) / 2
+    normalized_google_trends_score = (google_trends_score / 100) * 2 - 1
 
-        results[crypto_symbol] = {
-            'current_mentions': current_mentions,
-            'average_sentiment': current_sentiment,
-            'acceleration': acceleration,
-            'previous_mentions': previous_mentions,
-            'google_trends_score': google_trends_score,
-            'normalized_google_trend_score': normalized_google_trends_score,
-            'combined_sentiment_score': combined_sentiment_score,
-        }
+    # Combine Reddit sentiment & Google Trends into an overall sentiment score
+    combined_sentiment_score = (current_sentiment + normalized_google_trends_score) / 2
 
-    return results
+    return {
+        'current_mentions': current_mentions,
+        'average_sentiment': current_sentiment,
+        'acceleration': acceleration,
+        'previous_mentions': previous_mentions,
+        'google_trends_score': google_trends_score,
+        'google_trends_relative_score': trends['relative_score'],
+        'normalized_google_trend_score': normalized_google_trends_score,
+        'combined_sentiment_score': combined_sentiment_score,
+    }
 
 
 
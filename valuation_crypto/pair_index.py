@@ -0,0 +1,189 @@
+"""
+Persistent index of exchange trading pairs.
+
+For every exchange the index maps base currency -> {quote currency: market symbol}, parsed from the
+base/quote metadata of ccxt's markets. It is stored as versioned JSON so a new process can resolve
+pairs, and skip exchanges that do not list a coin, without loading any markets. Each exchange's
+entry is regenerated on its own whenever that exchange's markets are reloaded.
+
+Usage:
+    python -m valuation_crypto.pair_index update binance kraken
+    python -m valuation_crypto.pair_index show binance ETH
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from valuation_crypto.locking import file_lock
+
+INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'valuation_crypto', 'pairs.json')
+# Bumped whenever the file layout changes; files with another version are rebuilt from scratch
+INDEX_VERSION = 1
+
+# Quote currencies tried, in order, when picking the pair to read a coin's volume from.
+# Volumes quoted in CONVERTED_QUOTES are converted to USD with that currency's own price.
+QUOTE_ORDER = ('USDT', 'USD', 'USDC', 'BTC')
+CONVERTED_QUOTES = ('BTC',)
+
+
+def build_pair_index(exchange):
+    """Maps base currency -> {quote currency: market symbol} for the spot markets of an exchange."""
+    index = {}
+    markets = exchange.markets if isinstance(exchange.markets, dict) else {}
+    if markets:
+        pairs = ((symbol, market.get('base'), market.get('quote'))
+                 for symbol, market in markets.items() if market.get('spot', True))
+    else:
+        pairs = ((symbol, *symbol.split('/', 1)) for symbol in exchange.symbols if symbol.count('/') == 1)
+    for symbol, base, quote in pairs:
+        if base and quote and ':' not in symbol:
+            index.setdefault(base, {})[quote] = symbol
+    return index
+
+
+def fingerprint(pairs):
+    """Content hash of an exchange's pairs, used to tell whether its entry must be rewritten."""
+    return hashlib.sha1(json.dumps(pairs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class PairIndex:
+    """Per-exchange pair indexes, loaded from and saved to `path` (None keeps them in memory only)."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._exchanges = {}
+        self._lock = threading.Lock()
+        self.stats = {'rebuilt': 0, 'unchanged': 0}
+        self.load()
+
+    def load(self):
+        """Reads the index file; a missing, unreadable or outdated file leaves the index empty."""
+        exchanges = self._read()
+        with self._lock:
+            self._exchanges = exchanges
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable pair index {self.path}: {e}")
+            return {}
+        if data.get('version') != INDEX_VERSION:
+            logging.info(f"Pair index {self.path} has version {data.get('version')}, rebuilding")
+            return {}
+        return data.get('exchanges', {})
+
+    def save(self):
+        """
+        Merges the index into the file under an inter-process lock: of each exchange, the most recently
+        regenerated entry wins, so processes updating different exchanges keep each other's entries.
+        """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._lock, file_lock(f"{self.path}.lock"):
+            for exchange_id, entry in self._read().items():
+                current = self._exchanges.get(exchange_id)
+                if current is None or entry['updated_at'] > current['updated_at']:
+                    self._exchanges[exchange_id] = entry
+            data = {'version': INDEX_VERSION, 'exchanges': self._exchanges}
+            # Write-then-rename, so readers never see a partial file
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, 'w') as file:
+                json.dump(data, file)
+            os.replace(temporary, self.path)
+
+    def update(self, exchange_id, exchange):
+        """Regenerates one exchange's entry from its loaded markets and saves it; returns True if the pairs changed."""
+        pairs = build_pair_index(exchange)
+        digest = fingerprint(pairs)
+        with self._lock:
+            entry = self._exchanges.get(exchange_id)
+            changed = entry is None or entry['fingerprint'] != digest
+            if changed:
+                self._exchanges[exchange_id] = {'fingerprint': digest, 'updated_at': time.time(), 'pairs': pairs}
+                self.stats['rebuilt'] += 1
+            else:
+                entry['updated_at'] = time.time()
+                self.stats['unchanged'] += 1
+        self.save()
+        return changed
+
+    def pairs(self, exchange_id):
+        """Returns base -> {quote: symbol} for an exchange, or None if it has not been indexed."""
+        with self._lock:
+            entry = self._exchanges.get(exchange_id)
+            return entry['pairs'] if entry else None
+
+    def age(self, exchange_id):
+        """Seconds since an exchange's entry was last regenerated, or None."""
+        with self._lock:
+            entry = self._exchanges.get(exchange_id)
+            return time.time() - entry['updated_at'] if entry else None
+
+    def exchanges(self):
+        with self._lock:
+            return sorted(self._exchanges)
+
+
+def resolve_market(pairs, base, quotes=QUOTE_ORDER):
+    """Returns (market symbol, quote) of the first of `quotes` that `base` trades against, or None."""
+    by_quote = pairs.get(base, {})
+    return next(((by_quote[quote], quote) for quote in quotes if quote in by_quote), None)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_pair_index():
+    """Returns the process-wide pair index, loading it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PairIndex()
+        return _index
+
+
+def configure_pair_index(path=INDEX_PATH):
+    """Replaces the process-wide pair index, e.g. to point it at another file or keep it in memory (None)."""
+    global _index
+    with _index_lock:
+        _index = PairIndex(path)
+        return _index
+
+
+def main(argv=None):
+    from valuation_crypto.exchanges import exchange_pool
+
+    parser = argparse.ArgumentParser(description="Persistent exchange pair index")
+    parser.add_argument('--path', default=INDEX_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help="Reload markets and regenerate changed exchanges")
+    update.add_argument('exchanges', nargs='+')
+    show = commands.add_parser('show', help="Print the pairs of one coin")
+    show.add_argument('exchange')
+    show.add_argument('base')
+    args = parser.parse_args(argv)
+
+    index = configure_pair_index(args.path)
+    if args.command == 'update':
+        for exchange_id in args.exchanges:
+            exchange_pool.invalidate(exchange_id)
+            exchange_pool.get(exchange_id)
+        print(f"Pair index {args.path}: {index.stats['rebuilt']} rebuilt, {index.stats['unchanged']} unchanged.")
+    else:
+        pairs = index.pairs(args.exchange) or {}
+        base = args.base.upper()
+        print(json.dumps(pairs.get(base, {}), indent=2))
+        print(f"Resolved: {resolve_market(pairs, base)}")
+
+
+if __name__ == '__main__':
+    main()
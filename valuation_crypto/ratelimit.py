@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+import time
+from valuation_crypto.telemetry import telemetry
+
+# (requests per second, burst capacity) per upstream provider
+PROVIDER_LIMITS = {
+    'reddit': (100 / 60, 60),           # OAuth clients: 100 queries per minute
+    'google_trends': (12 / 60, 5),      # undocumented; ~12 payloads per minute stays clear of 429s
+    'coinmarketcap': (30 / 60, 30),     # Basic plan: 30 calls per minute
+    'openai': (500 / 60, 50),           # GPT-4 tier 1: 500 requests per minute
+    'openai_images': (5 / 60, 5),       # DALL-E 3 tier 1: 5 images per minute
+}
+DEFAULT_LIMIT = (1.0, 5)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `capacity`.
+    Callers reserve tokens up front and sleep only for the deficit, so waits are fair and minimal.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, tokens=1):
+        """Takes `tokens` from the bucket and returns how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+
+    def penalize(self, seconds):
+        """Empties the bucket and blocks it for `seconds`, e.g. after the provider answered 429."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0)
+            self._blocked_until = max(self._blocked_until, now + seconds)
+
+
+class RateLimiter:
+    """Registry of per-provider token buckets that records how long callers were made to wait."""
+
+    def __init__(self, limits=PROVIDER_LIMITS):
+        self.limits = dict(limits)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def configure(self, provider, rate, capacity):
+        """Sets (or resets) the budget of a provider."""
+        with self._lock:
+            self.limits[provider] = (rate, capacity)
+            self._buckets[provider] = TokenBucket(rate, capacity)
+
+    def bucket(self, provider):
+        with self._lock:
+            bucket = self._buckets.get(provider)
+            if bucket is None:
+                bucket = self._buckets[provider] = TokenBucket(*self.limits.get(provider, DEFAULT_LIMIT))
+            return bucket
+
+    def acquire(self, provider, tokens=1):
+        """Blocks until `provider` has budget for `tokens` requests; returns the seconds waited."""
+        wait = self.bucket(provider).reserve(tokens)
+        if wait > 0:
+            logging.info(f"Rate limit for {provider} exhausted, waiting {wait:.2f}s")
+            time.sleep(wait)
+            telemetry.observe('rate_limit_wait', wait, provider=provider)
+        self._record(provider, wait)
+        return wait
+
+    async def acquire_async(self, provider, tokens=1):
+        """Like `acquire`, but waits without blocking the event loop."""
+        wait = self.bucket(provider).reserve(tokens)
+        if wait > 0:
+            logging.info(f"Rate limit for {provider} exhausted, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+            telemetry.observe('rate_limit_wait', wait, provider=provider)
+        self._record(provider, wait)
+        return wait
+
+    def penalize(self, provider, seconds):
+        """Blocks `provider` for `seconds` after it reported that the budget was exceeded."""
+        logging.warning(f"{provider} rejected a request for rate limiting, backing off {seconds:.2f}s")
+        self.bucket(provider).penalize(seconds)
+
+    def reset(self):
+        """Drops all buckets and wait statistics."""
+        with self._lock:
+            self._buckets.clear()
+            self.stats.clear()
+
+    def _record(self, provider, wait):
+        with self._lock:
+            stats = self.stats.setdefault(provider, {'requests': 0, 'waits': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+            stats['requests'] += 1
+            if wait > 0:
+                stats['waits'] += 1
+                stats['total_wait'] += wait
+                stats['max_wait'] = max(stats['max_wait'], wait)
+
+
+rate_limiter = RateLimiter()
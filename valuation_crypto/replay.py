@@ -0,0 +1,507 @@
+"""
+Offline record / replay of every upstream API used by the analysis pipeline.
+
+A cassette is a JSON document holding the responses of CoinMarketCap, the ccxt exchanges, Reddit,
+Google Trends and OpenAI. `recording(cassette)` captures real responses while the pipeline runs;
+`replaying(cassette, latency)` swaps the API clients for fakes that answer from the cassette after
+an injected, per-provider delay. `synthesize_cassette` builds a deterministic cassette from a batch
+results CSV, for machines without credentials or network access.
+
+    cassette = synthesize_cassette('results/202503012026113677.csv')
+    with replaying(cassette, Latency(scale=0.1)):
+        result, image_url = analyze_crypto('BTC')
+"""
+import asyncio
+import contextlib
+import csv
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+import ccxt
+from valuation_crypto import clients, exchanges, market_sentiment_reddit_gtrend, pair_index, utils
+from valuation_crypto.ai_cache import cache_key
+
+CASSETTE_VERSION = 1
+
+# Typical response times in seconds, per upstream call
+LATENCIES = {
+    'coinmarketcap': 0.3,
+    'ccxt.load_markets': 1.0,
+    'ccxt.fetch_ticker': 0.2,
+    'ccxt.fetch_tickers': 0.5,
+    'reddit': 0.6,
+    'google_trends': 1.0,
+    'openai': 4.0,
+    'openai_images': 8.0,
+}
+
+
+class Latency:
+    """Injected delays: LATENCIES (or `delays`) multiplied by `scale`, with optional relative jitter."""
+
+    def __init__(self, delays=None, scale=1.0, jitter=0.0, seed=0):
+        self.delays = dict(LATENCIES, **(delays or {}))
+        self.scale = scale
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, call):
+        delay = self.delays.get(call, 0.0) * self.scale
+        if delay and self.jitter:
+            with self._lock:
+                delay *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        return delay
+
+    def sleep(self, call):
+        delay = self.delay(call)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def sleep_async(self, call):
+        delay = self.delay(call)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+NO_LATENCY = Latency(scale=0)
+
+
+def empty_cassette(source='recorded'):
+    return {'version': CASSETTE_VERSION, 'source': source, 'cmc': {}, 'cmc_listings': [],
+            'exchanges': {}, 'reddit': {}, 'trends': {}, 'openai': {'chat': {}, 'images': {}}}
+
+
+def load_cassette(path):
+    with open(path) as file:
+        cassette = json.load(file)
+    if cassette.get('version') != CASSETTE_VERSION:
+        raise ValueError(f"{path} is a version {cassette.get('version')} cassette, expected {CASSETTE_VERSION}")
+    return cassette
+
+
+def save_cassette(cassette, path):
+    with open(path, 'w') as file:
+        json.dump(cassette, file)
+
+
+def reddit_key(subreddit, query):
+    return f"{subreddit}|{query}"
+
+
+# Replay fakes
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeCmcSession:
+    """Answers the quotes and listings endpoints from the cassette."""
+
+    def __init__(self, cassette, latency):
+        self.cassette = cassette
+        self.latency = latency
+
+    def get(self, url, params=None, timeout=None):
+        self.latency.sleep('coinmarketcap')
+        params = params or {}
+        if 'listings' in url:
+            listings = [self.cassette['cmc'][symbol] for symbol in self.cassette['cmc_listings']]
+            return FakeResponse(200, {'data': listings[:int(params.get('limit', 100))]})
+        symbols = params.get('symbol', '').split(',')
+        return FakeResponse(200, {'data': {symbol: self.cassette['cmc'][symbol]
+                                           for symbol in symbols if symbol in self.cassette['cmc']}})
+
+
+class FakeExchange:
+    """ccxt exchange serving markets and tickers from the cassette."""
+
+    def __init__(self, exchange_id, recorded, latency):
+        self.id = exchange_id
+        self.latency = latency
+        self.rateLimit = recorded.get('rateLimit', 50)
+        self.symbols = list(recorded.get('symbols', []))
+        self.markets = {
+            symbol: {'symbol': symbol, 'base': symbol.split('/')[0], 'quote': symbol.split('/')[1], 'spot': True}
+            for symbol in self.symbols if symbol.count('/') == 1
+        }
+        self.has = {'fetchTickers': True}
+        self.timeout = 10000
+        self._tickers = recorded.get('tickers', {})
+
+    def load_markets(self, reload=False):
+        self.latency.sleep('ccxt.load_markets')
+        return self.markets
+
+    def fetch_ticker(self, symbol):
+        self.latency.sleep('ccxt.fetch_ticker')
+        if symbol not in self._tickers:
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return dict(self._tickers[symbol], symbol=symbol)
+
+    def fetch_tickers(self, symbols=None):
+        self.latency.sleep('ccxt.fetch_tickers')
+        symbols = symbols if symbols is not None else list(self._tickers)
+        return {symbol: dict(self._tickers[symbol], symbol=symbol) for symbol in symbols if symbol in self._tickers}
+
+
+class FakeReddit:
+    def __init__(self, cassette, latency):
+        self.cassette = cassette
+        self.latency = latency
+
+    def subreddit(self, name):
+        return SimpleNamespace(search=lambda query, time_filter='all': self._search(name, query))
+
+    def _search(self, subreddit, query):
+        self.latency.sleep('reddit')
+        return [SimpleNamespace(**post) for post in self.cassette['reddit'].get(reddit_key(subreddit, query), [])]
+
+
+class FakeTrends:
+    """pytrends stand-in; keywords missing from the cassette have no interest."""
+
+    def __init__(self, cassette, latency):
+        self.cassette = cassette
+        self.latency = latency
+        self._local = threading.local()
+
+    def build_payload(self, kw_list, **kwargs):
+        self._local.keywords = list(kw_list)
+
+    def interest_over_time(self):
+        import pandas as pd
+        self.latency.sleep('google_trends')
+        keywords = self._local.keywords
+        series = {keyword: self.cassette['trends'].get(keyword) for keyword in keywords}
+        length = max((len(values) for values in series.values() if values), default=0)
+        if not length:
+            return pd.DataFrame()
+        return pd.DataFrame({keyword: values or [0] * length for keyword, values in series.items()},
+                            index=pd.date_range(end='2025-03-01', periods=length, freq='W'))
+
+
+class FakeOpenAI:
+    """OpenAI client answering chat and image requests from the cassette, keyed like the AI cache."""
+
+    def __init__(self, cassette, latency):
+        self.cassette = cassette
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.images = SimpleNamespace(generate=self._image)
+
+    def _chat(self, messages, **params):
+        self.latency.sleep('openai')
+        recorded = self.cassette['openai']['chat']
+        content = recorded.get(cache_key(messages=messages, **params)) or recorded.get('default', '')
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def _image(self, prompt, **params):
+        self.latency.sleep('openai_images')
+        recorded = self.cassette['openai']['images']
+        url = recorded.get(cache_key(prompt=prompt, **params)) or recorded.get('default')
+        return SimpleNamespace(data=[SimpleNamespace(url=url)] if url else [])
+
+
+class FakeAsyncCmcClient:
+    """httpx.AsyncClient stand-in for the async engine."""
+
+    def __init__(self, cassette, latency):
+        self.latency = latency
+        self._session = FakeCmcSession(cassette, NO_LATENCY)
+
+    async def get(self, url, params=None, timeout=None):
+        await self.latency.sleep_async('coinmarketcap')
+        return self._session.get(url, params=params, timeout=timeout)
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncExchange(FakeExchange):
+    """ccxt.async_support stand-in."""
+
+    async def load_markets(self, reload=False):
+        await self.latency.sleep_async('ccxt.load_markets')
+        return self.markets
+
+    async def fetch_ticker(self, symbol):
+        await self.latency.sleep_async('ccxt.fetch_ticker')
+        return FakeExchange(self.id, {'tickers': self._tickers}, NO_LATENCY).fetch_ticker(symbol)
+
+    async def fetch_tickers(self, symbols=None):
+        await self.latency.sleep_async('ccxt.fetch_tickers')
+        return FakeExchange(self.id, {'tickers': self._tickers}, NO_LATENCY).fetch_tickers(symbols)
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI stand-in answering from the cassette like FakeOpenAI."""
+
+    def __init__(self, cassette, latency):
+        self.latency = latency
+        self._client = FakeOpenAI(cassette, NO_LATENCY)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.images = SimpleNamespace(generate=self._image)
+
+    async def _chat(self, messages, **params):
+        await self.latency.sleep_async('openai')
+        return self._client.chat.completions.create(messages=messages, **params)
+
+    async def _image(self, prompt, **params):
+        await self.latency.sleep_async('openai_images')
+        return self._client.images.generate(prompt=prompt, **params)
+
+    async def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def _fresh_exchanges():
+    # Exchanges and pair indexes built from other clients must not leak into or out of the block
+    exchanges.exchange_pool.clear()
+    with mock.patch.object(pair_index, '_index', pair_index.PairIndex(None)):
+        try:
+            yield
+        finally:
+            exchanges.exchange_pool.clear()
+
+
+@contextlib.contextmanager
+def replaying(cassette, latency=NO_LATENCY, exchange_ids=None):
+    """
+    Routes every upstream call to fakes answering from `cassette` after `latency`.
+    Async engines pick up the fakes when they create their clients, i.e. engines created inside the block.
+    """
+    exchange_ids = set(exchange_ids or utils.exchanges_list) | set(cassette['exchanges'])
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(_fresh_exchanges())
+        stack.enter_context(mock.patch.object(utils, 'cmc_session', FakeCmcSession(cassette, latency)))
+        stack.enter_context(mock.patch.object(utils, 'client', FakeOpenAI(cassette, latency)))
+        # Generated images are not downloaded; the recorded URL is used as is
+        stack.enter_context(mock.patch.object(utils, 'store_image', lambda key, url: url))
+        stack.enter_context(mock.patch.object(utils, 'stored_image', lambda key: None))
+        stack.enter_context(mock.patch.object(clients, 'create_async_cmc_client',
+                                              lambda: FakeAsyncCmcClient(cassette, latency)))
+        stack.enter_context(mock.patch.object(clients, 'create_async_openai_client',
+                                              lambda: FakeAsyncOpenAI(cassette, latency)))
+        stack.enter_context(mock.patch.object(clients, 'create_async_exchange', lambda exchange_id: FakeAsyncExchange(
+            exchange_id, cassette['exchanges'].get(exchange_id, {}), latency)))
+        stack.enter_context(mock.patch.object(market_sentiment_reddit_gtrend, 'reddit', FakeReddit(cassette, latency)))
+        stack.enter_context(mock.patch.object(market_sentiment_reddit_gtrend, 'pytrends', FakeTrends(cassette, latency)))
+        for exchange_id in exchange_ids:
+            recorded = cassette['exchanges'].get(exchange_id, {})
+            factory = (lambda exchange_id=exchange_id, recorded=recorded, **kwargs:
+                       FakeExchange(exchange_id, recorded, latency))
+            stack.enter_context(mock.patch.object(ccxt, exchange_id, factory, create=True))
+        yield cassette
+
+
+# Recording proxies
+
+class _Recorder:
+    """Forwards everything to the real client; subclasses intercept the calls worth recording."""
+
+    def __init__(self, real, cassette, lock):
+        object.__setattr__(self, '_real', real)
+        object.__setattr__(self, '_cassette', cassette)
+        object.__setattr__(self, '_lock', lock)
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._real, name, value)
+
+
+class _CmcRecorder(_Recorder):
+    def get(self, url, params=None, **kwargs):
+        response = self._real.get(url, params=params, **kwargs)
+        if response.status_code == 200:
+            data = response.json().get('data', {})
+            with self._lock:
+                if isinstance(data, list):
+                    self._cassette['cmc_listings'] = [quote['symbol'] for quote in data]
+                    data = {quote['symbol']: quote for quote in data}
+                self._cassette['cmc'].update(data)
+        return response
+
+
+class _ExchangeRecorder(_Recorder):
+    def _entry(self):
+        return self._cassette['exchanges'].setdefault(self._real.id, {'rateLimit': self._real.rateLimit,
+                                                                      'symbols': [], 'tickers': {}})
+
+    def load_markets(self, reload=False):
+        markets = self._real.load_markets(reload=reload)
+        with self._lock:
+            self._entry()['symbols'] = [symbol for symbol in self._real.symbols if ':' not in symbol]
+        return markets
+
+    def _record_tickers(self, tickers):
+        with self._lock:
+            self._entry()['tickers'].update({
+                symbol: {'quoteVolume': ticker.get('quoteVolume'), 'last': ticker.get('last')}
+                for symbol, ticker in tickers.items()
+            })
+
+    def fetch_ticker(self, symbol):
+        ticker = self._real.fetch_ticker(symbol)
+        self._record_tickers({symbol: ticker})
+        return ticker
+
+    def fetch_tickers(self, symbols=None):
+        tickers = self._real.fetch_tickers(symbols)
+        self._record_tickers(tickers)
+        return tickers
+
+
+class _RedditRecorder(_Recorder):
+    def subreddit(self, name):
+        def search(query, time_filter='all'):
+            posts = [{'id': post.id, 'title': post.title, 'selftext': post.selftext, 'created_utc': post.created_utc}
+                     for post in self._real.subreddit(name).search(query, time_filter=time_filter)]
+            with self._lock:
+                self._cassette['reddit'][reddit_key(name, query)] = posts
+            return [SimpleNamespace(**post) for post in posts]
+        return SimpleNamespace(search=search)
+
+
+class _TrendsRecorder(_Recorder):
+    def interest_over_time(self):
+        frame = self._real.interest_over_time()
+        with self._lock:
+            for keyword in frame.columns:
+                if keyword != 'isPartial':
+                    self._cassette['trends'][keyword] = [float(value) for value in frame[keyword]]
+        return frame
+
+
+class _OpenAIRecorder:
+    def __init__(self, real, cassette, lock):
+        def chat(messages, **params):
+            response = real.chat.completions.create(messages=messages, **params)
+            if response.choices:
+                with lock:
+                    cassette['openai']['chat'][cache_key(messages=messages, **params)] = response.choices[0].message.content
+            return response
+
+        def image(prompt, **params):
+            response = real.images.generate(prompt=prompt, **params)
+            if response.data:
+                with lock:
+                    cassette['openai']['images'][cache_key(prompt=prompt, **params)] = response.data[0].url
+            return response
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=chat))
+        self.images = SimpleNamespace(generate=image)
+
+
+@contextlib.contextmanager
+def recording(cassette=None, exchange_ids=None):
+    """Captures the responses of the real upstream APIs into `cassette` (a new one by default)."""
+    cassette = cassette if cassette is not None else empty_cassette()
+    lock = threading.Lock()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(_fresh_exchanges())
+        stack.enter_context(mock.patch.object(utils, 'cmc_session', _CmcRecorder(clients.unwrap(utils.cmc_session), cassette, lock)))
+        stack.enter_context(mock.patch.object(utils, 'client', _OpenAIRecorder(clients.unwrap(utils.client), cassette, lock)))
+        sentiment = market_sentiment_reddit_gtrend
+        stack.enter_context(mock.patch.object(sentiment, 'reddit', _RedditRecorder(clients.unwrap(sentiment.reddit), cassette, lock)))
+        stack.enter_context(mock.patch.object(sentiment, 'pytrends', _TrendsRecorder(clients.unwrap(sentiment.pytrends), cassette, lock)))
+        for exchange_id in exchange_ids or utils.exchanges_list:
+            real_class = getattr(ccxt, exchange_id, None)
+            if real_class is None:
+                continue
+            factory = (lambda real_class=real_class, **kwargs:
+                       _ExchangeRecorder(real_class(kwargs or {}), cassette, lock))
+            stack.enter_context(mock.patch.object(ccxt, exchange_id, factory))
+        yield cassette
+
+
+# Synthetic cassettes
+
+EXCHANGE_SHARES = {'binance': 0.45, 'kraken': 0.2, 'bitfinex': 0.15, 'huobi': 0.2}
+WORDS = ['bullish', 'bearish', 'great', 'terrible', 'good', 'bad', 'moon', 'crash', 'strong', 'weak',
+         'adoption', 'dump', 'rally', 'news', 'update', 'upgrade', 'scam', 'amazing', 'awful', 'stable']
+
+
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def synthesize_cassette(results_csv, seed=0, now=None):
+    """
+    Builds a cassette from a batch results CSV: CMC quotes, exchange volumes and Reddit mention counts
+    follow the recorded values; post texts, Trends series and OpenAI answers are generated deterministically.
+    """
+    rng = random.Random(seed)
+    now = now or time.time()
+    year = 365 * 24 * 60 * 60
+    cassette = empty_cassette(source=f"synthetic:{results_csv}")
+    for exchange_id in EXCHANGE_SHARES:
+        cassette['exchanges'][exchange_id] = {'rateLimit': 50, 'symbols': [], 'tickers': {}}
+
+    with open(results_csv, newline='') as file:
+        rows = list(csv.DictReader(file))
+    btc_price = next((_number(row['Current Price']) for row in rows if row['Symbol'] == 'BTC'), 85000.0)
+
+    for rank, row in enumerate(rows, start=1):
+        name, symbol = row['Crypto ID'], row['Symbol'].upper()
+        price = _number(row['Current Price'])
+        supply = _number(row['Circulating Supply'])
+        cassette['cmc'][symbol] = {
+            'id': rank, 'name': name, 'symbol': symbol, 'cmc_rank': rank, 'circulating_supply': supply,
+            'quote': {'USD': {'price': price, 'market_cap': price * supply,
+                              'market_cap_dominance': _number(row['Market Cap Percentage %'])}},
+        }
+        cassette['cmc_listings'].append(symbol)
+
+        # Volume split across exchanges; some coins trade only against BTC on one of them
+        volume = _number(row['Total 24h Volume'])
+        for exchange_id, share in EXCHANGE_SHARES.items():
+            if rng.random() < 0.15 and symbol != 'BTC':
+                continue
+            quote = 'BTC' if symbol != 'BTC' and rng.random() < 0.1 else rng.choice(['USDT', 'USDT', 'USD', 'USDC'])
+            pair = f"{symbol}/{quote}"
+            quote_volume = volume * share / (btc_price if quote == 'BTC' else 1)
+            cassette['exchanges'][exchange_id]['symbols'].append(pair)
+            cassette['exchanges'][exchange_id]['tickers'][pair] = {'quoteVolume': quote_volume, 'last': price}
+
+        # Reddit posts matching the recorded current / previous mention counts
+        query = f"{name} OR {symbol}"
+        for mention in range(int(_number(row['Current Mentions'])) + int(_number(row['Previous Mentions']))):
+            current = mention < int(_number(row['Current Mentions']))
+            created_utc = now - rng.uniform(0, year * 0.99) if current else now - rng.uniform(year * 1.01, 5 * year)
+            post = {'id': f"{symbol.lower()}{mention}", 'created_utc': created_utc,
+                    'title': f"{name} {' '.join(rng.choices(WORDS, k=4))}",
+                    'selftext': ' '.join(rng.choices(WORDS, k=rng.randint(5, 40)))}
+            subreddit = rng.choice(market_sentiment_reddit_gtrend.SUBREDDITS)
+            cassette['reddit'].setdefault(reddit_key(subreddit, query), []).append(post)
+
+        level = max(1.0, 100.0 / rank)
+        cassette['trends'][name] = [round(max(0.0, level * (1 + 0.3 * rng.uniform(-1, 1))), 1) for _ in range(52)]
+
+    for exchange_id in EXCHANGE_SHARES:
+        # Every exchange prices BTC, for converting BTC-quoted volume
+        exchange = cassette['exchanges'][exchange_id]
+        if 'BTC/USDT' not in exchange['tickers']:
+            exchange['symbols'].append('BTC/USDT')
+            exchange['tickers']['BTC/USDT'] = {'quoteVolume': 0, 'last': btc_price}
+    cassette['trends']['cryptocurrency'] = [round(60 + 40 * rng.random(), 1) for _ in range(52)]
+    cassette['openai']['chat']['default'] = "Replayed analysis: valuation and sentiment are broadly in line."
+    cassette['openai']['images']['default'] = "https://example.invalid/replayed-image.png"
+    return cassette
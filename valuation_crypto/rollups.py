@@ -0,0 +1,106 @@
+import threading
+import numpy as np
+from valuation_crypto.history import get_history_store
+
+# Bucket width in seconds of each rollup
+RESOLUTIONS = {'hour': 60 * 60, 'day': 24 * 60 * 60}
+# Metrics plotted by the Dash app
+ROLLUP_METRICS = ('current_price', 'velocity', 'sentiment_score', 'valuation_difference')
+# With 'auto', coins with at most this many days of history are drawn hourly, others daily
+MAX_HOURLY_DAYS = 31
+
+
+def rollup_partition(data, metrics, seconds):
+    """
+    Means of `metrics` per (symbol, bucket of `seconds`) over one partition's columns, ignoring NaNs.
+    Returns {symbol: {'timestamp': bucket starts, 'count': records per bucket, metric: means}}.
+    """
+    if not len(data['timestamp']):
+        return {}
+    symbols, symbol_ids = np.unique(np.asarray(data['symbol']), return_inverse=True)
+    buckets = np.asarray(data['timestamp']) // seconds * seconds
+    groups, group_ids = np.unique(np.stack([symbol_ids, buckets]), axis=1, return_inverse=True)
+    group_ids = group_ids.ravel()
+
+    counts = np.bincount(group_ids, minlength=groups.shape[1])
+    means = {}
+    for metric in metrics:
+        values = np.asarray(data[metric], dtype=np.float64)
+        valid = ~np.isnan(values)
+        totals = np.bincount(group_ids, weights=np.where(valid, values, 0.0), minlength=groups.shape[1])
+        valid_counts = np.bincount(group_ids, weights=valid, minlength=groups.shape[1])
+        means[metric] = np.divide(totals, valid_counts, out=np.full(groups.shape[1], np.nan), where=valid_counts > 0)
+
+    rollup = {}
+    for symbol_id, symbol in enumerate(symbols.astype(str)):
+        members = groups[0] == symbol_id
+        rollup[symbol] = dict({'timestamp': groups[1][members], 'count': counts[members]},
+                              **{metric: means[metric][members] for metric in metrics})
+    return rollup
+
+
+class HistoryRollups:
+    """
+    Hourly and daily rollups of a history store, precomputed per partition.
+    Only partitions that changed since the last lookup are rolled up again, and assembled per-coin
+    series are kept until the store changes, so repeated lookups cost a directory listing.
+    """
+
+    def __init__(self, store, metrics=ROLLUP_METRICS):
+        self.store = store
+        self.metrics = tuple(metrics)
+        self._partitions = {}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Rolls up new or grown partitions; returns the store's current signature."""
+        signature = tuple((partition, self.store.partition_rows(partition)) for partition in self.store.partitions())
+        for partition, rows in signature:
+            cached = self._partitions.get(partition)
+            if cached is not None and cached[0] == rows:
+                continue
+            data = self.store.read_partition(partition, ('timestamp', 'symbol') + self.metrics)
+            self._partitions[partition] = (rows, {
+                resolution: rollup_partition(data, self.metrics, seconds)
+                for resolution, seconds in RESOLUTIONS.items()
+            })
+        return signature
+
+    def series(self, symbol, resolution='auto'):
+        """Returns the rolled-up history of one coin as {'timestamp', 'count', *metrics} arrays, oldest first."""
+        symbol = symbol.upper()
+        with self._lock:
+            signature = self.refresh()
+            if resolution == 'auto':
+                days = len(self._assemble(symbol, 'day', signature)['timestamp'])
+                resolution = 'hour' if days <= MAX_HOURLY_DAYS else 'day'
+            return self._assemble(symbol, resolution, signature)
+
+    def _assemble(self, symbol, resolution, signature):
+        cached = self._series.get((symbol, resolution))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        parts = [self._partitions[partition][1][resolution].get(symbol) for partition, _ in signature]
+        parts = [part for part in parts if part is not None]
+        columns = ('timestamp', 'count') + self.metrics
+        series = {
+            column: np.concatenate([part[column] for part in parts]) if parts else np.empty(0)
+            for column in columns
+        }
+        self._series[(symbol, resolution)] = (signature, series)
+        return series
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def get_history_rollups():
+    """Returns the rollups of the process-wide history store."""
+    global _rollups
+    store = get_history_store()
+    with _rollups_lock:
+        if _rollups is None or _rollups.store is not store:
+            _rollups = HistoryRollups(store)
+        return _rollups
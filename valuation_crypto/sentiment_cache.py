@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'valuation_crypto', 'sentiment.sqlite3')
+
+# Eviction policy: posts not seen for 30 days are dropped, and at most 200k are kept
+MAX_AGE = 30 * 24 * 60 * 60
+MAX_POSTS = 200_000
+# Cached search listings are reused for an hour before Reddit is queried again
+SEARCH_TTL = 60 * 60
+# Evict after this many inserts
+EVICT_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    polarity REAL,
+    text_hash TEXT,
+    created_utc REAL NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_seen_at ON posts (seen_at);
+CREATE TABLE IF NOT EXISTS searches (
+    subreddit TEXT NOT NULL,
+    query TEXT NOT NULL,
+    post_ids TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (subreddit, query)
+);
+"""
+
+
+def text_hash(text):
+    """Fingerprint of a post's text, used to detect edited posts."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SentimentCache:
+    """
+    On-disk cache of Reddit submission id -> polarity, text hash and timestamps,
+    plus the post ids returned by recent subreddit searches.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_age=MAX_AGE, max_posts=MAX_POSTS):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+        self.max_posts = max_posts
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.stats = {'hits': 0, 'misses': 0, 'search_hits': 0, 'search_misses': 0, 'evicted': 0}
+        self.evict()
+
+    def get_polarities(self, post_ids):
+        """Returns {post_id: (polarity, text_hash)} for the cached, scored posts among `post_ids`."""
+        post_ids = list(post_ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(post_ids), 500):
+                chunk = post_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, polarity, text_hash FROM posts WHERE polarity IS NOT NULL "
+                    f"AND id IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((post_id, (polarity, digest)) for post_id, polarity, digest in rows)
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(post_ids) - len(found)
+        return found
+
+    def put_posts(self, posts):
+        """Stores (post_id, polarity, text_hash, created_utc) rows; polarity may be None for unscored posts."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO posts (id, polarity, text_hash, created_utc, seen_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET polarity = CASE "
+                "WHEN excluded.polarity IS NOT NULL THEN excluded.polarity "
+                "WHEN excluded.text_hash = posts.text_hash THEN posts.polarity END, "
+                "text_hash = excluded.text_hash, seen_at = excluded.seen_at",
+                [(post_id, polarity, digest, created_utc, now) for post_id, polarity, digest, created_utc in posts])
+            self._conn.commit()
+            self._inserts += len(posts)
+            due = self._inserts >= EVICT_EVERY
+        if due:
+            self.evict()
+
+    def get_search(self, subreddit, query, max_age=SEARCH_TTL):
+        """
+        Returns [(post_id, created_utc, polarity)] for a search cached less than `max_age` seconds ago,
+        or None if it must be downloaded again (expired, or some of its posts were evicted).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT post_ids, fetched_at FROM searches WHERE subreddit = ? AND query = ?",
+                (subreddit, query)).fetchone()
+            if row is None or time.time() - row[1] > max_age:
+                self.stats['search_misses'] += 1
+                return None
+            post_ids = json.loads(row[0])
+            posts = {}
+            for start in range(0, len(post_ids), 500):
+                chunk = post_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, created_utc, polarity FROM posts WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                posts.update((post_id, (post_id, created_utc, polarity)) for post_id, created_utc, polarity in rows)
+            if len(posts) < len(post_ids):
+                self.stats['search_misses'] += 1
+                return None
+            self.stats['search_hits'] += 1
+        return [posts[post_id] for post_id in post_ids]
+
+    def put_search(self, subreddit, query, post_ids):
+        """Remembers which posts a subreddit search returned."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (subreddit, query, post_ids, fetched_at) VALUES (?, ?, ?, ?)",
+                (subreddit, query, json.dumps(list(post_ids)), time.time()))
+            self._conn.commit()
+
+    def evict(self):
+        """Drops posts older than `max_age` and, beyond `max_posts`, the least recently seen ones."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            evicted = self._conn.execute("DELETE FROM posts WHERE seen_at < ?", (cutoff,)).rowcount
+            evicted += self._conn.execute(
+                "DELETE FROM posts WHERE id IN (SELECT id FROM posts ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_posts,)).rowcount
+            self._conn.execute("DELETE FROM searches WHERE fetched_at < ?", (cutoff,))
+            self._conn.commit()
+            self._inserts = 0
+            self.stats['evicted'] += evicted
+        if evicted:
+            logging.info(f"Evicted {evicted} posts from the sentiment cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sentiment_cache():
+    """Returns the process-wide sentiment cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SentimentCache()
+        return _cache
+
+
+def configure_sentiment_cache(path=CACHE_PATH, **kwargs):
+    """Replaces the process-wide sentiment cache, e.g. to point it at another file or ':memory:'."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = SentimentCache(path, **kwargs)
+        return _cache
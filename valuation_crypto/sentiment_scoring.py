@@ -0,0 +1,128 @@
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Texts per task sent to a worker process
+BATCH_SIZE = 64
+# Below this many texts (~20 ms of TextBlob), scoring in-process is cheaper than shipping them to workers.
+# One coin's scan returns up to 600 posts (six subreddit searches of 100), and concurrent coins of a batch
+# run share the pool, so their scoring runs in parallel instead of contending for the GIL
+PARALLEL_THRESHOLD = 128
+
+TOKEN_PATTERN = re.compile(r"[a-z']+")
+NEGATIONS = ('not', 'never', 'no')
+
+
+class TextBlobScorer:
+    """Default scorer: TextBlob's pattern analyzer, identical to scoring posts one at a time."""
+
+    def score(self, texts):
+        from textblob import TextBlob
+        return [TextBlob(text).sentiment.polarity for text in texts]
+
+
+class LexiconScorer:
+    """
+    Vectorized lexicon scorer.
+    Tokens of a whole batch are matched against a sorted NumPy vocabulary in one pass,
+    negated when they follow a negation word, and averaged per text.
+    """
+
+    def __init__(self, lexicon):
+        words = sorted(lexicon)
+        self.words = np.array(words)
+        self.polarities = np.array([lexicon[word] for word in words], dtype=np.float64)
+
+    @classmethod
+    def from_textblob(cls):
+        """Builds the vocabulary from the adjective lexicon behind TextBlob's pattern analyzer."""
+        from textblob.en import sentiment as pattern_lexicon
+        return cls({word: senses[None][0] for word, senses in pattern_lexicon.items() if None in senses})
+
+    def score(self, texts):
+        token_lists = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+        lengths = np.array([len(tokens) for tokens in token_lists])
+        if not lengths.sum():
+            return [0.0] * len(texts)
+
+        tokens = np.array([token for tokens in token_lists for token in tokens])
+        text_ids = np.repeat(np.arange(len(texts)), lengths)
+
+        positions = np.searchsorted(self.words, tokens).clip(max=len(self.words) - 1)
+        matched = self.words[positions] == tokens
+        weights = self.polarities[positions]
+
+        negated = np.zeros(len(tokens), dtype=bool)
+        previous = tokens[:-1]
+        negated[1:] = (np.isin(previous, NEGATIONS) | np.char.endswith(previous, "n't")) & (text_ids[1:] == text_ids[:-1])
+        weights = np.where(negated, weights * -0.5, weights)
+
+        totals = np.bincount(text_ids[matched], weights=weights[matched], minlength=len(texts))
+        counts = np.bincount(text_ids[matched], minlength=len(texts))
+        return np.divide(totals, counts, out=np.zeros(len(texts)), where=counts > 0).tolist()
+
+
+# Scorers selectable by name, e.g. from the batch CLI
+SCORERS = {'textblob': TextBlobScorer, 'lexicon': LexiconScorer.from_textblob}
+
+_scorer = TextBlobScorer()
+
+
+def get_scorer():
+    """Returns the process-wide scorer used for Reddit posts when no scorer is passed."""
+    return _scorer
+
+
+def configure_scorer(scorer=None):
+    """
+    Replaces the process-wide scorer with a scorer instance or a SCORERS name; None restores TextBlob.
+    Polarities already in the sentiment cache are kept, so configure it before the first scan.
+    """
+    global _scorer
+    if isinstance(scorer, str):
+        scorer = SCORERS[scorer]()
+    _scorer = scorer or TextBlobScorer()
+    return _scorer
+
+
+def _score_batch(scorer, texts):
+    return scorer.score(texts)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(processes=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers are safe to start from the multi-threaded Dash server and batch runner
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown_scoring_pool():
+    """Stops the worker processes; they are started again on next use."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def score_texts(texts, scorer=None, processes=None, batch_size=BATCH_SIZE):
+    """
+    Scores the polarity of every text, in order.
+    Large inputs are split into batches and scored across a process pool.
+    """
+    scorer = scorer or get_scorer()
+    texts = list(texts)
+    if processes == 1 or len(texts) < PARALLEL_THRESHOLD:
+        return scorer.score(texts)
+
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    pool = _get_pool(processes)
+    return [polarity for scores in pool.map(_score_batch, [scorer] * len(batches), batches) for polarity in scores]
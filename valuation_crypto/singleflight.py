@@ -0,0 +1,78 @@
+import functools
+import json
+import logging
+import threading
+from concurrent.futures import Future
+
+
+def flight_key(name, args, kwargs):
+    """Identity of a call: the function name and its JSON-rendered arguments."""
+    return json.dumps([name, args, kwargs], sort_keys=True, default=repr)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while one call for a key is running, callers with the same key
+    wait for it and share its result (or exception) instead of starting their own.
+    Nothing is kept once the call returns, so later callers always run it again.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def do(self, name, fn, *args, **kwargs):
+        """Runs `fn(*args, **kwargs)`, or joins the identical call already running."""
+        key = flight_key(name, args, kwargs)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            self._record(name, leader)
+        if not leader:
+            logging.debug(f"Coalesced {name} call into the one in flight")
+            return future.result()
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+    def inflight(self):
+        """Number of calls currently running."""
+        with self._lock:
+            return len(self._inflight)
+
+    def reset(self):
+        """Drops the counters; calls in flight are unaffected."""
+        with self._lock:
+            self.stats.clear()
+
+    def _record(self, name, leader):
+        stats = self.stats.setdefault(name, {'calls': 0, 'executions': 0, 'coalesced': 0, 'hit_ratio': 0.0})
+        stats['calls'] += 1
+        if leader:
+            stats['executions'] += 1
+        else:
+            stats['coalesced'] += 1
+        stats['hit_ratio'] = stats['coalesced'] / stats['calls']
+
+
+flights = SingleFlight()
+
+
+def single_flight(fn):
+    """Decorator routing every call of `fn` through the process-wide `flights` group."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return flights.do(name, fn, *args, **kwargs)
+
+    return wrapper
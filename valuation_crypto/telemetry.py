@@ -0,0 +1,236 @@
+"""
+Timing spans for pipeline stages and upstream calls.
+
+Every span carries the symbol, provider, duration, retry count and cache outcome of one stage or
+upstream request. Spans are aggregated into duration histograms (labelled by span and provider;
+symbols stay out of the labels to keep their number bounded), exposed in the Prometheus text format
+by `metrics_text()`, and collected per request by `trace()` so a slow analysis can be broken down:
+
+    with trace('analyze_crypto', symbol='BTC') as current:
+        with span('reddit_search', provider='reddit') as s:
+            s.cache_hit = False
+    current.summary()  # "analyze_crypto BTC 0.61s: reddit_search[reddit] 0.61s"
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import logging
+import math
+import threading
+import time
+
+# Upper bounds of the duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+class Span:
+    """One timed stage or upstream call; the code being timed may set `retries` and `cache_hit`."""
+
+    __slots__ = ('name', 'symbol', 'provider', 'retries', 'cache_hit', 'error', 'duration')
+
+    def __init__(self, name, symbol=None, provider=None):
+        self.name = name
+        self.symbol = symbol
+        self.provider = provider
+        self.retries = 0
+        self.cache_hit = None
+        self.error = False
+        self.duration = 0.0
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Trace:
+    """Spans recorded while handling one request, in completion order."""
+
+    def __init__(self, name, symbol=None):
+        self.name = name
+        self.symbol = symbol
+        self.spans = []
+        self.started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self):
+        """Total seconds per span name and provider, e.g. {'reddit_search[reddit]': 3.6}."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                label = f"{span.name}[{span.provider}]" if span.provider else span.name
+                totals[label] = totals.get(label, 0.0) + span.duration
+        return {label: round(seconds, 3) for label, seconds in totals.items()}
+
+    def summary(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.started
+        parts = ', '.join(f"{label} {seconds:.2f}s"
+                          for label, seconds in sorted(self.breakdown().items(), key=lambda item: -item[1]))
+        return f"{self.name} {self.symbol or ''} {duration:.2f}s: {parts}".replace('  ', ' ')
+
+
+class Telemetry:
+    """Aggregates finished spans into histograms and counters."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, symbol=None, provider=None):
+        """Times the block as a span; exceptions mark it as an error and propagate."""
+        current = Span(name, symbol, provider)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException:
+            current.error = True
+            raise
+        finally:
+            current.duration = time.perf_counter() - started
+            self.record(current)
+
+    def observe(self, name, seconds, symbol=None, provider=None, cache_hit=None):
+        """Records a duration measured elsewhere (e.g. a rate limit wait) or a call answered from a cache."""
+        current = Span(name, symbol, provider)
+        current.duration = seconds
+        current.cache_hit = cache_hit
+        self.record(current)
+
+    def record(self, span):
+        trace = _current_trace.get()
+        if trace is not None:
+            if span.symbol is None:
+                span.symbol = trace.symbol
+            trace.add(span)
+        cache = '' if span.cache_hit is None else ('hit' if span.cache_hit else 'miss')
+        labels = (span.name, span.provider or '', cache)
+        with self._lock:
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                histogram = self._histograms[labels] = Histogram(self.buckets)
+            histogram.observe(span.duration)
+            for counter, increment in (('retries', span.retries), ('errors', int(span.error))):
+                if increment:
+                    key = (counter, span.name, span.provider or '')
+                    self._counters[key] = self._counters.get(key, 0) + increment
+
+    def snapshot(self):
+        """{(span, provider, cache): {'count', 'sum', 'buckets'}} plus {(counter, span, provider): total}."""
+        with self._lock:
+            histograms = {labels: {'count': h.count, 'sum': h.sum, 'buckets': list(h.counts)}
+                          for labels, h in self._histograms.items()}
+            return histograms, dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """Histograms and counters in the Prometheus text exposition format."""
+        histograms, counters = self.snapshot()
+        lines = ['# HELP valuation_span_seconds Duration of pipeline stages and upstream calls.',
+                 '# TYPE valuation_span_seconds histogram']
+        for (name, provider, cache), histogram in sorted(histograms.items()):
+            labels = _labels(span=name, provider=provider, cache=cache)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f"valuation_span_seconds_bucket{{{labels},le=\"{le}\"}} {cumulative}")
+            lines.append(f"valuation_span_seconds_sum{{{labels}}} {histogram['sum']:.6f}")
+            lines.append(f"valuation_span_seconds_count{{{labels}}} {histogram['count']}")
+        for counter, help_text in (('retries', 'Retries within spans.'), ('errors', 'Spans that raised.')):
+            lines += [f"# HELP valuation_span_{counter}_total {help_text}",
+                      f"# TYPE valuation_span_{counter}_total counter"]
+            lines += [f"valuation_span_{counter}_total{{{_labels(span=name, provider=provider)}}} {total}"
+                      for (kind, name, provider), total in sorted(counters.items()) if kind == counter]
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+telemetry = Telemetry()
+span = telemetry.span
+
+
+@contextlib.contextmanager
+def trace(name, symbol=None, log=True):
+    """
+    Collects the spans recorded in this context (and in work submitted with `propagate`) into a Trace,
+    logging its breakdown when the block exits. Nested calls join the enclosing trace.
+    """
+    current = _current_trace.get()
+    if current is not None:
+        yield current
+        return
+    current = Trace(name, symbol)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.duration = time.perf_counter() - current.started
+        if log:
+            logging.info(f"Timing {current.summary()}")
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def propagate(fn):
+    """Binds `fn` to the caller's context, so spans from executor threads join the caller's trace."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def metrics_text():
+    """Prometheus exposition of the span histograms plus rate limiter, market cache and single-flight stats."""
+    from valuation_crypto.market_cache import get_market_cache
+    from valuation_crypto.ratelimit import rate_limiter
+    from valuation_crypto.singleflight import flights
+
+    lines = ['# HELP valuation_rate_limit_requests_total Requests admitted by the shared rate limiter.',
+             '# TYPE valuation_rate_limit_requests_total counter']
+    waits = ['# HELP valuation_rate_limit_wait_seconds_total Time callers waited for rate limit budget.',
+             '# TYPE valuation_rate_limit_wait_seconds_total counter']
+    for provider, stats in sorted(rate_limiter.stats.items()):
+        lines.append(f"valuation_rate_limit_requests_total{{{_labels(provider=provider)}}} {stats['requests']}")
+        waits.append(f"valuation_rate_limit_wait_seconds_total{{{_labels(provider=provider)}}} {stats['total_wait']:.6f}")
+    lines += waits
+    lines += ['# HELP valuation_market_cache_lookups_total Market cache lookups by outcome.',
+              '# TYPE valuation_market_cache_lookups_total counter']
+    for source, stats in sorted(get_market_cache().stats.items()):
+        for result in ('hits', 'stale_hits', 'misses'):
+            lines.append(f"valuation_market_cache_lookups_total{{{_labels(source=source, result=result)}}} {stats[result]}")
+    lines += ['# HELP valuation_singleflight_coalesced_total Calls that joined an identical in-flight call.',
+              '# TYPE valuation_singleflight_coalesced_total counter']
+    for name, stats in sorted(flights.stats.items()):
+        lines.append(f"valuation_singleflight_coalesced_total{{{_labels(function=name)}}} {stats['coalesced']}")
+    return telemetry.render() + '\n'.join(lines) + '\n'
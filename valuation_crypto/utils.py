@@ -1,73 +1,351 @@
-import ccxt
+import contextlib
+import logging
+import time
 import requests
-from openai import OpenAI
-from valuation_crypto.apikey import cmc_api, openai_key
-import ccxt
-import requests
-from openai import OpenAI
-from valuation_crypto import market_sentiment_reddit_gtrend  
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, wait
+from valuation_crypto import market_sentiment_reddit_gtrend
+from valuation_crypto.exchanges import get_exchange, rate_limit_key, resolve_market
+from valuation_crypto.pair_index import CONVERTED_QUOTES
+from valuation_crypto.ratelimit import rate_limiter
+from valuation_crypto.ai_cache import cache_key, get_ai_cache, store_image, stored_image
+from valuation_crypto.singleflight import single_flight
+from valuation_crypto.market_cache import cached
+from valuation_crypto.clients import LazyClient, create_openai_client
+from valuation_crypto.telemetry import propagate, span, telemetry, trace
+from valuation_crypto.volume_stream import get_volume_stream
 
-# Initialize OpenAI client
-client = OpenAI(api_key=openai_key)
+# OpenAI client, created on first use
+client = LazyClient(create_openai_client)
 
-CMC_API_KEY = cmc_api
+CMC_QUOTES_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+CMC_BATCH_SIZE = 100
+CMC_TIMEOUT = 10
 exchanges_list = ['binance', 'coinbasepro', 'kraken', 'bitfinex', 'huobi']
 
+# Per-request timeout for a single exchange and overall deadline for the fan-out, in seconds
+EXCHANGE_TIMEOUT = 5.0
+VOLUME_DEADLINE = 8.0
+
+# OpenAI request parameters; part of the cache key together with the rendered prompt
+ANALYSIS_PARAMS = {"model": "gpt-4", "max_tokens": 300, "temperature": 0.7}
+IMAGE_PARAMS = {"model": "dall-e-3", "n": 1, "size": "1024x1024"}
+
+_volume_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='volume')
+_openai_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='openai')
+
+# Quotes tried when pricing a CONVERTED_QUOTES currency (e.g. BTC) in USD
+USD_QUOTES = ('USDT', 'USD', 'USDC')
+
+def _fetch_conversion_rate(exchange_id, currency):
+    """USD price of `currency` on an exchange, or None if it has no USD-like market."""
+    market = resolve_market(exchange_id, currency, USD_QUOTES)
+    if market is None:
+        return None
+    rate_limiter.acquire(rate_limit_key(exchange_id))
+    with span('conversion_rate', symbol=currency, provider=exchange_id):
+        return get_exchange(exchange_id).fetch_ticker(market[0]).get('last')
+
+@cached('conversion_rate')
+def fetch_conversion_rate(exchange_id, currency):
+    """Cached USD price of a quote currency, used to convert volumes of pairs not quoted in USD."""
+    return _fetch_conversion_rate(exchange_id, currency)
+
+def _fetch_exchange_volume(exchange_id, crypto_symbol, exchange_timeout):
+    """Fetches the 24h quote volume of a symbol on a single exchange, with status and latency."""
+    started = time.monotonic()
+    try:
+        # Resolved from the pair index first: exchanges that do not list the coin are never contacted
+        market = resolve_market(exchange_id, crypto_symbol)
+        if market is None:
+            return {'status': 'no_pair', 'volume': 0, 'latency': round(time.monotonic() - started, 3)}
+        pair, quote = market
+        exchange = get_exchange(exchange_id)
+        exchange.timeout = int(exchange_timeout * 1000)
+        rate_limiter.acquire(rate_limit_key(exchange_id))
+        with span('exchange_ticker', symbol=crypto_symbol, provider=exchange_id):
+            ticker = exchange.fetch_ticker(pair)
+        volume = ticker.get('quoteVolume') or 0
+        if quote in CONVERTED_QUOTES and volume:
+            volume *= fetch_conversion_rate(exchange_id, quote) or 0
+    except Exception as e:
+        logging.warning(f"Volume fetch failed for {crypto_symbol} on {exchange_id}: {e}")
+        return {'status': 'error', 'volume': 0, 'latency': round(time.monotonic() - started, 3), 'error': str(e)}
+    return {'status': 'ok', 'volume': volume, 'latency': round(time.monotonic() - started, 3)}
+
+def fetch_volume_breakdown(crypto_symbol, exchanges_list=exchanges_list,
+                           exchange_timeout=EXCHANGE_TIMEOUT, deadline=VOLUME_DEADLINE):
+    """
+    Fetches trading volume from all exchanges concurrently.
+    Returns the aggregated volume plus status and latency per exchange; exchanges
+    that have not answered within `deadline` seconds are reported as timed out.
+    """
+    started = time.monotonic()
+    futures = {
+        exchange_id: _volume_executor.submit(propagate(_fetch_exchange_volume), exchange_id, crypto_symbol,
+                                             exchange_timeout)
+        for exchange_id in exchanges_list
+    }
+    wait(futures.values(), timeout=deadline)
+
+    statuses = {}
+    for exchange_id, future in futures.items():
+        if future.done():
+            statuses[exchange_id] = future.result()
+        else:
+            logging.warning(f"{exchange_id} did not answer for {crypto_symbol} within {deadline}s")
+            statuses[exchange_id] = {'status': 'timeout', 'volume': 0, 'latency': None}
+
+    total_volume_24h = sum(status['volume'] for status in statuses.values())
+    return {
+        'total_volume_24h': round(total_volume_24h, 2),
+        'exchanges': statuses,
+        'latency': round(time.monotonic() - started, 3),
+    }
+
+@cached('trading_volume')
+@single_flight
+def poll_trading_volume(crypto_symbol, exchanges_list=exchanges_list):
+    """Polls the ticker endpoints of multiple exchanges for the total trading volume."""
+    return fetch_volume_breakdown(crypto_symbol, exchanges_list)['total_volume_24h']
+
 def fetch_trading_volume(crypto_symbol, exchanges_list=exchanges_list):
-    """Fetches total trading volume across multiple exchanges."""
-    total_volume_24h = 0.0
-    for exchange_id in exchanges_list:
+    """
+    Fetches total trading volume across multiple exchanges. While a volume stream is running,
+    exchanges it has a fresh ticker from are read from its snapshot and only the others are polled.
+    """
+    stream = get_volume_stream()
+    if stream is None:
+        return poll_trading_volume(crypto_symbol, exchanges_list)
+    streamed, missing = stream.volumes(crypto_symbol, exchanges_list)
+    polled = poll_trading_volume(crypto_symbol, missing) if missing else 0
+    return round(sum(streamed.values()) + polled, 2)
+
+def _fetch_exchange_volumes(exchange_id, crypto_symbols, exchange_timeout):
+    """Fetches the 24h quote volume of many symbols on one exchange with a single bulk ticker request."""
+    pairs = {}
+    for crypto_symbol in crypto_symbols:
+        market = resolve_market(exchange_id, crypto_symbol)
+        if market is not None:
+            pairs[market[0]] = (crypto_symbol, market[1])
+    if not pairs:
+        return {}
+    # Pairs quoted in e.g. BTC are converted with the quote's own USD ticker, fetched in the same request
+    conversions = {}
+    for quote in {quote for _, quote in pairs.values() if quote in CONVERTED_QUOTES}:
+        market = resolve_market(exchange_id, quote, USD_QUOTES)
+        if market is not None:
+            conversions[quote] = market[0]
+
+    exchange = get_exchange(exchange_id)
+    exchange.timeout = int(exchange_timeout * 1000)
+    requested = list(dict.fromkeys(list(pairs) + list(conversions.values())))
+    if exchange.has.get('fetchTickers'):
+        rate_limiter.acquire(rate_limit_key(exchange_id))
+        with span('exchange_tickers', provider=exchange_id):
+            tickers = exchange.fetch_tickers(requested)
+    else:
+        rate_limiter.acquire(rate_limit_key(exchange_id), tokens=len(requested))
+        with span('exchange_tickers', provider=exchange_id):
+            tickers = {pair: exchange.fetch_ticker(pair) for pair in requested}
+
+    rates = {quote: (tickers.get(pair) or {}).get('last') or 0 for quote, pair in conversions.items()}
+    volumes = {}
+    for pair, ticker in tickers.items():
+        if pair not in pairs:
+            continue
+        crypto_symbol, quote = pairs[pair]
+        volume = ticker.get('quoteVolume') or 0
+        volumes[crypto_symbol] = volume * rates.get(quote, 0) if quote in CONVERTED_QUOTES else volume
+    return volumes
+
+def fetch_trading_volumes(crypto_symbols, exchanges_list=exchanges_list,
+                          exchange_timeout=EXCHANGE_TIMEOUT, deadline=VOLUME_DEADLINE):
+    """
+    Fetches total trading volume for many symbols at once.
+    Each exchange is queried once through its bulk ticker endpoint; returns {symbol: volume}.
+    """
+    volumes = {crypto_symbol: 0.0 for crypto_symbol in crypto_symbols}
+    # Symbols each exchange must be polled for: all of them unless a volume stream has fresh tickers
+    polled = {exchange_id: list(crypto_symbols) for exchange_id in exchanges_list}
+    stream = get_volume_stream()
+    if stream is not None:
+        polled = {exchange_id: [] for exchange_id in exchanges_list}
+        for crypto_symbol in crypto_symbols:
+            streamed, missing = stream.volumes(crypto_symbol, exchanges_list)
+            volumes[crypto_symbol] += sum(streamed.values())
+            for exchange_id in missing:
+                polled[exchange_id].append(crypto_symbol)
+    futures = {
+        exchange_id: _volume_executor.submit(propagate(_fetch_exchange_volumes), exchange_id, symbols,
+                                             exchange_timeout)
+        for exchange_id, symbols in polled.items() if symbols
+    }
+    wait(futures.values(), timeout=deadline)
+
+    for exchange_id, future in futures.items():
+        if not future.done():
+            logging.warning(f"{exchange_id} did not answer the bulk ticker request within {deadline}s")
+            continue
         try:
-            exchange = getattr(ccxt, exchange_id)()
-            exchange.load_markets()
-            pair = f"{crypto_symbol}/USDT" if f"{crypto_symbol}/USDT" in exchange.symbols else f"{crypto_symbol}/USD"
-            ticker = exchange.fetch_ticker(pair)
-            volume = ticker.get('quoteVolume', 0)
-            total_volume_24h += volume
-        except Exception:
+            exchange_volumes = future.result()
+        except Exception as e:
+            logging.warning(f"Bulk volume fetch failed on {exchange_id}: {e}")
+            continue
+        for crypto_symbol, volume in exchange_volumes.items():
+            volumes[crypto_symbol] += volume
+
+    return {crypto_symbol: round(volume, 2) for crypto_symbol, volume in volumes.items()}
+
+def _build_cmc_session():
+    """Creates the keep-alive session shared by all CoinMarketCap requests."""
+    from valuation_crypto.apikey import cmc_api
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET']))
+    session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=retries))
+    session.headers.update({
+        'Accepts': 'application/json',
+        'X-CMC_PRO_API_KEY': cmc_api,
+    })
+    return session
+
+cmc_session = LazyClient(_build_cmc_session)
+
+def quote_batches(symbols, batch_size=CMC_BATCH_SIZE):
+    """Unique upper-cased symbols split into CoinMarketCap requests of `batch_size`."""
+    unique_symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    return [unique_symbols[start:start + batch_size] for start in range(0, len(unique_symbols), batch_size)]
+
+def quote_params(batch):
+    return {'symbol': ','.join(batch), 'convert': 'USD', 'skip_invalid': 'true'}
+
+def quote_span(batch):
+    return span('cmc_quotes', symbol=batch[0] if len(batch) == 1 else None, provider='coinmarketcap')
+
+def quote_request_failed(batch, error):
+    logging.warning(f"CoinMarketCap request failed for {len(batch)} symbols: {error}")
+    return {}
+
+def quotes_from_response(batch, response):
+    """{symbol: data} for the symbols of a batch CoinMarketCap returned; {} on an error status."""
+    if response.status_code != 200:
+        logging.warning(f"CoinMarketCap returned {response.status_code} for {len(batch)} symbols")
+        return {}
+    data = response.json().get('data', {})
+    return {symbol: data[symbol] for symbol in batch if data.get(symbol)}
+
+def fetch_crypto_quotes(symbols, batch_size=CMC_BATCH_SIZE):
+    """
+    Fetches crypto data for many symbols from CoinMarketCap API.
+    Symbols are sent comma-separated, `batch_size` per request; returns {symbol: data}.
+    """
+    quotes = {}
+    for batch in quote_batches(symbols, batch_size):
+        rate_limiter.acquire('coinmarketcap')
+        try:
+            with quote_span(batch):
+                response = cmc_session.get(CMC_QUOTES_URL, params=quote_params(batch), timeout=CMC_TIMEOUT)
+        except requests.RequestException as e:
+            quote_request_failed(batch, e)
             continue
-    return round(total_volume_24h, 2)
+        quotes.update(quotes_from_response(batch, response))
+    return quotes
 
+@cached('crypto_data')
+@single_flight
 def fetch_crypto_data(symbol):
     """Fetches crypto data from CoinMarketCap API."""
-    url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-    headers = {
-        'Accepts': 'application/json',
-        'X-CMC_PRO_API_KEY': CMC_API_KEY,
-    }
-    response = requests.get(url, headers=headers, params={'symbol': symbol, 'convert': 'USD'})
-    if response.status_code == 200:
-        return response.json().get('data', {}).get(symbol, None)
-    return None
+    return fetch_crypto_quotes([symbol]).get(symbol.upper())
 
-def analyze_crypto(symbol):
-    crypto_data = fetch_crypto_data(symbol)
-    if not crypto_data:
-        return {"error": "Invalid Crypto Symbol or Data Unavailable."}, None
+INVALID_SYMBOL_ERROR = "Invalid Crypto Symbol or Data Unavailable."
+DEFAULT_SENTIMENT = {'combined_sentiment_score': 0, 'current_mentions': 0, 'previous_mentions': 0}
 
-    crypto_id = crypto_data['name']
-    crypto_symbol = crypto_data['symbol'].upper()
-    current_price = round(crypto_data['quote']['USD']['price'], 2)
-    market_cap = round(crypto_data['quote']['USD']['market_cap'], 2)
-    circulating_supply = round(crypto_data.get('circulating_supply', 0), 2)
+RESULT_KEYS = (
+    "current_price", "market_cap", "circulating_supply", "velocity", "sentiment_score",
+    "current_mentions", "previous_mentions", "adjusted_velocity", "valuation_difference",
+    "valuation_difference_percentage", "market_sentiment_percentage",
+)
 
-    total_volume_24h = fetch_trading_volume(crypto_symbol)
+def compute_market_metrics(crypto_data, total_volume_24h):
+    """Market-data stage: price, supply and velocity from a CMC quote and the aggregated exchange volume."""
+    quote = crypto_data['quote']['USD']
+    circulating_supply = round(crypto_data.get('circulating_supply') or 0, 2)
     annual_trading_volume = total_volume_24h * 365
-    velocity = round(annual_trading_volume / circulating_supply, 2) if circulating_supply else 0
+    return {
+        "crypto_id": crypto_data['name'],
+        "crypto_symbol": crypto_data['symbol'].upper(),
+        "current_price": round(quote['price'], 2),
+        "market_cap": round(quote['market_cap'], 2),
+        "market_cap_dominance": round(quote.get('market_cap_dominance') or 0, 2),
+        "circulating_supply": circulating_supply,
+        "total_volume_24h": total_volume_24h,
+        "velocity": round(annual_trading_volume / circulating_supply, 2) if circulating_supply else 0,
+    }
 
-    sentiment_data = market_sentiment_reddit_gtrend.aggregate_sentiment_analysis([(crypto_id, crypto_symbol)])
-    sentiment = sentiment_data.get(crypto_symbol, {'combined_sentiment_score': 0, 'current_mentions': 0, 'previous_mentions': 0})
-    
+def apply_sentiment(metrics, sentiment):
+    """Sentiment stage: adjusts velocity by the combined sentiment score and derives the valuation gap."""
+    velocity = metrics['velocity']
+    current_price = metrics['current_price']
     combined_sentiment = sentiment['combined_sentiment_score']
-    current_mentions = sentiment['current_mentions']
-    previous_mentions = sentiment['previous_mentions']
 
     adjusted_velocity = round(velocity * (1 + combined_sentiment), 2)
     valuation_difference = round(adjusted_velocity - current_price, 2)
-    valuation_difference_percentage = round((valuation_difference / current_price * 100), 2) if current_price else 0
-    market_sentiment_percentage = round(((velocity - adjusted_velocity) / velocity * -1), 2) if velocity else 0
+    return dict(
+        metrics,
+        sentiment_score=combined_sentiment,
+        current_mentions=sentiment['current_mentions'],
+        previous_mentions=sentiment['previous_mentions'],
+        adjusted_velocity=adjusted_velocity,
+        valuation_difference=valuation_difference,
+        valuation_difference_percentage=round((valuation_difference / current_price * 100), 2) if current_price else 0,
+        market_sentiment_percentage=round(((velocity - adjusted_velocity) / velocity * -1), 2) if velocity else 0,
+    )
+
+def fetch_market_metrics(symbol, crypto_data=None):
+    """Market-data stage for one symbol: CMC quote plus exchange volume. Returns None for unknown symbols."""
+    with span('market', symbol=symbol.upper()):
+        crypto_data = crypto_data or fetch_crypto_data(symbol)
+        if not crypto_data:
+            return None
+        return compute_market_metrics(crypto_data, fetch_trading_volume(crypto_data['symbol'].upper()))
+
+def fetch_trends(metrics_list):
+    """
+    Google Trends scores of many coins as {crypto_id: trends}, in shared anchored payloads of four coins.
+    Pass the coins in market-cap order, and the result to `fetch_sentiment`.
+    """
+    return market_sentiment_reddit_gtrend.fetch_trends_batch([metrics['crypto_id'] for metrics in metrics_list])
+
+def fetch_sentiment(metrics, trends=None):
+    """
+    Fetches Reddit / Google Trends sentiment for the coin described by `metrics`.
+    With `trends` from `fetch_trends`, Google Trends is not queried again and only Reddit is scanned.
+    """
+    crypto_symbol = metrics['crypto_symbol']
+    with span('sentiment', symbol=crypto_symbol):
+        if trends is not None:
+            return market_sentiment_reddit_gtrend.coin_sentiment(metrics['crypto_id'], crypto_symbol,
+                                                                 trends[metrics['crypto_id']])
+        sentiment_data = market_sentiment_reddit_gtrend.aggregate_sentiment_analysis([(metrics['crypto_id'], crypto_symbol)])
+    return sentiment_data.get(crypto_symbol, DEFAULT_SENTIMENT)
+
+def build_analysis_prompt(metrics):
+    """Renders the GPT-4 prompt for the computed metrics."""
+    crypto_id = metrics['crypto_id']
+    crypto_symbol = metrics['crypto_symbol']
+    current_price = metrics['current_price']
+    market_cap = metrics['market_cap']
+    circulating_supply = metrics['circulating_supply']
+    velocity = metrics['velocity']
+    combined_sentiment = metrics['sentiment_score']
+    current_mentions = metrics['current_mentions']
+    previous_mentions = metrics['previous_mentions']
+    adjusted_velocity = metrics['adjusted_velocity']
+    valuation_difference = metrics['valuation_difference']
+    market_sentiment_percentage = metrics['market_sentiment_percentage']
 
-    # OpenAI Analysis
     prompt_text = (
         f"Below are recent metrics for {crypto_id} ({crypto_symbol}):\n"
         f"- Current Price: {current_price}\n"
@@ -86,32 +364,13 @@ def analyze_crypto(symbol):
         "and velocity metrics you see here."
         "Make sure by then end the final phrase is complete. Max. 300 tokens"
     )
+    return prompt_text
 
-    try:
-        chat_response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": "You are a crypto data analyst"},
-                      {"role": "user", "content": prompt_text}],
-            max_tokens=100,
-            temperature=0.7
-        )
-        analysis = chat_response.choices[0].message.content if chat_response.choices else "No valid response from ChatGPT."
-    except Exception as e:
-        analysis = f"OpenAI API Error: {e}"
-
-    # Generate DALL-E Image
-
-    try:
-        chat_response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": "You are a crypto data analyst"},
-                    {"role": "user", "content": prompt_text}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        analysis = chat_response.choices[0].message.content if chat_response.choices else "No valid response from ChatGPT."
-    except Exception as e:
-        analysis = f"OpenAI API Error: {e}"
+def build_image_prompt(metrics):
+    """Renders the DALL-E prompt, themed on the sentiment and valuation outlook."""
+    crypto_id = metrics['crypto_id']
+    combined_sentiment = metrics['sentiment_score']
+    valuation_difference = metrics['valuation_difference']
 
     # 🔹 **Determine Image Sentiment & Color Theme Based on Sentiment & Valuation**
     if combined_sentiment >= 0 and valuation_difference > 0:
@@ -127,40 +386,142 @@ def analyze_crypto(symbol):
         outlook = "worst-case scenario, panic and fear dominate the market"
         color_scheme = "dark, chaotic, and stormy tones to emphasize extreme bearish sentiment"
 
-    # 🔹 **Generate DALL-E Image**
+    return (
+        f"Create a visually striking and engaging illustration in a Pixar-like style, incorporating elements of pop art and humor. "
+        f"The image should reflect the overall market sentiment ({'positive' if combined_sentiment >= 0 else 'negative'}) "
+        f"while integrating key themes from recent headlines or announcements about {crypto_id} on https://www.coindesk.com/. "
+        f"Illustrate the mood of the crypto market by emphasizing {crypto_id}'s reaction to these events. "
+        f"The image should metaphorically or symbolically represent how traders, investors, or the general public feel about {crypto_id}. "
+        f"Current valuation analysis suggests a {outlook}. The color scheme should align with this sentiment: {color_scheme}. "
+        f"Make sure the official logo of {crypto_id} is clearly visible in the artwork. "
+        f"The characters depicted should have European facial features and be expressive to convey emotion effectively. "
+        f"Ensure the image is high-resolution and suitable for a 1024x1024 pixel canvas."
+    )
+
+# OpenAI requests shared by the synchronous pipeline and the async engine: each one is built into a
+# (cache key, request kwargs) pair, answered from the AI cache when possible, and its response unpacked
+# and cached the same way whichever client sent it.
+
+def analysis_request(prompt_text):
+    messages = [{"role": "system", "content": "You are a crypto data analyst"},
+                {"role": "user", "content": prompt_text}]
+    return cache_key(messages=messages, **ANALYSIS_PARAMS), dict(messages=messages, **ANALYSIS_PARAMS)
+
+def image_request(image_prompt):
+    return cache_key(prompt=image_prompt, **IMAGE_PARAMS), dict(prompt=image_prompt, **IMAGE_PARAMS)
+
+def cached_ai_response(key, name, provider):
+    """The cached answer for a request key, recorded as a cache hit of span `name`; None on a miss."""
+    cached = get_ai_cache().get(key)
+    if cached is not None:
+        telemetry.observe(name, 0.0, provider=provider, cache_hit=True)
+    return cached
+
+def cached_image(key):
+    """
+    The cached route of an image request, or the image still in the local store once its cache entry
+    expired, so DALL-E is not paid again for it; None on a miss.
+    """
+    cached = cached_ai_response(key, 'openai_image', 'openai_images')
+    if cached is None:
+        cached = stored_image(key)
+        if cached is not None:
+            telemetry.observe('openai_image', 0.0, provider='openai_images', cache_hit=True)
+            get_ai_cache().set(key, cached)
+    return cached
+
+@contextlib.contextmanager
+def openai_span(name, provider):
+    with span(name, provider=provider) as current:
+        current.cache_hit = False
+        yield current
+
+# Analysis texts returned in place of a GPT-4 answer
+ANALYSIS_ERROR_PREFIX = "OpenAI API Error: "
+NO_ANALYSIS_RESPONSE = "No valid response from ChatGPT."
+
+def analysis_error(error):
+    return f"{ANALYSIS_ERROR_PREFIX}{error}"
+
+def is_analysis_error(analysis):
+    """True if `analysis` is the message request_analysis returns when no answer was generated."""
+    return analysis == NO_ANALYSIS_RESPONSE or analysis.startswith(ANALYSIS_ERROR_PREFIX)
+
+def analysis_from_response(key, chat_response):
+    """The analysis text of a chat completion, cached under `key`."""
+    if not chat_response.choices:
+        return NO_ANALYSIS_RESPONSE
+    analysis = chat_response.choices[0].message.content
+    get_ai_cache().set(key, analysis)
+    return analysis
+
+def image_error(error):
+    logging.error(f"DALL-E API Error: {error}")
+    return None
+
+def image_from_response(key, dalle_response):
+    """Stores the generated image locally and caches its route under `key`; None if nothing was generated."""
+    if not dalle_response.data:
+        return None
+    image_url = store_image(key, dalle_response.data[0].url)
+    get_ai_cache().set(key, image_url)
+    return image_url
+
+def request_analysis(prompt_text):
+    """
+    Sends the analysis prompt to GPT-4 once; errors are returned as the analysis text.
+    Answers are cached by prompt and model parameters for AI_CACHE_TTL seconds.
+    """
+    key, request = analysis_request(prompt_text)
+    cached = cached_ai_response(key, 'openai_chat', 'openai')
+    if cached is not None:
+        return cached
     try:
-        dalle_response = client.images.generate(
-            model="dall-e-3",
-            prompt=(
-                f"Create a visually striking and engaging illustration in a Pixar-like style, incorporating elements of pop art and humor. "
-                f"The image should reflect the overall market sentiment ({'positive' if combined_sentiment >= 0 else 'negative'}) "
-                f"while integrating key themes from recent headlines or announcements about {crypto_id} on https://www.coindesk.com/. "
-                f"Illustrate the mood of the crypto market by emphasizing {crypto_id}'s reaction to these events. "
-                f"The image should metaphorically or symbolically represent how traders, investors, or the general public feel about {crypto_id}. "
-                f"Current valuation analysis suggests a {outlook}. The color scheme should align with this sentiment: {color_scheme}. "
-                f"Make sure the official logo of {crypto_id} is clearly visible in the artwork. "
-                f"The characters depicted should have European facial features and be expressive to convey emotion effectively. "
-                f"Ensure the image is high-resolution and suitable for a 1024x1024 pixel canvas."
-            ),
-            n=1,
-            size="1024x1024"
-        )
-        image_url = dalle_response.data[0].url if dalle_response.data else None
+        rate_limiter.acquire('openai')
+        with openai_span('openai_chat', 'openai'):
+            chat_response = client.chat.completions.create(**request)
     except Exception as e:
-        print(f"DALL-E API Error: {e}")
-        image_url = None
+        return analysis_error(e)
+    return analysis_from_response(key, chat_response)
 
-    return {
-            "current_price": current_price,
-            "market_cap": market_cap,
-            "circulating_supply": circulating_supply,
-            "velocity": velocity,
-            "sentiment_score": combined_sentiment,
-            "current_mentions": current_mentions,
-            "previous_mentions": previous_mentions,
-            "adjusted_velocity": adjusted_velocity,
-            "valuation_difference": valuation_difference,
-            "valuation_difference_percentage": valuation_difference_percentage,
-            "market_sentiment_percentage": market_sentiment_percentage,
-            "ai_text": analysis
-        }, image_url
\ No newline at end of file
+def request_image(image_prompt):
+    """
+    Generates the DALL-E illustration and stores it locally, since DALL-E URLs expire.
+    Returns the image's local route (or remote URL if it could not be stored), or None.
+    """
+    key, request = image_request(image_prompt)
+    cached = cached_image(key)
+    if cached is not None:
+        return cached
+    try:
+        rate_limiter.acquire('openai_images')
+        with openai_span('openai_image', 'openai_images'):
+            dalle_response = client.images.generate(**request)
+    except Exception as e:
+        return image_error(e)
+    return image_from_response(key, dalle_response)
+
+def generate_ai_analysis(metrics):
+    """LLM stage: GPT-4 commentary and a DALL-E illustration, requested concurrently."""
+    with span('ai', symbol=metrics['crypto_symbol']):
+        text_future = _openai_executor.submit(propagate(request_analysis), build_analysis_prompt(metrics))
+        image_future = _openai_executor.submit(propagate(request_image), build_image_prompt(metrics))
+        return text_future.result(), image_future.result()
+
+@single_flight
+def analyze_crypto(symbol, crypto_data=None):
+    """
+    Runs the full valuation for a symbol; batch jobs can pass a quote prefetched with fetch_crypto_quotes.
+    The time spent per stage and upstream call is logged once the analysis completes.
+    """
+    with trace('analyze_crypto', symbol=symbol.upper()):
+        metrics = fetch_market_metrics(symbol, crypto_data)
+        if not metrics:
+            return {"error": INVALID_SYMBOL_ERROR}, None
+
+        metrics = apply_sentiment(metrics, fetch_sentiment(metrics))
+        analysis, image_url = generate_ai_analysis(metrics)
+
+    result = {key: metrics[key] for key in RESULT_KEYS}
+    result["ai_text"] = analysis
+    return result, image_url
@@ -0,0 +1,219 @@
+"""
+Live 24h exchange volume from ticker streams.
+
+A `VolumeStream` subscribes to the 24h ticker WebSocket streams of each exchange through ccxt.pro
+(`watch_tickers`, or one `watch_ticker` per pair where an exchange has no bulk stream) for a fixed
+set of coins, in an event loop running in a background thread. Every update publishes a new
+snapshot of {exchange: Feed}; published snapshots are never mutated, so readers such as
+`utils.fetch_trading_volume` use the current one without taking a lock:
+
+    configure_volume_stream(['BTC', 'ETH'])
+    utils.fetch_trading_volume('BTC')   # read from the stream once each exchange has pushed a ticker
+
+Exchanges without a stream, coins that were not subscribed and tickers older than `max_age` are
+reported as missing, and the caller polls those over REST as before.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import namedtuple
+from valuation_crypto import clients
+from valuation_crypto.exchanges import exchange_pool
+from valuation_crypto.pair_index import CONVERTED_QUOTES, resolve_market
+
+# Streamed tickers older than this many seconds are ignored and the exchange is polled instead
+STREAM_MAX_AGE = 60.0
+# Backoff between reconnection attempts after a stream failed, in seconds
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 60.0
+
+# quote_volume and last price of one pair, and the time.monotonic() it was received at
+Ticker = namedtuple('Ticker', 'quote_volume last received_at')
+# markets: coin -> (pair, quote) or None when the exchange does not list it;
+# conversions: converted quote -> its USD pair; tickers: pair -> Ticker
+Feed = namedtuple('Feed', 'markets conversions tickers')
+
+
+class VolumeStream:
+    """Streams the tickers of `symbols` on `exchanges_list` and answers volume reads from the latest snapshot."""
+
+    def __init__(self, symbols, exchanges_list, max_age=STREAM_MAX_AGE):
+        self.symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols))
+        self.exchanges_list = list(exchanges_list)
+        self.max_age = max_age
+        self.stats = {exchange_id: {'updates': 0, 'reconnects': 0} for exchange_id in self.exchanges_list}
+        self._snapshot = {}
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+        self._started = threading.Event()
+
+    # Readers
+
+    def volumes(self, crypto_symbol, exchanges_list):
+        """
+        USD volume of a coin per exchange with a fresh streamed ticker, plus the exchanges that must be
+        polled instead, as ({exchange: volume}, [exchange]). Exchanges that do not list the coin count as 0.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        streamed, missing = {}, []
+        for exchange_id in exchanges_list:
+            volume = self._volume(snapshot.get(exchange_id), crypto_symbol, now)
+            if volume is None:
+                missing.append(exchange_id)
+            else:
+                streamed[exchange_id] = volume
+        return streamed, missing
+
+    def _volume(self, feed, crypto_symbol, now):
+        if feed is None or crypto_symbol not in feed.markets:
+            return None
+        market = feed.markets[crypto_symbol]
+        if market is None:
+            return 0
+        pair, quote = market
+        ticker = feed.tickers.get(pair)
+        if ticker is None or now - ticker.received_at > self.max_age:
+            return None
+        if quote not in CONVERTED_QUOTES:
+            return ticker.quote_volume
+        rate = feed.tickers.get(feed.conversions.get(quote))
+        if rate is None or now - rate.received_at > self.max_age:
+            return None
+        return ticker.quote_volume * rate.last
+
+    def ages(self):
+        """Seconds since the last update of each streamed pair, as {exchange: {pair: age}}."""
+        now = time.monotonic()
+        return {exchange_id: {pair: round(now - ticker.received_at, 3) for pair, ticker in feed.tickers.items()}
+                for exchange_id, feed in self._snapshot.items()}
+
+    # Lifecycle
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts streaming in a background thread; returns once its event loop is running."""
+        self._started.clear()
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name='volume-stream', daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def run(self):
+        """Watches every exchange until `stop()`."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._started.set()
+        tasks = [asyncio.ensure_future(self._watch(exchange_id)) for exchange_id in self.exchanges_list]
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Writer: only the stream's event loop publishes snapshots
+
+    async def _watch(self, exchange_id):
+        try:
+            exchange = clients.create_stream_exchange(exchange_id)
+        except (ImportError, AttributeError) as e:
+            logging.warning(f"No ticker stream for {exchange_id}, its volume is polled instead: {e}")
+            return
+        try:
+            try:
+                requested = await self._subscribe(exchange_id)
+            except Exception as e:
+                logging.warning(f"Could not resolve the pairs to stream on {exchange_id}, its volume is polled instead: {e}")
+                return
+            if not requested:
+                return
+            if exchange.has.get('watchTickers'):
+                await self._receive(exchange_id, lambda: exchange.watch_tickers(requested))
+            else:
+                await asyncio.gather(*(self._receive(exchange_id, self._watch_ticker(exchange, pair))
+                                       for pair in requested))
+        finally:
+            await exchange.close()
+
+    @staticmethod
+    def _watch_ticker(exchange, pair):
+        async def receive():
+            return {pair: await exchange.watch_ticker(pair)}
+        return receive
+
+    async def _subscribe(self, exchange_id):
+        """Resolves the pairs to watch from the pair index and publishes an empty feed; returns the pairs."""
+        from valuation_crypto.utils import USD_QUOTES
+        pairs = await asyncio.to_thread(exchange_pool.pairs, exchange_id)
+        markets = {symbol: resolve_market(pairs, symbol) for symbol in self.symbols}
+        conversions = {}
+        for quote in {market[1] for market in markets.values() if market and market[1] in CONVERTED_QUOTES}:
+            conversion = resolve_market(pairs, quote, USD_QUOTES)
+            if conversion is not None:
+                conversions[quote] = conversion[0]
+        self._snapshot = {**self._snapshot, exchange_id: Feed(markets, conversions, {})}
+        requested = [market[0] for market in markets.values() if market] + list(conversions.values())
+        return list(dict.fromkeys(requested))
+
+    async def _receive(self, exchange_id, watch):
+        """Publishes every batch `watch()` returns, reconnecting with backoff when the stream fails."""
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                tickers = await watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats[exchange_id]['reconnects'] += 1
+                logging.warning(f"Ticker stream for {exchange_id} failed, reconnecting in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            self._publish(exchange_id, tickers)
+
+    def _publish(self, exchange_id, tickers):
+        feed = self._snapshot[exchange_id]
+        now = time.monotonic()
+        received = {pair: Ticker(ticker.get('quoteVolume') or 0, ticker.get('last') or 0, now)
+                    for pair, ticker in tickers.items()}
+        feed = feed._replace(tickers={**feed.tickers, **received})
+        # Copy-on-write: readers keep using the snapshot they loaded while a new one replaces it
+        self._snapshot = {**self._snapshot, exchange_id: feed}
+        self.stats[exchange_id]['updates'] += 1
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def get_volume_stream():
+    """Returns the process-wide volume stream, or None when volume is only polled."""
+    return _stream
+
+
+def configure_volume_stream(symbols=None, exchanges_list=None, max_age=STREAM_MAX_AGE):
+    """Stops the current volume stream and, given symbols, starts streaming their volume; None disables it."""
+    global _stream
+    with _stream_lock:
+        if _stream is not None:
+            _stream.stop()
+            _stream = None
+        if symbols:
+            if exchanges_list is None:
+                from valuation_crypto.utils import exchanges_list
+            _stream = VolumeStream(symbols, exchanges_list, max_age)
+            _stream.start()
+        return _stream
@@ -0,0 +1,297 @@
+"""
+Incremental valuation of a fixed watchlist.
+
+Each coin's analysis is a small dependency graph. The inputs are the CMC quote, the exchange volume
+and the Reddit / Trends sentiment, and each one is refetched on its own schedule. Derived nodes are
+recomputed only when something they depend on changed:
+
+    quote ─┬─> market (price, market cap, supply, velocity) ─┬─> valuation (adjusted velocity,
+    volume ┘                                                 │     valuation difference, ...) ──> ai
+    sentiment ───────────────────────────────────────────────┘
+
+GPT-4 commentary is regenerated only when the valuation difference % or the sentiment score moved
+by more than a threshold since it was written. The DALL-E image is regenerated only when its
+outlook changes, i.e. the sign of the sentiment or of the valuation difference.
+
+Usage:
+    python -m valuation_crypto.watchlist BTC ETH SOL --interval 60
+    python -m valuation_crypto.watchlist BTC --valuation-threshold 2.5 --sentiment-threshold 0.05 --once
+    python -m valuation_crypto.watchlist BTC ETH --stream --volume-interval 5
+"""
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from valuation_crypto import utils
+from valuation_crypto.history import get_history_store
+from valuation_crypto.market_cache import max_age
+from valuation_crypto.volume_stream import configure_volume_stream
+
+# Node -> nodes it is computed from; nodes without dependencies are inputs fetched upstream
+GRAPH = {
+    'quote': (),
+    'volume': (),
+    'sentiment': (),
+    'market': ('quote', 'volume'),
+    'valuation': ('market', 'sentiment'),
+    'ai': ('valuation',),
+}
+INPUTS = ('quote', 'volume', 'sentiment')
+DERIVED = ('market', 'valuation', 'ai')
+
+# Seconds after which each input is refetched
+INPUT_INTERVALS = {
+    'quote': 60,
+    'volume': 60,
+    'sentiment': 30 * 60,   # Reddit and Trends move slowly and are the most expensive to scan
+}
+# Regenerate the AI commentary once a metric moved by at least this much since it was written
+AI_THRESHOLDS = {
+    'valuation_difference_percentage': 5.0,
+    'sentiment_score': 0.1,
+}
+TICK_INTERVAL = 60
+WATCHLIST_WORKERS = 4
+
+
+def dependents(changed):
+    """Derived nodes invalidated by `changed` nodes, transitively."""
+    invalid = set()
+    for node in DERIVED:
+        if any(dependency in changed or dependency in invalid for dependency in GRAPH[node]):
+            invalid.add(node)
+    return invalid
+
+
+def outlook(valuation):
+    """The image theme chosen by build_image_prompt: (sentiment not negative, valuation above price)."""
+    return valuation['sentiment_score'] >= 0, valuation['valuation_difference'] > 0
+
+
+class CoinState:
+    """Current value of every node of one coin, with input fetch times and the basis of its AI output."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.values = {}
+        self.fetched_at = {}
+        self.ai_basis = None
+        self.image_outlook = None
+        # Set while an AI request failed: the ai node is retried on the next tick even if nothing changed
+        self.ai_retry = False
+        self.lock = threading.Lock()
+
+    def due(self, node, now, interval):
+        fetched_at = self.fetched_at.get(node)
+        return fetched_at is None or now - fetched_at >= interval
+
+    def result(self):
+        """(result, image_url) in the shape returned by analyze_crypto, or None before the first valuation."""
+        valuation = self.values.get('valuation')
+        if valuation is None:
+            return None
+        ai = self.values.get('ai', {})
+        result = {key: valuation[key] for key in utils.RESULT_KEYS}
+        result['ai_text'] = ai.get('text')
+        return result, ai.get('image_url')
+
+
+class WatchlistDaemon:
+    """
+    Revalues a watchlist every `tick_interval` seconds, refetching inputs whose interval elapsed and
+    recomputing only the nodes they invalidate. `stats` counts fetches, recomputations and AI requests.
+    """
+
+    def __init__(self, symbols, intervals=None, thresholds=None, tick_interval=TICK_INTERVAL,
+                 workers=WATCHLIST_WORKERS, history=None):
+        self.symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols))
+        self.intervals = dict(INPUT_INTERVALS, **(intervals or {}))
+        self.thresholds = dict(AI_THRESHOLDS, **(thresholds or {}))
+        self.tick_interval = tick_interval
+        self.workers = workers
+        self.history = history
+        self._states = {symbol: CoinState(symbol) for symbol in self.symbols}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'fetches': 0, 'unchanged_fetches': 0, 'recomputes': 0, 'ai_texts': 0, 'ai_images': 0}
+
+    def result(self, symbol):
+        return self._states[symbol.upper()].result()
+
+    def freshness(self, now=None):
+        """Seconds since each input of each coin was fetched, as {symbol: {input: age}}."""
+        now = now or time.time()
+        return {symbol: {node: round(now - fetched_at, 3) for node, fetched_at in state.fetched_at.items()}
+                for symbol, state in self._states.items()}
+
+    def tick(self, now=None):
+        """Brings every coin up to date once; returns {symbol: inputs that changed and nodes recomputed}."""
+        now = now or time.time()
+        quotes = self._fetch_quotes(now)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='watchlist') as pool:
+            updates = dict(zip(self.symbols, pool.map(lambda symbol: self._update_safely(symbol, now, quotes),
+                                                      self.symbols)))
+        valued = [self._states[symbol].values['valuation'] for symbol, update in updates.items()
+                  if 'valuation' in update]
+        if valued and self.history is not None:
+            try:
+                self.history.append(valued)
+            except OSError as e:
+                logging.warning(f"Could not record the watchlist in the history store: {e}")
+        return updates
+
+    def start(self):
+        """Runs ticks in a background thread until `stop()`."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='watchlist', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            updates = self.tick()
+            logging.info(f"Watchlist tick: {updates}")
+            self._stop.wait(max(0.0, self.tick_interval - (time.monotonic() - started)))
+
+    def _fetch_quotes(self, now):
+        """Quotes of every coin whose quote is due, in one CoinMarketCap request per CMC_BATCH_SIZE coins."""
+        due = [symbol for symbol in self.symbols if self._states[symbol].due('quote', now, self.intervals['quote'])]
+        return utils.fetch_crypto_quotes(due) if due else {}
+
+    def _update_safely(self, symbol, now, quotes):
+        try:
+            return self._update(symbol, now, quotes)
+        except Exception as e:
+            logging.error(f"Watchlist update failed for {symbol}: {e}")
+            return ['error']
+
+    def _update(self, symbol, now, quotes):
+        state = self._states[symbol]
+        with state.lock:
+            changed = [node for node in INPUTS
+                       if state.due(node, now, self.intervals[node]) and self._fetch(state, node, now, quotes)]
+            updated = list(changed)
+            for node in DERIVED:
+                invalidated = node in dependents(changed) or (node == 'ai' and state.ai_retry)
+                if invalidated and self._compute(state, node):
+                    updated.append(node)
+                    changed.append(node)
+            return updated
+
+    def _fetch(self, state, node, now, quotes):
+        """Refetches one input (quotes come from the tick's batched request); returns True if its value changed."""
+        quote = state.values.get('quote')
+        if node != 'quote' and quote is None:
+            return False
+        # A due input is read upstream: a stale-while-revalidate answer would lag by a whole interval
+        with max_age(0):
+            if node == 'quote':
+                value = quotes.get(state.symbol)
+            elif node == 'volume':
+                value = utils.fetch_trading_volume(quote['symbol'].upper())
+            else:
+                value = utils.fetch_sentiment({'crypto_id': quote['name'], 'crypto_symbol': quote['symbol'].upper()})
+        if node == 'quote' and value is None:
+            raise ValueError(utils.INVALID_SYMBOL_ERROR)
+        state.fetched_at[node] = now
+        unchanged = state.values.get(node) == value
+        state.values[node] = value
+        self._count('fetches')
+        if unchanged:
+            self._count('unchanged_fetches')
+        return not unchanged
+
+    def _compute(self, state, node):
+        """Recomputes a derived node from its dependencies; returns True if it was (re)computed."""
+        values = state.values
+        if any(dependency not in values for dependency in GRAPH[node]):
+            return False
+        if node == 'market':
+            values['market'] = utils.compute_market_metrics(values['quote'], values['volume'])
+        elif node == 'valuation':
+            values['valuation'] = utils.apply_sentiment(values['market'], values['sentiment'])
+        else:
+            return self._refresh_ai(state)
+        self._count('recomputes')
+        return True
+
+    def _refresh_ai(self, state):
+        """Regenerates the AI text and image only where the valuation moved past the thresholds."""
+        valuation = state.values['valuation']
+        ai = dict(state.values.get('ai', {}))
+        basis = state.ai_basis
+        write_text = basis is None or any(abs(valuation[metric] - basis[metric]) >= threshold
+                                          for metric, threshold in self.thresholds.items())
+        draw_image = state.image_outlook != outlook(valuation)
+        # A failed request keeps the previous output and leaves its basis unchanged, so it is retried
+        written = drawn = False
+        if write_text:
+            text = utils.request_analysis(utils.build_analysis_prompt(valuation))
+            written = not utils.is_analysis_error(text)
+            if written or 'text' not in ai:
+                ai['text'] = text
+            if written:
+                state.ai_basis = {metric: valuation[metric] for metric in self.thresholds}
+                self._count('ai_texts')
+        if draw_image:
+            image_url = utils.request_image(utils.build_image_prompt(valuation))
+            drawn = image_url is not None
+            if drawn:
+                ai['image_url'] = image_url
+                state.image_outlook = outlook(valuation)
+                self._count('ai_images')
+        state.ai_retry = (write_text and not written) or (draw_image and not drawn)
+        state.values['ai'] = ai
+        return written or drawn
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental watchlist valuation")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', type=float, default=TICK_INTERVAL, help="Seconds between ticks")
+    parser.add_argument('--quote-interval', type=float, default=INPUT_INTERVALS['quote'])
+    parser.add_argument('--volume-interval', type=float, default=INPUT_INTERVALS['volume'])
+    parser.add_argument('--sentiment-interval', type=float, default=INPUT_INTERVALS['sentiment'])
+    parser.add_argument('--valuation-threshold', type=float,
+                        default=AI_THRESHOLDS['valuation_difference_percentage'],
+                        help="Valuation difference %% change that regenerates the AI commentary")
+    parser.add_argument('--sentiment-threshold', type=float, default=AI_THRESHOLDS['sentiment_score'],
+                        help="Sentiment score change that regenerates the AI commentary")
+    parser.add_argument('--once', action='store_true', help="Run a single tick and exit")
+    parser.add_argument('--no-history', action='store_true', help="Do not append valuations to the history store")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read exchange volumes from live ticker streams instead of polling them")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    daemon = WatchlistDaemon(
+        args.symbols, tick_interval=args.interval,
+        intervals={'quote': args.quote_interval, 'volume': args.volume_interval,
+                   'sentiment': args.sentiment_interval},
+        thresholds={'valuation_difference_percentage': args.valuation_threshold,
+                    'sentiment_score': args.sentiment_threshold},
+        history=None if args.no_history else get_history_store())
+    if args.stream:
+        configure_volume_stream(daemon.symbols)
+    if args.once:
+        print(daemon.tick())
+        return
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print(f"Stopped; {daemon.stats}")
+
+
+if __name__ == '__main__':
+    main()